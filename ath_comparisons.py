@@ -2,10 +2,13 @@ import datetime
 from datetime import date
 from typing import List
 
-from nsepy import get_history
 import pandas as pd
 
+from bulk_fetch import fetch_histories
 from constants import NIFTY50
+from instrumentation import timed
+from memo_cache import get_history
+import output_writer
 
 
 def get_monthly_data(start_date, end_date, symbol):
@@ -25,7 +28,6 @@ def get_monthly_data(start_date, end_date, symbol):
     if history.empty:
         print('No data received for the given inputs')
         return pd.DataFrame(data)
-    history_dates = set(history.index.tolist())
 
     return pd.DataFrame(data).set_index('month')
 
@@ -42,18 +44,36 @@ def get_current_with_ath(symbol, ath_percentile=100, last_n_days=365):
     print('Fetching data for %s' % symbol)
     history = get_history(symbol=symbol, start=start_date, end=end_date)
     print('Data fetched for %s' % symbol)
-    percentile_highest_price = history.High.nlargest(int((1 - ath_percentile / 100) * len(history)) + 1)[-1]
+
+    return get_ath_from_history(history, ath_percentile)
+
+
+@timed('compute')
+def get_ath_from_history(history, ath_percentile=100):
+    '''
+        Same as `get_current_with_ath`, for an already fetched `history`
+    '''
+    percentile_highest_price = history.High.nlargest(int((1 - ath_percentile / 100) * len(history)) + 1).iloc[-1]
     ath = history.High.max()
-    ltp = history.Close[-1]
+    ltp = history.Close.iloc[-1]
 
     return percentile_highest_price, ath, ltp
 
 
-def bulk_ath_comparisons(company_symbols:List[str]=[]):
+def bulk_ath_comparisons(company_symbols:List[str]=[], last_n_days=365):
     data = {'symbol':[], 'LTP': [], 'ATH': [], 'nth_percentile_high': []}
 
+    end_date = datetime.datetime.today()
+    start_date = end_date - datetime.timedelta(days=last_n_days)
+    histories = {
+        result.symbol: result.history
+        for result in fetch_histories(company_symbols, start_date, end_date)
+        if result.error is None
+    }
     for symbol in company_symbols:
-        percentile_highest_price, ath, ltp = get_current_with_ath(symbol, 95)
+        if symbol not in histories:
+            continue
+        percentile_highest_price, ath, ltp = get_ath_from_history(histories[symbol], 95)
         data['symbol'].append(symbol)
         data['LTP'].append(ltp)
         data['ATH'].append(ath)
@@ -63,7 +83,9 @@ def bulk_ath_comparisons(company_symbols:List[str]=[]):
 
 def main(symbols):
     ath_comparison_data = bulk_ath_comparisons(symbols)
-    ath_comparison_data.to_csv('output/nifty50_ath_comparisons.csv', index=True, header=True)
+    output_writer.write(
+        ath_comparison_data, 'ath_comparisons', 'daily', csv_path='output/nifty50_ath_comparisons.csv'
+    )
 
 if __name__ == '__main__':
     symbols = NIFTY50
@@ -0,0 +1,170 @@
+'''
+    Rolling all-time high, N-day high/low & percentile high of every symbol on every date,
+    computed for the whole universe at once on symbols x dates arrays
+
+    Windows are counted in rows of the shared date axis (i.e. trading days). NaN stands for
+    a symbol not trading on a date & is ignored.
+'''
+
+import datetime
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from bulk_fetch import fetch_histories
+from constants import NIFTY50, NIFTY_NEXT_50
+from instrumentation import span
+import output_writer
+from utils import sliding_window_max, sliding_window_min
+
+
+# Maximum number of values in the windows partitioned at once by `rolling_percentile_high`
+PARTITION_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def history_panel(histories, column):
+    '''
+        Returns `(symbols, dates, values)`, where `values[i, j]` is `column` of the history of
+        `symbols[i]` on `dates[j]` (NaN if it has no row for that date), for a dict of
+        symbol -> history (as returned by `get_history`)
+    '''
+    symbols = list(histories)
+    panel = pd.DataFrame({
+        symbol: history[column].astype(float)
+        for symbol, history in histories.items()
+        if not history.empty
+    }).sort_index()
+    panel = panel.reindex(columns=symbols)
+    return symbols, panel.index.to_numpy(), panel.to_numpy(dtype=float).T
+
+
+def rolling_ath(highs):
+    '''All time high (since the first date) of every row of `highs`, on every date'''
+    return np.fmax.accumulate(highs, axis=-1)
+
+
+def rolling_max(values, window):
+    '''Highest value of every row over the last `window` dates (fewer at the start)'''
+    padding = [(0, 0)] * (values.ndim - 1) + [(window - 1, 0)]
+    return sliding_window_max(np.pad(values, padding, constant_values=np.nan), window)
+
+
+def rolling_min(values, window):
+    '''Lowest value of every row over the last `window` dates (fewer at the start)'''
+    padding = [(0, 0)] * (values.ndim - 1) + [(window - 1, 0)]
+    return sliding_window_min(np.pad(values, padding, constant_values=np.nan), window)
+
+
+def rolling_percentile_high(highs, window, percentile):
+    '''
+        `percentile`th percentile high of every row over the last `window` dates, defined like
+        `get_current_with_ath` does: the k-th largest of the `m` values in the window, where
+        `k = int((1 - percentile / 100) * m) + 1`. NaN where the window has no values.
+    '''
+    assert 0 <= percentile <= 100, '`percentile` should be in the range [0, 100]'
+    highs = np.atleast_2d(np.asarray(highs, dtype=float))
+    num_rows, num_dates = highs.shape
+    padded = np.pad(highs, [(0, 0), (window - 1, 0)], constant_values=np.nan)
+    valid_counts = sliding_window_view(~np.isnan(padded), window, axis=1).sum(axis=-1)
+    # NaNs sort after every value, make them the smallest instead
+    padded[np.isnan(padded)] = -np.inf
+
+    result = np.full((num_rows, num_dates), np.nan)
+    chunk_dates = max(1, PARTITION_CHUNK_SIZE // (num_rows * window))
+    for chunk_start in range(0, num_dates, chunk_dates):
+        chunk_end = min(chunk_start + chunk_dates, num_dates)
+        windows = sliding_window_view(
+            padded[:, chunk_start:chunk_end + window - 1], window, axis=1
+        )
+        counts = valid_counts[:, chunk_start:chunk_end]
+        # The windows with the same number of values share the same k, mostly all of them
+        for count in np.unique(counts[counts > 0]):
+            rows, dates = np.nonzero(counts == count)
+            k = min(int((1 - percentile / 100) * count) + 1, count)
+            partitioned = np.partition(windows[rows, dates], window - k, axis=-1)
+            result[rows, chunk_start + dates] = partitioned[:, window - k]
+    return result
+
+
+def percent_distance(values, references):
+    '''%age by which `values` are above (positive) or below (negative) `references`'''
+    return (values - references) / references * 100
+
+
+def ath_time_series(
+    symbols,
+    start_date,
+    end_date=None,
+    percentile=95,
+    window=250,
+):
+    '''
+        Time series of the LTP, all time high (since `start_date`), `window`-day high & low &
+        `window`-day `percentile`th percentile high, with the distance (in %) of the LTP from
+        the ATH & from the percentile high, for every symbol & date.
+
+        Returns a tidy DataFrame with a row per (date, symbol).
+    '''
+    end_date = end_date or datetime.datetime.today()
+    histories = {
+        result.symbol: result.history
+        for result in fetch_histories(symbols, start_date, end_date)
+        if result.error is None
+    }
+    histories = {symbol: histories[symbol] for symbol in symbols if symbol in histories}
+    with span('resample'):
+        symbols, dates, highs = history_panel(histories, 'High')
+        _, _, lows = history_panel(histories, 'Low')
+        _, _, closings = history_panel(histories, 'Close')
+    return ath_table(symbols, dates, highs, lows, closings, percentile, window)
+
+
+def panel_ath_time_series(panel, start_date=None, end_date=None, percentile=95, window=250):
+    '''Same as `ath_time_series`, for all the symbols of an opened `panel.Panel`'''
+    highs, lows, closings = [
+        np.asarray(panel.values(column, start=start_date, end=end_date), dtype=float)
+        for column in ['high', 'low', 'close']
+    ]
+    dates = panel.dates[panel.date_slice(start_date, end_date)].astype(object)
+    return ath_table(panel.symbols, dates, highs, lows, closings, percentile, window)
+
+
+def ath_table(symbols, dates, highs, lows, closings, percentile=95, window=250):
+    '''
+        Tidy table of `ath_time_series` from symbols x dates arrays of the highs, lows &
+        closings (NaN where a symbol has no bar)
+    '''
+    with span('compute'):
+        ath = rolling_ath(highs)
+        percentile_high = rolling_percentile_high(highs, window, percentile)
+        columns = {
+            'LTP': closings,
+            'ATH': ath,
+            'nth_percentile_high': percentile_high,
+            '%s_day_high' % window: rolling_max(highs, window),
+            '%s_day_low' % window: rolling_min(lows, window),
+            'distance_from_ATH': percent_distance(closings, ath),
+            'distance_from_nth_percentile_high': percent_distance(closings, percentile_high),
+        }
+    index = pd.MultiIndex.from_product([symbols, dates], names=['symbol', 'date'])
+    series = pd.DataFrame(
+        {column: values.reshape(-1) for column, values in columns.items()}, index=index
+    )
+    return series.dropna(subset=['LTP']).swaplevel().sort_index()
+
+
+def main(symbols):
+    today = datetime.datetime.today()
+    series = ath_time_series(symbols, today - datetime.timedelta(days=5 * 365), today)
+    output_writer.write(series, 'ath_time_series', 'daily', csv_path='output/ath_time_series.csv')
+
+
+if __name__ == '__main__':
+    symbols = NIFTY50 + NIFTY_NEXT_50
+
+    import sys
+    if len(sys.argv) > 1:
+        symbols = sys.argv[1].split(',')
+
+    main(symbols)
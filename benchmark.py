@@ -0,0 +1,482 @@
+'''
+    Benchmarks of the analysis functions on synthetic data, without the network
+
+    `SyntheticProvider` stands in for `nsepy.get_history` behind the history store & serves
+    random-walk daily OHLCV frames shaped like the ones of NSE, with market holidays & some
+    newly listed symbols. Every function is timed at several sizes (years of history) & the
+    results are written as JSON, to compare them between commits:
+
+        python3 benchmark.py --years 1 3 5 --symbols 20 --output output/benchmark.json
+        python3 benchmark.py --compare output/benchmark.json
+
+    The startup time of short runs (importing the main modules & answering from the local
+    history store with `cli.py --offline`) is timed too, each in a fresh interpreter.
+'''
+
+import argparse
+from collections import namedtuple
+from contextlib import contextmanager, redirect_stdout
+import datetime
+from datetime import date
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+
+import history_store
+import memo_cache
+
+
+HISTORY_COLUMNS = [
+    'Symbol', 'Series', 'Prev Close', 'Open', 'High', 'Low', 'Last', 'Close', 'VWAP',
+    'Volume', 'Turnover', 'Trades', 'Deliverable Volume', '%Deliverble',
+]
+
+# Number of weekdays the market is closed on every year
+HOLIDAYS_PER_YEAR = 14
+
+# Modules whose import time is benchmarked
+STARTUP_MODULES = ['cli', 'history_store', 'trend_scanner']
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _seed(*parts):
+    return zlib.crc32('/'.join(str(part) for part in parts).encode())
+
+
+def market_holidays(year, seed=0):
+    '''Weekdays of `year` the synthetic market is closed on, the same for all the symbols'''
+    weekdays = pd.bdate_range(date(year, 1, 1), date(year, 12, 31))
+    rng = np.random.default_rng(_seed('holidays', year, seed))
+    picked = rng.choice(len(weekdays), HOLIDAYS_PER_YEAR, replace=False)
+    return {day.date() for day in weekdays[np.sort(picked)]}
+
+
+def trading_days(start_date, end_date, seed=0):
+    '''Weekdays in [start_date, end_date] which are not `market_holidays`'''
+    holidays = set()
+    for year in range(start_date.year, end_date.year + 1):
+        holidays |= market_holidays(year, seed)
+    return [day.date() for day in pd.bdate_range(start_date, end_date) if day.date() not in holidays]
+
+
+def synthetic_history(symbol, days, seed=0):
+    '''
+        Daily history of `symbol` for the trading `days`, shaped like `nsepy.get_history`:
+        prices follow a geometric random walk with overnight gaps, volumes are log-normal
+    '''
+    rng = np.random.default_rng(_seed(symbol, seed))
+    num_days = len(days)
+    initial_price = float(np.exp(rng.uniform(np.log(50), np.log(5000))))
+    daily_volatility = rng.uniform(0.01, 0.03)
+
+    closings = initial_price * np.exp(np.cumsum(rng.normal(0.0003, daily_volatility, num_days)))
+    previous_closings = np.concatenate([[initial_price], closings[:-1]])
+    openings = previous_closings * np.exp(rng.normal(0, daily_volatility / 3, num_days))
+    highs = np.maximum(openings, closings) * (1 + np.abs(rng.normal(0, daily_volatility / 2, num_days)))
+    lows = np.minimum(openings, closings) * (1 - np.abs(rng.normal(0, daily_volatility / 2, num_days)))
+    vwaps = (highs + lows + closings) / 3
+    volumes = rng.lognormal(np.log(rng.uniform(1e5, 1e7)), 0.5, num_days).astype(np.int64)
+    deliverable_fractions = rng.uniform(0.2, 0.8, num_days)
+
+    return pd.DataFrame(
+        {
+            'Symbol': symbol,
+            'Series': 'EQ',
+            'Prev Close': previous_closings.round(2),
+            'Open': openings.round(2),
+            'High': highs.round(2),
+            'Low': lows.round(2),
+            'Last': (closings * (1 + rng.normal(0, 0.0005, num_days))).round(2),
+            'Close': closings.round(2),
+            'VWAP': vwaps.round(2),
+            'Volume': volumes,
+            'Turnover': vwaps * volumes,
+            'Trades': (volumes / rng.uniform(50, 500)).astype(np.int64),
+            'Deliverable Volume': (volumes * deliverable_fractions).astype(np.int64),
+            '%Deliverble': deliverable_fractions.round(4),
+        },
+        index=pd.Index(days, name='Date'),
+        columns=HISTORY_COLUMNS,
+    )
+
+
+class SyntheticProvider:
+    '''
+        Stand-in for `nsepy.get_history`, serving `synthetic_history` of every symbol for the
+        trading days of the last `years` years till `end_date`. About `newly_listed_fraction`
+        of the symbols get listed on a random day of that period & have no history before it.
+    '''
+
+    def __init__(self, years=5, end_date=None, newly_listed_fraction=0.1, seed=0):
+        self.end_date = end_date or date.today()
+        self.start_date = self.end_date - datetime.timedelta(days=int(years * 365.25))
+        self.newly_listed_fraction = newly_listed_fraction
+        self.seed = seed
+        self.days = trading_days(self.start_date, self.end_date, seed)
+        self.calls = 0
+        self._histories = {}
+
+    def listing_date(self, symbol):
+        rng = np.random.default_rng(_seed('listing', symbol, self.seed))
+        if rng.random() >= self.newly_listed_fraction:
+            return self.start_date
+        return self.days[rng.integers(len(self.days) // 2, len(self.days))]
+
+    def history(self, symbol):
+        if symbol not in self._histories:
+            listing_date = self.listing_date(symbol)
+            days = [day for day in self.days if day >= listing_date]
+            self._histories[symbol] = synthetic_history(symbol, days, self.seed)
+        return self._histories[symbol]
+
+    def __call__(self, symbol, start, end):
+        self.calls += 1
+        history = self.history(symbol)
+        start_date = date(start.year, start.month, start.day)
+        end_date = date(end.year, end.month, end.day)
+        return history[(history.index >= start_date) & (history.index <= end_date)].copy()
+
+
+@contextmanager
+def stand_in_history(provider):
+    '''
+        Serves all the history from `provider` through a temporary history store & an empty
+        memo cache, restoring both when done
+    '''
+    saved_provider, saved_dir = history_store.provider, history_store.HISTORY_DIR
+    with tempfile.TemporaryDirectory() as store_dir:
+        history_store.provider = provider
+        history_store.HISTORY_DIR = store_dir
+        memo_cache.memo.clear()
+        try:
+            yield store_dir
+        finally:
+            history_store.provider, history_store.HISTORY_DIR = saved_provider, saved_dir
+            memo_cache.memo.clear()
+
+
+# setup: function of (symbols, years) returning the state passed to `run`
+# run: function of (state, symbols, years) running the benchmarked code for all the symbols
+Benchmark = namedtuple('Benchmark', ['setup', 'run'])
+
+
+def _today():
+    return date.today()
+
+
+def _years_ago(years):
+    return _today() - datetime.timedelta(days=int(years * 365.25))
+
+
+def _no_setup(symbols, years):
+    return None
+
+
+def _clear_store(symbols, years):
+    memo_cache.memo.clear()
+    shutil.rmtree(history_store.HISTORY_DIR, ignore_errors=True)
+
+
+def _fetch_cold(state, symbols, years):
+    for symbol in symbols:
+        history_store.get_history(symbol, _years_ago(years), _today())
+
+
+def _chart_data_runner(getter_name):
+    def run(state, symbols, years):
+        from daily_analysis import get_daily_data
+        from monthly_closing_prices import get_expiry_data, get_monthly_data
+        from weekly_analysis import get_weekly_data
+        getter = {
+            'daily': get_daily_data,
+            'weekly': get_weekly_data,
+            'monthly': get_monthly_data,
+            'expiry': get_expiry_data,
+        }[getter_name]
+        for symbol in symbols:
+            getter(_years_ago(years), _today(), symbol)
+    return run
+
+
+def _daily_data(symbols, years):
+    from daily_analysis import get_daily_data
+    return {symbol: get_daily_data(_years_ago(years), _today(), symbol) for symbol in symbols}
+
+
+def _profit_columns_runner(column_adder, *args):
+    def run(state, symbols, years):
+        import monthly_closing_prices
+        for symbol in symbols:
+            getattr(monthly_closing_prices, column_adder)(state[symbol].copy(), *args)
+    return run
+
+
+def _indicators(state, symbols, years):
+    from indicators import add_indicator_columns
+    for symbol in symbols:
+        add_indicator_columns(state[symbol].copy())
+
+
+def _trend_runner(trend_function):
+    def run(state, symbols, years):
+        import get_current_trend
+        for symbol in symbols:
+            getattr(get_current_trend, trend_function)(symbol, num_units=int(years * 52))
+    return run
+
+
+def _ath(state, symbols, years):
+    from ath_comparisons import get_current_with_ath
+    for symbol in symbols:
+        get_current_with_ath(symbol, 95, last_n_days=int(years * 365))
+
+
+def _monthly_investments(symbols, years):
+    rng = np.random.default_rng(_seed('xirr', years))
+    num_months = int(years * 12)
+    return {
+        symbol: (
+            [(float(amount), 30 * (num_months - month)) for month, amount in enumerate(rng.uniform(500, 1500, num_months))],
+            float(rng.uniform(0.5, 3) * 1000 * num_months),
+        )
+        for symbol in symbols
+    }
+
+
+def _xirr(state, symbols, years):
+    from utils import get_xirr
+    for symbol in symbols:
+        get_xirr(*state[symbol])
+
+
+BENCHMARKS = {
+    'history_store.get_history (cold)': Benchmark(_clear_store, _fetch_cold),
+    'get_daily_data': Benchmark(_no_setup, _chart_data_runner('daily')),
+    'get_weekly_data': Benchmark(_no_setup, _chart_data_runner('weekly')),
+    'get_monthly_data': Benchmark(_no_setup, _chart_data_runner('monthly')),
+    'get_expiry_data': Benchmark(_no_setup, _chart_data_runner('expiry')),
+    'add_max_profit_percent_from_last_closing_column': Benchmark(
+        _daily_data, _profit_columns_runner('add_max_profit_percent_from_last_closing_column')
+    ),
+    'add_max_profit_percent_from_opening_column': Benchmark(
+        _daily_data, _profit_columns_runner('add_max_profit_percent_from_opening_column')
+    ),
+    'add_max_profit_within_next_units_columns': Benchmark(
+        _daily_data, _profit_columns_runner('add_max_profit_within_next_units_columns', 5)
+    ),
+    'add_indicator_columns': Benchmark(_daily_data, _indicators),
+    'get_trend_by_count': Benchmark(_no_setup, _trend_runner('get_trend_by_count')),
+    'get_trend_by_peaks': Benchmark(_no_setup, _trend_runner('get_trend_by_peaks')),
+    'get_current_with_ath': Benchmark(_no_setup, _ath),
+    'get_xirr': Benchmark(_monthly_investments, _xirr),
+}
+
+
+def time_benchmark(benchmark, symbols, years, repeat=5):
+    '''
+        Seconds taken by every one of `repeat` runs of `benchmark` for all `symbols`, after a
+        warm-up run (which fills the history store & the memo cache, unless `setup` empties
+        them). The output of the benchmarked code is discarded.
+    '''
+    timings = []
+    with redirect_stdout(io.StringIO()):
+        state = benchmark.setup(symbols, years)
+        benchmark.run(state, symbols, years)
+        for _ in range(repeat):
+            state = benchmark.setup(symbols, years)
+            started_at = time.perf_counter()
+            benchmark.run(state, symbols, years)
+            timings.append(time.perf_counter() - started_at)
+    return timings
+
+
+def time_command(command, repeat=5, env=None):
+    '''Seconds taken by every one of `repeat` runs of `command` (a subprocess) & its output'''
+    timings = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        completed = subprocess.run(
+            command, capture_output=True, text=True, check=True, cwd=REPO_DIR,
+            env=dict(os.environ, **(env or {})),
+        )
+        timings.append(time.perf_counter() - started_at)
+    return timings, completed.stdout
+
+
+def startup_benchmarks(store_dir, symbols, repeat=5):
+    '''
+        Times importing the `STARTUP_MODULES` & a run of the trend analysis of `symbols` with
+        `cli.py --offline` on the history store in `store_dir`, in fresh interpreters. Also
+        tells if `nsepy` got imported, which should only happen when something is fetched.
+    '''
+    commands = {
+        'import %s' % module: [
+            sys.executable, '-c', "import sys, %s; print('nsepy' in sys.modules)" % module
+        ]
+        for module in STARTUP_MODULES
+    }
+    results = []
+    for name, command in commands.items():
+        timings, output = time_command(command, repeat)
+        results.append((name, timings, output.split()[-1] == 'True'))
+
+    with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as universe_file:
+        universe_file.write('\n'.join(symbols))
+    try:
+        timings, output = time_command(
+            [
+                sys.executable, '-c',
+                "import sys, cli; cli.main(sys.argv[1:]); print('nsepy' in sys.modules)",
+                'trend', '--offline', '--workers', '0', '--universe', universe_file.name,
+            ],
+            repeat,
+            env={'NSE_HISTORY_DIR': store_dir, 'NSE_OFFLINE': '1'},
+        )
+    finally:
+        os.remove(universe_file.name)
+    results.append(('cli.py trend --offline', timings, output.split()[-1] == 'True'))
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(
+    names=None,
+    years_list=(1, 3, 5),
+    num_symbols=10,
+    repeat=5,
+    newly_listed_fraction=0.1,
+    seed=0,
+    startup=True,
+):
+    '''
+        Runs the `BENCHMARKS` named `names` (all by default) on `num_symbols` synthetic symbols
+        with every number of years of history in `years_list`, & the `startup_benchmarks` if
+        `startup`. Returns a JSON-able dict.
+    '''
+    names = names or list(BENCHMARKS)
+    symbols = ['SYN%03d' % i for i in range(num_symbols)]
+    provider = SyntheticProvider(max(years_list) + 1, newly_listed_fraction=newly_listed_fraction, seed=seed)
+
+    results = []
+    with stand_in_history(provider) as store_dir:
+        if startup:
+            for symbol in symbols:
+                history_store.get_history(symbol, _years_ago(1), _today())
+            for name, timings, imports_nsepy in startup_benchmarks(store_dir, symbols, repeat):
+                results.append({
+                    'name': name,
+                    'years': None,
+                    'symbols': None if name.startswith('import') else num_symbols,
+                    'repeat': repeat,
+                    'min_seconds': min(timings),
+                    'median_seconds': statistics.median(timings),
+                    'mean_seconds': statistics.mean(timings),
+                    'imports_nsepy': imports_nsepy,
+                })
+        for name in names:
+            for years in years_list:
+                timings = time_benchmark(BENCHMARKS[name], symbols, years, repeat)
+                results.append({
+                    'name': name,
+                    'years': years,
+                    'symbols': num_symbols,
+                    'repeat': repeat,
+                    'min_seconds': min(timings),
+                    'median_seconds': statistics.median(timings),
+                    'mean_seconds': statistics.mean(timings),
+                })
+    return {
+        'meta': {
+            'commit': _git_commit(),
+            'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'machine': platform.machine(),
+            'seed': seed,
+            'newly_listed_fraction': newly_listed_fraction,
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, current):
+    '''
+        Table of the median timings of `current` against the ones of `baseline` (both as
+        returned by `run_benchmarks`), with their ratio (above 1 is slower)
+    '''
+    def medians(report):
+        return {
+            (result['name'], result['years'], result['symbols']): result['median_seconds']
+            for result in report['results']
+        }
+    baseline_medians, current_medians = medians(baseline), medians(current)
+    rows = [
+        {
+            'name': key[0],
+            'years': key[1],
+            'symbols': key[2],
+            'baseline_seconds': baseline_medians[key],
+            'current_seconds': current_medians[key],
+            'ratio': current_medians[key] / baseline_medians[key] if baseline_medians[key] else np.nan,
+        }
+        for key in current_medians
+        if key in baseline_medians
+    ]
+    return pd.DataFrame(rows, columns=[
+        'name', 'years', 'symbols', 'baseline_seconds', 'current_seconds', 'ratio'
+    ])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks the analyses on synthetic data')
+    parser.add_argument('names', nargs='*', help='Benchmarks to run, all by default: %s' % ', '.join(BENCHMARKS))
+    parser.add_argument('--years', type=float, nargs='+', default=[1, 3, 5])
+    parser.add_argument('--symbols', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--newly-listed-fraction', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-startup', action='store_true', help="Don't time the startup")
+    parser.add_argument('--output', default=None, help='JSON file to write the results to')
+    parser.add_argument('--compare', default=None, help='JSON file of earlier results to compare with')
+    args = parser.parse_args(argv)
+
+    for name in args.names:
+        assert name in BENCHMARKS, f"benchmark should be one of {list(BENCHMARKS)}, received {name}"
+    report = run_benchmarks(
+        args.names, args.years, args.symbols, args.repeat, args.newly_listed_fraction, args.seed,
+        not args.no_startup,
+    )
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare) as f:
+            print(compare(json.load(f), report).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
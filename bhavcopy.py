@@ -0,0 +1,247 @@
+'''
+    Bulk ingestion of NSE's daily bhavcopy files into the local history store
+
+    A bhavcopy has the bar of every symbol of the market for one day, so years of the whole
+    market are a directory of files instead of a request per symbol & range to NSE. Both
+    formats of the capital market bhavcopy are read, as CSV or as the ZIP they're published in:
+
+        cm02JAN2023bhav.csv(.zip)                           SYMBOL, SERIES, OPEN, ... TIMESTAMP
+        BhavCopy_NSE_CM_0_0_0_20240708_F_0000.csv(.zip)     TradDt, TckrSymb, SctySrs, OpnPric, ...
+
+    The files are parsed in parallel (only the columns needed), pivoted into a history per
+    symbol shaped like `nsepy.get_history` & merged into the history store, along with the
+    days they cover. So `get_daily_data` & co find the days in the store & don't fetch them.
+    The non-trading days (of the trading calendar) after a file's day are covered too.
+
+    Try out:
+        python3 bhavcopy.py ~/Downloads/bhavcopies
+        python3 bhavcopy.py ~/Downloads/bhavcopies --universe NIFTY100 --workers 8
+'''
+
+import argparse
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+import os
+
+import numpy as np
+import pandas as pd
+
+import history_store
+from instrumentation import span
+import trading_calendar
+
+
+# Same columns as `nsepy.get_history`, the ones missing from the bhavcopies are left empty
+HISTORY_COLUMNS = [
+    'Symbol', 'Series', 'Prev Close', 'Open', 'High', 'Low', 'Last', 'Close', 'VWAP',
+    'Volume', 'Turnover', 'Trades', 'Deliverable Volume', '%Deliverble',
+]
+SERIES = ['EQ']
+EXTENSIONS = ('.csv', '.csv.zip', '.zip')
+
+# Files parsed & merged into the store at once, bounding the memory used
+FILES_PER_BATCH = 250
+
+# date_column: column of the trading day, in `date_format`
+# columns: column of the file -> column of `HISTORY_COLUMNS`
+BhavcopyFormat = namedtuple('BhavcopyFormat', ['date_column', 'date_format', 'columns'])
+
+FORMATS = {
+    'cm': BhavcopyFormat('TIMESTAMP', '%d-%b-%Y', {
+        'SYMBOL': 'Symbol',
+        'SERIES': 'Series',
+        'PREVCLOSE': 'Prev Close',
+        'OPEN': 'Open',
+        'HIGH': 'High',
+        'LOW': 'Low',
+        'LAST': 'Last',
+        'CLOSE': 'Close',
+        'TOTTRDQTY': 'Volume',
+        'TOTTRDVAL': 'Turnover',
+        'TOTALTRADES': 'Trades',
+    }),
+    'udiff': BhavcopyFormat('TradDt', '%Y-%m-%d', {
+        'TckrSymb': 'Symbol',
+        'SctySrs': 'Series',
+        'PrvsClsgPric': 'Prev Close',
+        'OpnPric': 'Open',
+        'HghPric': 'High',
+        'LwPric': 'Low',
+        'LastPric': 'Last',
+        'ClsPric': 'Close',
+        'TtlTradgVol': 'Volume',
+        'TtlTrfVal': 'Turnover',
+        'TtlNbOfTxsExctd': 'Trades',
+    }),
+}
+
+_ALL_COLUMNS = {
+    column
+    for bhavcopy_format in FORMATS.values()
+    for column in [bhavcopy_format.date_column] + list(bhavcopy_format.columns)
+}
+
+IngestResult = namedtuple('IngestResult', ['days', 'symbols', 'errors'])
+
+
+def bhavcopy_files(directory):
+    '''Paths of the bhavcopy files (CSV or ZIP) in `directory`, sorted by name'''
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.lower().endswith(EXTENSIONS)
+    )
+
+
+def read_bhavcopy(path, series=SERIES):
+    '''
+        Bars of the symbols of `series` in the bhavcopy file `path`, as a frame with a 'Date'
+        column & the columns of `HISTORY_COLUMNS`
+    '''
+    # Only the columns of the known formats are parsed
+    bars = pd.read_csv(path, usecols=lambda column: column.strip() in _ALL_COLUMNS)
+    bars.columns = bars.columns.str.strip()
+    for bhavcopy_format in FORMATS.values():
+        if set(bhavcopy_format.columns) <= set(bars.columns) and bhavcopy_format.date_column in bars.columns:
+            break
+    else:
+        raise ValueError(f'{path} is not a bhavcopy of any of the formats {list(FORMATS)}')
+
+    bars = bars.rename(columns=bhavcopy_format.columns)
+    for column in ['Symbol', 'Series']:
+        bars[column] = bars[column].astype(str).str.strip()
+    bars = bars[bars['Series'].isin(series)]
+    bars.insert(0, 'Date', pd.to_datetime(
+        bars.pop(bhavcopy_format.date_column).astype(str).str.strip(), format=bhavcopy_format.date_format
+    ).dt.date)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        bars['VWAP'] = (bars['Turnover'] / bars['Volume']).round(2)
+    for column in HISTORY_COLUMNS:
+        if column not in bars.columns:
+            bars[column] = np.nan
+    return bars[['Date'] + HISTORY_COLUMNS]
+
+
+def _read(path, series):
+    try:
+        with span('load'):
+            return path, read_bhavcopy(path, series), None
+    except Exception as e:
+        return path, None, '%s: %s' % (type(e).__name__, e)
+
+
+def read_bhavcopies(paths, series=SERIES, workers=4):
+    '''Yields `(path, bars, error)` of every file of `paths`, parsed on `workers` threads, in order'''
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bhavcopy') as executor:
+        yield from executor.map(lambda path: _read(path, series), paths)
+
+
+def covered_ranges(days, calendar=None):
+    '''
+        Ranges of days covered by the bhavcopies of `days`: every day with a file & the days
+        after it till the next trading day of `calendar` (till today at most), as there can't
+        be bars on them
+    '''
+    days = np.unique(trading_calendar.to_days(days))
+    if not len(days):
+        return []
+    calendar = calendar or trading_calendar.get_calendar()
+    next_trading_days = np.append(calendar.days, np.datetime64('9999-12-31'))[
+        np.searchsorted(calendar.days, days, 'right')
+    ]
+    ends = np.minimum(next_trading_days - np.timedelta64(1, 'D'), np.datetime64(datetime.date.today(), 'D'))
+    ends = np.maximum(ends, days)
+    return history_store.merge_ranges([
+        (start.astype(datetime.date), end.astype(datetime.date)) for start, end in zip(days, ends)
+    ])
+
+
+def _merge_into_store(symbol, bars, covered, store_dir):
+    '''Merges the `bars` of `symbol` & the `covered` ranges into its history in the store'''
+    with history_store._symbol_lock(symbol):
+        with span('load', symbol):
+            history, stored_covered = history_store.load(symbol, store_dir)
+        history = history_store.merge_history(history, [bars])
+        with span('write', symbol):
+            history_store.save(symbol, history, history_store.merge_ranges(stored_covered + covered), store_dir)
+
+
+def ingest(paths, symbols=None, series=SERIES, workers=4, store_dir=None, calendar=None):
+    '''
+        Merges the bhavcopy files of `paths` (or of the directory `paths`) into the history
+        store, for all the symbols in them or only for `symbols`. Returns an `IngestResult`
+        with the days ingested, the symbols updated & the `(path, error)` of the files which
+        couldn't be read.
+    '''
+    if isinstance(paths, str):
+        paths = bhavcopy_files(paths)
+    wanted = None if symbols is None else set(symbols)
+    all_days = set()
+    all_symbols = set()
+    errors = []
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bhavcopy-store') as executor:
+        for start in range(0, len(paths), FILES_PER_BATCH):
+            frames = []
+            for path, bars, error in read_bhavcopies(paths[start:start + FILES_PER_BATCH], series, workers):
+                if error is not None:
+                    print('WARN: Skipping %s: %s' % (path, error))
+                    errors.append((path, error))
+                elif not bars.empty:
+                    frames.append(bars)
+            if not frames:
+                continue
+
+            bars = pd.concat(frames, ignore_index=True)
+            days = sorted(set(bars['Date']))
+            covered = covered_ranges(days, calendar)
+            if wanted is not None:
+                bars = bars[bars['Symbol'].isin(wanted)]
+            # A symbol listed twice on a day (in two files) keeps the bar of the later file
+            bars = bars.drop_duplicates(['Symbol', 'Date'], keep='last')
+            bars = bars.sort_values(['Symbol', 'Date'], kind='stable')
+
+            merges = [
+                executor.submit(
+                    _merge_into_store, symbol, symbol_bars.set_index('Date'), covered, store_dir
+                )
+                for symbol, symbol_bars in bars.groupby('Symbol', sort=False)
+            ]
+            for merge in merges:
+                merge.result()
+            all_days.update(days)
+            all_symbols.update(bars['Symbol'])
+
+    return IngestResult(sorted(all_days), sorted(all_symbols), errors)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Merges a directory of bhavcopy files into the history store')
+    parser.add_argument('directory', help='Directory of bhavcopy CSV or ZIP files')
+    parser.add_argument(
+        '--universe', default=None,
+        help='Only the symbols of this universe (as for cli.py), all the symbols of the files by default',
+    )
+    parser.add_argument('--series', default=','.join(SERIES), help='Comma separated series to keep')
+    parser.add_argument('--workers', type=int, default=4, help='Threads reading & writing the files')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    symbols = None
+    if args.universe:
+        from cli import load_universe
+        symbols = load_universe(args.universe)
+    result = ingest(args.directory, symbols, args.series.split(','), args.workers)
+    if result.days:
+        print('Ingested %s days (%s to %s) of %s symbols into %s' % (
+            len(result.days), result.days[0], result.days[-1], len(result.symbols), history_store.HISTORY_DIR,
+        ))
+    else:
+        print('Nothing ingested from %s' % args.directory)
+
+
+if __name__ == '__main__':
+    main()
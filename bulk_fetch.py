@@ -0,0 +1,146 @@
+'''
+    Concurrent fetching of price history for many symbols at once, with a cap on concurrency,
+    a token-bucket rate limit & retries with exponential backoff on transient failures
+'''
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import random
+import threading
+import time
+
+import history_store
+import memo_cache
+
+try:
+    from requests.exceptions import ConnectionError as RequestsConnectionError, Timeout
+except ImportError:
+    RequestsConnectionError = Timeout = ConnectionError
+
+
+# Network failures only, not the OSErrors of the history store (missing files, full disk...)
+TRANSIENT_ERRORS = (ConnectionError, TimeoutError, RequestsConnectionError, Timeout)
+
+FetchResult = namedtuple('FetchResult', ['symbol', 'history', 'error'])
+
+
+class TokenBucket:
+    '''
+        Allows `rate` acquisitions per second on average, with bursts of up to `capacity`
+    '''
+
+    def __init__(self, rate, capacity=1):
+        assert rate > 0, '`rate` should be positive'
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        '''Blocks until a token is available & takes it'''
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._last_refill) * self.rate
+                )
+                self._last_refill = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def fetch_with_retries(fetch, symbol, start, end, retries=3, backoff=1.0, rate_limiter=None):
+    '''
+        Calls `fetch(symbol=symbol, start=start, end=end)`, retrying up to `retries` times on
+        `TRANSIENT_ERRORS`. The n-th retry waits for about `backoff * 2 ** n` seconds.
+    '''
+    attempt = 0
+    while True:
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        try:
+            return fetch(symbol=symbol, start=start, end=end)
+        except TRANSIENT_ERRORS as e:
+            if attempt >= retries:
+                raise
+            delay = backoff * 2 ** attempt * random.uniform(0.5, 1)
+            print('WARN: Fetching %s failed (%r), retrying in %.2fs...' % (symbol, e, delay))
+            time.sleep(delay)
+            attempt += 1
+
+
+def fetch_histories(
+    symbols,
+    start,
+    end,
+    max_workers=8,
+    requests_per_second=5,
+    retries=3,
+    backoff=1.0,
+    fetch=None,
+):
+    '''
+        Fetches the history of all `symbols` for [start, end] concurrently & yields a
+        `FetchResult(symbol, history, error)` for each of them, in the order they finish.
+        `history` is None & `error` is set for the symbols which could not be fetched.
+
+        Params:
+            max_workers: Maximum number of fetches in flight at the same time
+            requests_per_second: Rate limit for the requests to NSE (including retries). With
+                the history store behind `fetch`, it's the store's `rate_limiter` meanwhile &
+                only the missing ranges it fetches wait for it, else every call of `fetch` does
+            retries: Number of retries on transient failures, per symbol
+            backoff: Wait (in seconds) before the first retry, doubled for every next one
+            fetch: Function with the signature of `get_history`, defaults to the in-memory
+                cache in front of the local history store (which only goes to NSE for the
+                missing date ranges)
+    '''
+    fetch = fetch or memo_cache.get_history
+    rate_limiter = TokenBucket(requests_per_second) if requests_per_second else None
+    store_rate_limiter = history_store.rate_limiter
+    if fetch in (memo_cache.get_history, history_store.get_history):
+        # The history is served from memory or the store when it can, only the ranges missing
+        # from the store go to NSE
+        history_store.rate_limiter = rate_limiter
+        rate_limiter = None
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(
+                    fetch_with_retries, fetch, symbol, start, end, retries, backoff, rate_limiter
+                ): symbol
+                for symbol in symbols
+            }
+            for future in as_completed(futures):
+                # Not keeping the futures (& their histories) once yielded
+                symbol = futures.pop(future)
+                try:
+                    yield FetchResult(symbol, future.result(), None)
+                except Exception as e:
+                    print('WARN: Could not fetch history for %s: %r' % (symbol, e))
+                    yield FetchResult(symbol, None, e)
+    finally:
+        history_store.rate_limiter = store_rate_limiter
+
+
+def prefetched_symbols(symbols, start, end, **kwargs):
+    '''
+        Fills the local history store for `symbols` concurrently & yields every symbol in the
+        order of `symbols` as soon as its history (& the ones of the symbols before it) is
+        stored, so that per-symbol analysis can start right away & prints in a stable order.
+        Symbols which failed are yielded as well, their analysis will retry the fetch.
+        `kwargs` are passed to `fetch_histories`.
+    '''
+    symbols = list(symbols)
+    stored = set()
+    next_index = 0
+    for result in fetch_histories(symbols, start, end, **kwargs):
+        stored.add(result.symbol)
+        while next_index < len(symbols) and symbols[next_index] in stored:
+            yield symbols[next_index]
+            next_index += 1
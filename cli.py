@@ -0,0 +1,367 @@
+'''
+    Single entry point for the per-symbol analyses: runs the selected analysis for every
+    symbol of a universe over a pool of processes & prints the results in the order of the
+    universe.
+
+    Try out:
+        python3 cli.py trend --universe NIFTY100 --chart-type monthly
+        python3 cli.py max_profit_weekly --threshold 0.7 --lookback 65
+        python3 cli.py ath --universe my_symbols.txt --workers 4
+'''
+
+import argparse
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import datetime
+from functools import partial
+import math
+import multiprocessing
+import os
+import sys
+
+from constants import NIFTY50, NIFTY_NEXT_50
+import instrumentation
+
+
+UNIVERSES = {
+    'NIFTY50': NIFTY50,
+    'NIFTY_NEXT_50': NIFTY_NEXT_50,
+    'NIFTY100': NIFTY50 + NIFTY_NEXT_50,
+}
+
+# Number of chunks handed to every worker, when `chunksize` isn't given. More (smaller)
+# chunks balance the load better, fewer (bigger) ones cost less in inter-process traffic.
+CHUNKS_PER_WORKER = 4
+
+
+# The tasks below run in the worker processes: each one takes a symbol & returns a dict of
+# the results for it (empty if the results are written to a file). The analysis modules are
+# imported in the tasks, so that the CLI doesn't import all of them just to parse arguments
+# (& `nsepy` is only imported by the history store when something has to be fetched).
+
+def daily_task(symbol):
+    import daily_analysis
+    daily_analysis.main(symbol)
+    return {}
+
+
+def weekly_task(symbol):
+    import weekly_analysis
+    weekly_analysis.main(symbol)
+    return {}
+
+
+def monthly_task(symbol):
+    import monthly_closing_prices
+    monthly_closing_prices.main(symbol)
+    return {}
+
+
+def ath_task(symbol, percentile=95):
+    from ath_comparisons import get_current_with_ath
+    percentile_highest_price, ath, ltp = get_current_with_ath(symbol, percentile)
+    return {'LTP': ltp, 'ATH': ath, 'nth_percentile_high': percentile_highest_price}
+
+
+def long_term_task(symbol):
+    from long_term_invesment import get_long_term_investment
+    invested_amount, current_value, profit_percent, num_months = get_long_term_investment(symbol)
+    return {
+        'Invested amount (₹)': invested_amount,
+        'Last closing (₹)': current_value,
+        'Profit (%)': '{:0.2f}'.format(profit_percent),
+        'months': num_months,
+    }
+
+
+def trend_task(symbol, num_units=15, chart_type='weekly'):
+    from trend_scanner import get_chart_data, scan_chart_data
+    chart_data = get_chart_data(symbol, num_units, chart_type)
+    return scan_chart_data({symbol: chart_data}).iloc[0].to_dict()
+
+
+def max_profit_daily_task(symbol, threshold=0.5, lookback=250):
+    from max_profit_from_daily_closings import get_profitable_days_percent
+    return {'probability': get_profitable_days_percent(symbol, threshold, lookback)}
+
+
+def max_profit_weekly_task(symbol, threshold=1, lookback=52):
+    from max_profit_from_weekly_closings import get_profitable_weeks_percent
+    return {'probability': get_profitable_weeks_percent(symbol, threshold, lookback)}
+
+
+def max_profit_monthly_task(symbol, threshold=4, lookback=18):
+    from max_profit_from_monthly_closings import get_profitable_months_percent
+    return {'probability': get_profitable_months_percent(symbol, threshold, lookback)}
+
+
+def _days_ago(days):
+    return lambda today, **options: today - datetime.timedelta(days=days)
+
+
+def _since(start_date):
+    return lambda today, **options: start_date
+
+
+def _trend_fetch_from(today, num_units=15, chart_type='weekly'):
+    from trend_scanner import get_start_date
+    return get_start_date(today, num_units, chart_type)
+
+
+# task: function run for every symbol
+# fetch_from: function of today & the options, giving the start date of the history needed
+# options: command line options passed on to the task
+Analysis = namedtuple('Analysis', ['task', 'fetch_from', 'options'])
+
+ANALYSES = {
+    'daily': Analysis(daily_task, _since(datetime.date(2022, 11, 20)), []),
+    'weekly': Analysis(weekly_task, _since(datetime.date(2019, 1, 20)), []),
+    'monthly': Analysis(monthly_task, _since(datetime.date(2017, 1, 1)), []),
+    'ath': Analysis(ath_task, _days_ago(365), ['percentile']),
+    'long_term': Analysis(long_term_task, _since(datetime.date(2019, 1, 1)), []),
+    'trend': Analysis(trend_task, _trend_fetch_from, ['num_units', 'chart_type']),
+    'max_profit_daily': Analysis(
+        max_profit_daily_task, _since(datetime.date(2020, 1, 20)), ['threshold', 'lookback']
+    ),
+    'max_profit_weekly': Analysis(
+        max_profit_weekly_task, _since(datetime.date(2020, 8, 10)), ['threshold', 'lookback']
+    ),
+    'max_profit_monthly': Analysis(
+        max_profit_monthly_task, _since(datetime.date(2020, 1, 1)), ['threshold', 'lookback']
+    ),
+}
+
+
+def load_universe(universe):
+    '''
+        Symbols of `universe`: one of `UNIVERSES` or the path of a file listing symbols
+        (separated by new lines, commas or spaces, with '#' starting a comment)
+    '''
+    if universe in UNIVERSES:
+        return list(UNIVERSES[universe])
+    assert os.path.isfile(universe), (
+        f"universe should be one of {list(UNIVERSES)} or a file, received {universe}"
+    )
+    symbols = []
+    with open(universe) as f:
+        for line in f:
+            line = line.split('#', 1)[0]
+            for symbol in line.replace(',', ' ').split():
+                if symbol not in symbols:
+                    symbols.append(symbol)
+    return symbols
+
+
+def default_workers():
+    '''Number of CPUs this process is allowed to run on'''
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _init_worker(memo_max_bytes, quiet, profiling):
+    import memo_cache
+    if memo_max_bytes is not None:
+        memo_cache.memo.max_bytes = memo_max_bytes
+    if quiet:
+        sys.stdout = open(os.devnull, 'w')
+    # Forked workers start with a copy of the records of the parent
+    instrumentation.reset()
+    if profiling is None:
+        instrumentation.disable()
+    else:
+        instrumentation.enable(*profiling)
+
+
+def _run_task(task, symbol):
+    '''Runs `task` for `symbol`, returning `(symbol, results, error)` instead of raising'''
+    try:
+        with instrumentation.for_symbol(symbol):
+            results, error = task(symbol), None
+    except Exception as e:
+        results, error = {}, '%s: %s' % (type(e).__name__, e)
+    return symbol, results, error
+
+
+def _run_chunk(task, symbols):
+    '''
+        Runs `task` for a chunk of `symbols` in a worker, returning the `(symbol, results,
+        error)` of every symbol & the instrumentation records of the chunk. The outputs queued
+        by the tasks are written before returning, as the worker may be stopped right after.
+    '''
+    import output_writer
+    rows = [_run_task(task, symbol) for symbol in symbols]
+    output_writer.flush()
+    return rows, instrumentation.take_records()
+
+
+def run(
+    task,
+    symbols,
+    workers=None,
+    chunksize=None,
+    max_tasks_per_child=None,
+    memo_max_bytes=None,
+    quiet=False,
+):
+    '''
+        Yields `(symbol, results, error)` of `task` for every symbol, in the order of `symbols`,
+        running `task` over a pool of `workers` processes (all the CPUs by default, none with
+        0). The symbols are handed to the workers in chunks of `chunksize` symbols.
+
+        The memory used by every worker is bounded by `memo_max_bytes` (the size of its memo
+        cache of history) & by `max_tasks_per_child`, after which it's replaced by a new one.
+
+        If `instrumentation` is enabled, the records of the workers are added to the ones of
+        this process.
+    '''
+    workers = default_workers() if workers is None else workers
+    if workers == 0:
+        for symbol in symbols:
+            yield _run_task(task, symbol)
+        return
+
+    chunksize = chunksize or max(1, math.ceil(len(symbols) / (workers * CHUNKS_PER_WORKER)))
+    profiling = instrumentation.settings()
+    # Worker processes can only be replaced when they are spawned, not forked
+    mp_context = multiprocessing.get_context('spawn') if max_tasks_per_child else None
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=mp_context,
+        initializer=_init_worker,
+        initargs=(memo_max_bytes, quiet, profiling),
+        max_tasks_per_child=max_tasks_per_child,
+    ) as executor:
+        chunks = [symbols[start:start + chunksize] for start in range(0, len(symbols), chunksize)]
+        for rows, records in executor.map(partial(_run_chunk, task), chunks):
+            instrumentation.add_records(records)
+            yield from rows
+
+
+def prefetch(symbols, start, end):
+    '''
+        Fills the local history store for all `symbols` (with the rate limits of `bulk_fetch`),
+        so that the workers only read from the disk
+    '''
+    import history_store
+    from bulk_fetch import fetch_histories
+    for result in fetch_histories(symbols, start, end, fetch=history_store.get_history):
+        if result.error is not None:
+            print('WARN: Prefetch failed for %s: %s' % (result.symbol, result.error))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Runs an analysis for a universe of symbols')
+    parser.add_argument('analysis', choices=list(ANALYSES))
+    parser.add_argument(
+        '--universe', default='NIFTY50',
+        help='One of %s or the path of a file of symbols' % ', '.join(UNIVERSES),
+    )
+    parser.add_argument(
+        '--workers', type=int, default=None,
+        help='Number of worker processes, all the CPUs by default, 0 to run in this process',
+    )
+    parser.add_argument('--chunksize', type=int, default=None, help='Symbols per task handed to a worker')
+    parser.add_argument(
+        '--max-tasks-per-child', type=int, default=None,
+        help='Chunks a worker runs before being replaced, bounding its memory',
+    )
+    parser.add_argument(
+        '--worker-memo-mb', type=int, default=None,
+        help='Size of the in-memory history cache of every worker, in MiB',
+    )
+    parser.add_argument('--no-prefetch', action='store_true', help="Don't fill the history store first")
+    parser.add_argument(
+        '--offline', action='store_true',
+        help="Only use the local history store, don't fetch anything (same as NSE_OFFLINE=1)",
+    )
+    parser.add_argument('--output', default=None, help='CSV file to write the results to')
+    parser.add_argument(
+        '--csv', action='store_true',
+        help='Also write the per-analysis CSVs next to the output dataset (same as NSE_OUTPUT_CSV=1)',
+    )
+    parser.add_argument('--verbose', action='store_true', help='Show the output of the workers')
+    parser.add_argument(
+        '--metrics-dir', default=None,
+        help='Records the time taken by every stage & writes metrics.jsonl & metrics.prom here',
+    )
+    parser.add_argument(
+        '--profile-symbol', default=None, help='Profiles the run of this symbol (with --metrics-dir)',
+    )
+
+    parser.add_argument('--percentile', type=float, help='ath: percentile of the highs')
+    parser.add_argument('--num-units', type=int, help='trend: number of units to look at')
+    parser.add_argument(
+        '--chart-type',
+        choices=['daily', 'weekly', 'monthly', 'expiry', 'weekly_expiry'],
+        help='trend: chart (expiry: monthly F&O expiry cycles)',
+    )
+    parser.add_argument('--threshold', type=float, help='max_profit_*: profit %%age to look for')
+    parser.add_argument('--lookback', type=int, help='max_profit_*: number of units to look at')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    analysis = ANALYSES[args.analysis]
+    symbols = load_universe(args.universe)
+    options = {
+        option: getattr(args, option)
+        for option in analysis.options
+        if getattr(args, option) is not None
+    }
+    task = partial(analysis.task, **options) if options else analysis.task
+
+    if args.metrics_dir:
+        instrumentation.enable(args.profile_symbol, os.path.join(args.metrics_dir, 'profiles'))
+
+    if args.offline:
+        # Read by the history store of this process & of the worker processes on import
+        os.environ['NSE_OFFLINE'] = '1'
+        import history_store
+        history_store.offline = True
+
+    if args.csv:
+        # Read by the output writer of the worker processes on import
+        os.environ['NSE_OUTPUT_CSV'] = '1'
+        import output_writer
+        output_writer.csv_output = True
+
+    if not args.no_prefetch and not args.offline:
+        today = datetime.date.today()
+        prefetch(symbols, analysis.fetch_from(today, **options), today)
+
+    rows = []
+    for symbol, results, error in run(
+        task,
+        symbols,
+        workers=args.workers,
+        chunksize=args.chunksize,
+        max_tasks_per_child=args.max_tasks_per_child,
+        memo_max_bytes=args.worker_memo_mb and args.worker_memo_mb * 1024 * 1024,
+        quiet=not args.verbose,
+    ):
+        if error is not None:
+            print('WARN: %s failed for %s: %s' % (args.analysis, symbol, error))
+            continue
+        print('\t'.join([symbol] + [str(value) for value in results.values()]))
+        rows.append(dict(results, symbol=symbol))
+
+    if args.output and rows:
+        import pandas as pd
+        with instrumentation.span('write'):
+            pd.DataFrame(rows).set_index('symbol').to_csv(args.output, index=True, header=True)
+
+    output_writer = sys.modules.get('output_writer')
+    if output_writer is not None:
+        # Outputs of the analyses run in this process (with --workers 0), before the metrics
+        output_writer.flush()
+
+    if args.metrics_dir:
+        os.makedirs(args.metrics_dir, exist_ok=True)
+        instrumentation.write_jsonl(os.path.join(args.metrics_dir, 'metrics.jsonl'))
+        instrumentation.write_prometheus(os.path.join(args.metrics_dir, 'metrics.prom'))
+
+
+if __name__ == '__main__':
+    main()
@@ -5,15 +5,21 @@
 import datetime
 from datetime import date
 
-from nsepy import get_history
 import pandas as pd
 
+from instrumentation import timed
+from memo_cache import get_history
+import output_writer
 
-def get_daily_data(start_date, end_date, symbol, verbose=False):
-    '''Daily closing, high, low & opening for the days in [start_date, end_date)
+
+DAILY_COLUMNS = {'Close': 'closing', 'High': 'high', 'Low': 'low', 'Open': 'opening', 'Volume': 'volume'}
+
+
+def get_daily_data(start_date, end_date, symbol, verbose=False, copy=True):
+    '''Daily closing, high, low & opening for the days in (start_date, end_date]
 
     Only year, month & date of `start_date` & `end_date` are considered - rest values
-    are ignored
+    are ignored. If `copy` is False, the returned columns are views on the fetched history.
     '''
     start_date = date(start_date.year, start_date.month, start_date.day)
     end_date = date(end_date.year, end_date.month, end_date.day)
@@ -27,24 +33,31 @@ def get_daily_data(start_date, end_date, symbol, verbose=False):
     if history.empty:
         print('WARN: No data received for the given inputs')
         return pd.DataFrame(data)
-    history_dates = set(history.index.tolist())
-
-    while end_date > start_date:
-        current_date = '%s-%s-%s' % (
-            end_date.year,
-            '{:02d}'.format(end_date.month),
-            '{:02d}'.format(end_date.day)
-        )
-        if end_date in history_dates:
-            data['closing'].append(history.loc[end_date]['Close'])
-            data['low'].append(history.loc[end_date]['Low'])
-            data['high'].append(history.loc[end_date]['High'])
-            data['opening'].append(history.loc[end_date]['Open'])
-            data['volume'].append(history.loc[end_date]['Volume'])
-            data['day'].append(current_date)
-        end_date -= datetime.timedelta(days=1)
-
-    return pd.DataFrame(data).set_index('day')
+
+    return to_daily_data(history, start_date, copy=copy)
+
+
+@timed('resample')
+def to_daily_data(history, after_date=None, copy=True):
+    '''
+        Projects `history` (as returned by `get_history`) to the daily data columns, latest day
+        first & indexed by 'YYYY-MM-DD' strings. Days up to `after_date` (inclusive) are dropped.
+        If `copy` is False, the columns are views on `history` instead of copies.
+    '''
+    if not history.index.is_monotonic_increasing:
+        history = history.sort_index()
+    if after_date is not None:
+        history = history.iloc[history.index.searchsorted(after_date, side='right'):]
+    history = history.iloc[::-1]
+
+    daily_data = pd.DataFrame(
+        {column: history[source] for source, column in DAILY_COLUMNS.items()},
+        copy=copy,
+    )
+    daily_data.index = pd.Index(
+        pd.to_datetime(history.index).strftime('%Y-%m-%d'), name='day'
+    )
+    return daily_data
 
 
 def main(symbol):
@@ -54,11 +67,7 @@ def main(symbol):
         date(today.year, today.month, today.day),
         symbol
     )
-    daily_data.to_csv(
-        'output/%s_daily_data.csv' % symbol,
-        index=True,
-        header=True
-    )
+    output_writer.write(daily_data, 'bars', 'daily', symbol, csv_path='output/%s_daily_data.csv' % symbol)
 
 if __name__ == '__main__':
     symbol = 'PIIND'
@@ -1,12 +1,59 @@
 import datetime
 
-from nsepy import get_history
-
 from constants import NIFTY50, NIFTY_NEXT_50
-from monthly_closing_prices import (
-    add_max_profit_percent_from_last_closing_column
+from trend_scanner import (
+    CHART_DATA_GETTERS, HUMAN_READABLE_TREND, closing_matrix, get_start_date, latest_bottoms,
+    scan_universe, trend_by_count, trend_by_peaks
 )
-from weekly_analysis import get_weekly_data
+
+
+def _get_closings(
+    symbol,
+    num_units,
+    uptrend_if_above_percent,
+    downtrend_if_below_percent,
+    chart_type,
+    verbose,
+):
+    '''
+        Returns `(closings, lengths)` of the `num_units` units of `chart_type` chart of `symbol`
+        (see `trend_scanner.closing_matrix`), warning about too few or too many units
+    '''
+    assert chart_type in CHART_DATA_GETTERS, (
+        f"chart_type should be one of {list(CHART_DATA_GETTERS)}, received {chart_type}"
+    )
+    if verbose:
+        print(
+            f'Finding trend of {symbol} on {chart_type} chart with '
+            f'num_units={num_units}, '
+            f'uptrend_if_above_percent={uptrend_if_above_percent}, '
+            f'downtrend_if_below_percent={downtrend_if_below_percent}\n'
+        )
+    end_date = datetime.datetime.today()
+    start_date = get_start_date(end_date, num_units, chart_type)
+    chart_data = CHART_DATA_GETTERS[chart_type](
+        start_date,
+        end_date,
+        symbol
+    )
+    num_found = len(chart_data)
+    if num_found < num_units: # Might be because company is newly listed & doesn't have enough data
+        print(
+            f'WARNING: Calculating trend for {symbol} based on only {num_found} '
+            f'units of data ({num_units} were requested).'
+        )
+    if num_found > num_units + 2:
+        print(
+            f'WARNING: Calculating trend for {symbol} based on {num_found} units '
+            f'of data ({num_units} were requested). This might indicate a bug.'
+        )
+
+    if verbose:
+        print(f'Got {num_found} units of data')
+        print(chart_data)
+
+    _, closings, lengths = closing_matrix({symbol: chart_data})
+    return closings, lengths
 
 
 def get_trend_by_count(
@@ -30,7 +77,7 @@ def get_trend_by_count(
             downtrend_if_below_percent: Stock will be considered in downtrend if it has grown
                 for at less than this percent of units. For example, it is in downtrend if
                 it gained for less than 25% of the weeks in the last 20 weeks (i.e. 15 weeks).
-            chart_type: Currently, on 'weekly' is supported
+            chart_type: One of 'daily', 'weekly', 'monthly', 'expiry' & 'weekly_expiry'
             return_human_readable: If True, returns a human readable string, else an integer code
 
         Return the trend of the symbol:
@@ -38,70 +85,15 @@ def get_trend_by_count(
             0 or 'consolidtion'
             -1 or 'downtrend'
     '''
-    SUPPORTED_CHART_TYPES = ['weekly']
-    assert chart_type in SUPPORTED_CHART_TYPES, (
-        f"chart_type should be one of {SUPPORTED_CHART_TYPES}, received {chart_type}"
-    )
-    if verbose:
-        print(
-            f'Finding trend of {symbol} on {chart_type} chart with '
-            f'num_units={num_units}, '
-            f'uptrend_if_above_percent={uptrend_if_above_percent}, '
-            f'downtrend_if_below_percent={downtrend_if_below_percent}\n'
-        )
-    if chart_type=='weekly':
-        chart_multiplier = 7
-    elif chart_type=='monthly':
-        chart_multiplier = 31
-    else:  # daily
-        chart_multiplier = 1
-    end_date = datetime.datetime.today()
-    start_date = end_date - datetime.timedelta(
-        days=((num_units + 1) * chart_multiplier)
+    closings, lengths = _get_closings(
+        symbol, num_units, uptrend_if_above_percent, downtrend_if_below_percent, chart_type, verbose
     )
-    weekly_data = get_weekly_data(
-        start_date,
-        end_date,
-        symbol
-    )
-    gain_counts = 0
-    units = sorted(weekly_data.index.tolist(), reverse=True)
-    if len(units) < num_units: # Might be because company is newly listed & doesn't have enough data
-        print(
-            f'WARNING: Calculating trend for {symbol} based on only {len(units)} '
-            f'units of data ({num_units} were requested).'
-        )
-    if len(units) > num_units + 2:
-        print(
-            f'WARNING: Calculating trend for {symbol} based on {len(units)} units '
-            f'of data ({num_units} were requested). This might indicate a bug.'
-        )
+    answer = int(trend_by_count(closings, lengths, uptrend_if_above_percent, downtrend_if_below_percent)[0])
 
     if verbose:
-        print(f'Got {len(units)} units of data')
-        print(units)
-        print(weekly_data)
-
-    num_compares = len(units) - 1
-    for i in range(num_compares):
-        if weekly_data.loc[units[i]]['closing'] > weekly_data.loc[units[i+1]]['closing']:
-            gain_counts += 1
-    if gain_counts / num_compares > uptrend_if_above_percent:
-        answer = 1
-    elif gain_counts / num_compares < downtrend_if_below_percent:
-        answer = -1
-    else:
-        answer = 0
+        print('gain_counts:', int((closings[0, 1:] > closings[0, :-1]).sum()))
+        print('len(units):', lengths[0] - 1)
 
-    if verbose:
-        print('gain_counts:', gain_counts)
-        print('len(units):', num_compares)
-
-    HUMAN_READABLE_TREND = {
-        1: 'uptrend',
-        0: 'consolidation',
-        -1: 'downtrend',
-    }
     if return_human_readable:
         return HUMAN_READABLE_TREND[answer]
     return answer
@@ -114,6 +106,7 @@ def get_trend_by_peaks(
     chart_type='weekly',
     return_human_readable=True,
     verbose=False,
+    swing_width=1,
 ):
     '''
         Tells the current trend (uptrend, downtrend or consolidation) of given stock.
@@ -127,92 +120,29 @@ def get_trend_by_peaks(
             downtrend_if_below_percent: Stock will be considered in downtrend if it has grown
                 for at less than this percent of units. For example, it is in downtrend if
                 it gained for less than 25% of the weeks in the last 20 weeks (i.e. 15 weeks).
-            chart_type: Currently, on 'weekly' is supported
+            chart_type: One of 'daily', 'weekly', 'monthly', 'expiry' & 'weekly_expiry'
             return_human_readable: If True, returns a human readable string, else an integer code
+            swing_width: Number of units on both sides of a bottom which should close higher
 
         Return the trend of the symbol:
             1 or 'uptrend'
             0 or 'consolidtion'
             -1 or 'downtrend'
     '''
-    SUPPORTED_CHART_TYPES = ['weekly']
-    assert chart_type in SUPPORTED_CHART_TYPES, (
-        f"chart_type should be one of {SUPPORTED_CHART_TYPES}, received {chart_type}"
-    )
-    if verbose:
-        print(
-            f'Finding trend of {symbol} on {chart_type} chart with '
-            f'num_units={num_units}, '
-            f'uptrend_if_above_percent={uptrend_if_above_percent}, '
-            f'downtrend_if_below_percent={downtrend_if_below_percent}\n'
-        )
-    if chart_type=='weekly':
-        chart_multiplier = 7
-    elif chart_type=='monthly':
-        chart_multiplier = 31
-    else:  # daily
-        chart_multiplier = 1
-    end_date = datetime.datetime.today()
-    start_date = end_date - datetime.timedelta(
-        days=((num_units + 1) * chart_multiplier)
+    closings, lengths = _get_closings(
+        symbol, num_units, uptrend_if_above_percent, downtrend_if_below_percent, chart_type, verbose
     )
-    weekly_data = get_weekly_data(
-        start_date,
-        end_date,
-        symbol
-    )
-    units = sorted(weekly_data.index.tolist(), reverse=True)
-    if len(units) < num_units: # Might be because company is newly listed & doesn't have enough data
-        print(
-            f'WARNING: Calculating trend for {symbol} based on only {len(units)} '
-            f'units of data ({num_units} were requested).'
-        )
-    if len(units) > num_units + 2:
-        print(
-            f'WARNING: Calculating trend for {symbol} based on {len(units)} units '
-            f'of data ({num_units} were requested). This might indicate a bug.'
-        )
+    bottoms, found = latest_bottoms(closings, swing_width=swing_width)
+    if found[0].sum() < 2:
+        print(f'WARNING: Less than 2 bottoms for {symbol}, trend is by count of gains')
+    answer = int(trend_by_peaks(
+        closings, lengths, uptrend_if_above_percent, downtrend_if_below_percent, swing_width
+    )[0])
 
     if verbose:
-        print(f'Got {len(units)} units of data')
-        print(units)
-        print(weekly_data)
-
-    num_compares = len(units) - 2
-    # find bottoms (first element of list is latest)
-    bottoms = []
-    for i in range(1, num_compares + 1):
-        if weekly_data.loc[units[i - 1]]['closing'] > weekly_data.loc[units[i]]['closing'] < weekly_data.loc[units[i + 1]]['closing']:
-            bottoms.append(weekly_data.loc[units[i]]['closing'])
-    if bottoms and weekly_data.loc[units[0]]['closing'] < bottoms[0]:
-        answer = -1
-    elif len(bottoms) < 2:
-        print('WARNING: raise NotImplementedError("")')
-        answer = get_trend_by_count(
-            symbol,
-            num_units,
-            uptrend_if_above_percent,
-            downtrend_if_below_percent,
-            chart_type,
-            return_human_readable=False,
-            verbose=False,
-        )
-    elif len(bottoms) >= 3 and bottoms[0] > bottoms[1] > bottoms[2]:
-        answer = 1
-    elif bottoms[0] > bottoms[1]:
-        answer = 0
-    else:
-        answer = -1
+        print('bottoms:', bottoms[0, found[0]].tolist())
+        print('len(units):', lengths[0] - 2 * swing_width)
 
-    if verbose:
-        print('bottoms:', bottoms)
-        print('len(units):', num_compares)
-
-    HUMAN_READABLE_TREND = {
-        1: 'uptrend',
-        0: 'consolidation',
-        -1: 'downtrend',
-    }
     if return_human_readable:
         return HUMAN_READABLE_TREND[answer]
     return answer
@@ -231,8 +161,17 @@ def main(
         f'num_units={num_units}, uptrend_if_above_percent={uptrend_if_above_percent}, '
         f'downtrend_if_below_percent={downtrend_if_below_percent}, chart_type={chart_type}'
     )
-    for symbol in NIFTY50 + NIFTY_NEXT_50:
-        trend = get_trend_by_peaks(symbol, num_units, uptrend_if_above_percent, downtrend_if_below_percent, chart_type, return_human_readable, verbose=False)
+    trends = scan_universe(
+        NIFTY50 + NIFTY_NEXT_50,
+        num_units,
+        uptrend_if_above_percent,
+        downtrend_if_below_percent,
+        chart_type,
+        return_human_readable,
+    )
+    if verbose:
+        print(trends)
+    for symbol, trend in trends['trend_by_peaks'].items():
         print('CONCLUSION ------ ', symbol, trend)
 
 
@@ -0,0 +1,208 @@
+'''
+    Local on-disk store of daily price history, sitting in front of `nsepy.get_history`
+
+    Every symbol is kept in its own columnar `.npz` file (one array per column) along with
+    the date ranges that have already been fetched from NSE. A request only goes to the
+    network for the parts of [start, end] that are not covered yet, so re-running an
+    analysis every day fetches just the latest bar of each symbol.
+
+    In the offline mode (`offline`, or the `NSE_OFFLINE` environment variable set to 1)
+    nothing is fetched & only the stored history is served. `nsepy` is imported only when
+    something has to be fetched, which keeps short runs on local data quick to start.
+'''
+
+import datetime
+from datetime import date
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+import instrumentation
+
+
+HISTORY_DIR = os.environ.get('NSE_HISTORY_DIR', os.path.join('cache', 'history'))
+
+# Function used to fetch the missing ranges, same signature as `nsepy.get_history`.
+# `nsepy.get_history` when None, see `get_provider`.
+provider = None
+
+# Serve only what's in the store, without fetching the missing ranges
+offline = os.environ.get('NSE_OFFLINE') == '1'
+
+# Limit on the requests to NSE of all the threads, an object with an `acquire()` blocking till
+# the next request can go (see `bulk_fetch.TokenBucket`). None for no limit.
+rate_limiter = None
+
+_COVERED_KEY = '__covered__'
+_DATE_KEY = '__date__'
+
+_locks = {}
+_locks_lock = threading.Lock()
+
+
+def _to_date(value):
+    return date(value.year, value.month, value.day)
+
+
+def _symbol_lock(symbol):
+    with _locks_lock:
+        if symbol not in _locks:
+            _locks[symbol] = threading.Lock()
+        return _locks[symbol]
+
+
+def get_provider():
+    '''`provider`, importing `nsepy.get_history` as the provider on the first call if none is set'''
+    global provider
+    if provider is None:
+        from nsepy import get_history as nsepy_get_history
+        provider = nsepy_get_history
+    return provider
+
+
+def _store_path(symbol, store_dir):
+    return os.path.join(store_dir, '%s.npz' % symbol)
+
+
+def _empty_history():
+    return pd.DataFrame(index=pd.Index([], name='Date'))
+
+
+def load(symbol, store_dir=None):
+    '''
+        Returns `(history, covered)` for `symbol` from the local store, where `covered` is a
+        sorted list of `(start_date, end_date)` ranges (both inclusive) already fetched
+    '''
+    path = _store_path(symbol, store_dir or HISTORY_DIR)
+    if not os.path.exists(path):
+        return _empty_history(), []
+
+    with np.load(path) as stored:
+        covered = [(_to_date(s.item()), _to_date(e.item())) for s, e in stored[_COVERED_KEY]]
+        index = pd.Index(stored[_DATE_KEY].astype(object), name='Date')
+        columns = {
+            key: stored[key] for key in stored.files if key not in (_COVERED_KEY, _DATE_KEY)
+        }
+    return pd.DataFrame(columns, index=index), covered
+
+
+def save(symbol, history, covered, store_dir=None):
+    '''
+        Writes `history` & its `covered` ranges for `symbol` to the local store
+    '''
+    store_dir = store_dir or HISTORY_DIR
+    os.makedirs(store_dir, exist_ok=True)
+
+    arrays = {
+        _COVERED_KEY: np.array(covered, dtype='datetime64[D]').reshape(-1, 2),
+        _DATE_KEY: np.array(history.index.tolist(), dtype='datetime64[D]'),
+    }
+    for column in history.columns:
+        values = history[column]
+        if pd.api.types.is_numeric_dtype(values):
+            arrays[column] = values.to_numpy()
+        else:
+            arrays[column] = values.to_numpy().astype(str)
+
+    path = _store_path(symbol, store_dir)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+
+
+def merge_ranges(ranges):
+    '''
+        Merges overlapping or adjacent `(start_date, end_date)` ranges
+    '''
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + datetime.timedelta(days=1):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def missing_ranges(covered, start_date, end_date):
+    '''
+        Parts of [start_date, end_date] which are not in any of the `covered` ranges
+    '''
+    missing = []
+    for covered_start, covered_end in merge_ranges(covered):
+        if covered_end < start_date:
+            continue
+        if covered_start > end_date:
+            break
+        if covered_start > start_date:
+            missing.append((start_date, covered_start - datetime.timedelta(days=1)))
+        start_date = covered_end + datetime.timedelta(days=1)
+    if start_date <= end_date:
+        missing.append((start_date, end_date))
+    return missing
+
+
+def merge_history(history, fetched):
+    '''
+        Combines stored `history` with newly `fetched` frames, newer rows win on duplicate dates
+    '''
+    frames = [frame for frame in [history] + list(fetched) if not frame.empty]
+    if not frames:
+        return history
+    combined = pd.concat(frames)
+    combined = combined[~combined.index.duplicated(keep='last')]
+    return combined.sort_index()
+
+
+def get_history(symbol, start, end, store_dir=None):
+    '''Daily history of `symbol` for the days in [start, end], shaped like `nsepy.get_history`
+
+    Only year, month & date of `start` & `end` are considered. Date ranges missing from the
+    local store are fetched through `provider` & persisted, unless `offline`. Today's bar is
+    never marked as covered, as it may still change before the market closes.
+    '''
+    start_date = _to_date(start)
+    end_date = _to_date(end)
+    if start_date > end_date:
+        return _empty_history()
+
+    with _symbol_lock(symbol):
+        with instrumentation.span('load', symbol):
+            history, covered = load(symbol, store_dir)
+        missing = missing_ranges(covered, start_date, end_date)
+        instrumentation.count('history_store_misses' if missing else 'history_store_hits', symbol=symbol)
+        if missing and offline:
+            missing = [
+                (missing_start, missing_end) for missing_start, missing_end in missing
+                if missing_start < date.today()
+            ]
+            if missing:
+                print('WARN: Offline, serving %s without %s' % (symbol, ', '.join(
+                    '%s to %s' % missing_range for missing_range in missing
+                )))
+        elif missing:
+            fetched = []
+            for missing_start, missing_end in missing:
+                if rate_limiter is not None:
+                    rate_limiter.acquire()
+                with instrumentation.span('fetch', symbol):
+                    fetched.append(get_provider()(symbol=symbol, start=missing_start, end=missing_end))
+                # Size of the frame received, nsepy doesn't tell the size of the response
+                instrumentation.count(
+                    'fetch_bytes', int(fetched[-1].memory_usage(index=True, deep=True).sum()), symbol
+                )
+            last_final_date = date.today() - datetime.timedelta(days=1)
+            covered = merge_ranges(covered + [
+                (missing_start, min(missing_end, last_final_date))
+                for missing_start, missing_end in missing
+                if missing_start <= last_final_date
+            ])
+            history = merge_history(history, fetched)
+            save(symbol, history, covered, store_dir)
+
+    if history.empty:
+        return history
+    in_range = (history.index >= start_date) & (history.index <= end_date)
+    return history[in_range]
@@ -0,0 +1,275 @@
+'''
+    Incremental end-of-day mode: keeps the latest weekly & monthly bars of every symbol (the
+    ones the trend of `num_units` units looks at) in a small persisted state & folds each new
+    daily bar into it in O(1), instead of rebuilding years of bars on every run. The bars kept
+    (& the trends) are exactly the latest ones `get_weekly_data` & `get_monthly_data` (&
+    `get_current_trend`) would compute from scratch.
+
+    Only final bars are folded in, so today's bar waits for the next day's run.
+'''
+
+import datetime
+from datetime import date
+import json
+import os
+
+import pandas as pd
+
+from bulk_fetch import prefetched_symbols
+from constants import NIFTY50
+from instrumentation import for_symbol
+from memo_cache import get_history
+from monthly_closing_prices import add_max_profit_percent_from_last_closing_column
+import output_writer
+from trading_calendar import FRIDAY, MONDAY, next_weekday, previous_weekday
+from trend_scanner import get_start_date, scan_chart_data
+
+
+STATE_DIR = os.environ.get('NSE_STATE_DIR', os.path.join('cache', 'state'))
+
+# Same start dates as the `main`s of `weekly_analysis` & `monthly_closing_prices`
+START_DATES = {
+    'weekly': date(2019, 1, 20),
+    'monthly': date(2017, 1, 20),
+}
+
+# Units the trend is looked at over, the state keeps the bars for it
+NUM_UNITS = 15
+
+BAR_COLUMNS = ['closing', 'high', 'low', 'opening', 'volume']
+INDEX_NAMES = {'weekly': 'week', 'monthly': 'month'}
+
+
+def _add_months(year, month, count):
+    month_index = year * 12 + month - 1 + count
+    return month_index // 12, month_index % 12 + 1
+
+
+def bucket_key(timeframe, day):
+    '''Key of the bar `day` belongs to, same as the index of `get_weekly_data`/`get_monthly_data`'''
+    if timeframe == 'weekly':
+        return previous_weekday(day, MONDAY).isoformat()
+    return '%s-%02d' % (day.year, day.month)
+
+
+def next_bucket_key(timeframe, key):
+    if timeframe == 'weekly':
+        return (date.fromisoformat(key) + datetime.timedelta(days=7)).isoformat()
+    return '%s-%02d' % _add_months(int(key[:4]), int(key[5:]), 1)
+
+
+def first_bucket_key(timeframe, start_date):
+    '''Key of the first bar for data starting at `start_date`: the next Monday or the month'''
+    if timeframe == 'weekly':
+        return next_weekday(start_date, MONDAY).isoformat()
+    return bucket_key(timeframe, start_date)
+
+
+def last_bucket_key(timeframe, as_of):
+    '''Key of the last bar for data till `as_of`: the week of the last Friday or the last month'''
+    if timeframe == 'weekly':
+        return bucket_key(timeframe, previous_weekday(as_of, FRIDAY))
+    return '%s-%02d' % _add_months(as_of.year, as_of.month, -1)
+
+
+def _last_final_date():
+    '''Latest day with a final bar: yesterday, as today's may still change till the market closes'''
+    return date.today() - datetime.timedelta(days=1)
+
+
+def new_state(symbol, start_dates=None, num_units=NUM_UNITS):
+    '''
+        Empty state for `symbol`, keeping enough bars for the trend of `num_units` units (all
+        of them if None)
+    '''
+    start_dates = start_dates or START_DATES
+    return {
+        'symbol': symbol,
+        'last_date': None,
+        'timeframes': {
+            timeframe: {
+                'first_key': first_bucket_key(timeframe, start_date),
+                # Latest completed bars, oldest first: [key, closing, high, low, opening, volume]
+                'bars': [],
+                # The units of `get_start_date` span up to `num_units + 2` completed bars
+                'max_bars': None if num_units is None else num_units + 2,
+                'partial': None,
+            }
+            for timeframe, start_date in start_dates.items()
+        },
+    }
+
+
+def _fold_into_timeframe(timeframe, timeframe_state, day, opening, high, low, closing, volume):
+    if timeframe == 'weekly' and day.weekday() >= 5:
+        return
+    key = bucket_key(timeframe, day)
+    if key < timeframe_state['first_key']:
+        return
+
+    partial = timeframe_state['partial']
+    if partial is not None and partial[0] == key:
+        partial[1] = closing
+        partial[2] = max(partial[2], high)
+        partial[3] = min(partial[3], low)
+        partial[5] += volume
+        return
+
+    # Bars without any trading day in between are kept, with empty values
+    if partial is None:
+        empty_key = timeframe_state['first_key']
+    else:
+        timeframe_state['bars'].append(partial)
+        empty_key = next_bucket_key(timeframe, partial[0])
+    while empty_key < key:
+        timeframe_state['bars'].append([empty_key, None, None, None, None, None])
+        empty_key = next_bucket_key(timeframe, empty_key)
+    if timeframe_state['max_bars'] is not None:
+        del timeframe_state['bars'][:-timeframe_state['max_bars']]
+    timeframe_state['partial'] = [key, closing, high, low, opening, volume]
+
+
+def fold(state, day, opening, high, low, closing, volume):
+    '''
+        Folds the daily bar of `day` into the weekly & monthly bars of `state`, in O(1).
+        Days not after the last folded day are ignored.
+    '''
+    if state['last_date'] is not None and day.isoformat() <= state['last_date']:
+        print('WARN: %s is already folded for %s, ignoring it' % (day, state['symbol']))
+        return
+    for timeframe, timeframe_state in state['timeframes'].items():
+        _fold_into_timeframe(
+            timeframe, timeframe_state, day,
+            float(opening), float(high), float(low), float(closing), int(volume),
+        )
+    state['last_date'] = day.isoformat()
+
+
+def fold_history(state, history):
+    '''Folds every day of `history` (as returned by `get_history`) into `state`, oldest first'''
+    history = history.sort_index()
+    for day, opening, high, low, closing, volume in zip(
+        history.index,
+        history['Open'].to_numpy(),
+        history['High'].to_numpy(),
+        history['Low'].to_numpy(),
+        history['Close'].to_numpy(),
+        history['Volume'].to_numpy(),
+    ):
+        fold(state, day, opening, high, low, closing, volume)
+
+
+def bars(state, timeframe, as_of):
+    '''
+        Latest bars of `timeframe` kept in `state`, as `get_weekly_data`/`get_monthly_data`
+        return them for the period from the start date of `state` till `as_of`
+    '''
+    timeframe_state = state['timeframes'][timeframe]
+    data = {INDEX_NAMES[timeframe]: [], 'closing': [], 'high': [], 'low': [], 'opening': [], 'volume': []}
+    rows = list(timeframe_state['bars'])
+    if timeframe_state['partial'] is not None:
+        rows.append(timeframe_state['partial'])
+    if not rows:
+        return pd.DataFrame(data)
+
+    last_key = last_bucket_key(timeframe, as_of)
+    empty_key = next_bucket_key(timeframe, rows[-1][0])
+    while empty_key <= last_key:
+        rows.append([empty_key, None, None, None, None, None])
+        empty_key = next_bucket_key(timeframe, empty_key)
+
+    for row in reversed(rows):
+        if row[0] > last_key:
+            continue
+        data[INDEX_NAMES[timeframe]].append(row[0])
+        for column, value in zip(BAR_COLUMNS, row[1:]):
+            data[column].append(value)
+    # No trading day at all till `as_of`
+    if all(closing is None for closing in data['closing']):
+        return pd.DataFrame({column: [] for column in data})
+    return pd.DataFrame(data).set_index(INDEX_NAMES[timeframe])
+
+
+def trend(state, as_of, num_units=NUM_UNITS, uptrend_if_above_percent=0.7, downtrend_if_below_percent=0.3,
+          chart_type='weekly'):
+    '''
+        Trend by both rules (see `trend_scanner`) on the bars of `state`, over the same units
+        `get_current_trend` looks at on `as_of`. `chart_type` is 'weekly' or 'monthly' &
+        `num_units` at most the one `state` was created for.
+    '''
+    first_key = first_bucket_key(chart_type, get_start_date(as_of, num_units, chart_type))
+    chart_data = bars(state, chart_type, as_of)
+    if not chart_data.empty:
+        chart_data = chart_data[chart_data.index >= first_key]
+    return scan_chart_data(
+        {state['symbol']: chart_data}, uptrend_if_above_percent, downtrend_if_below_percent
+    ).iloc[0]
+
+
+def _state_path(symbol, state_dir):
+    return os.path.join(state_dir, '%s.json' % symbol)
+
+
+def load_state(symbol, state_dir=None):
+    '''Persisted state of `symbol`, None if there is none'''
+    path = _state_path(symbol, state_dir or STATE_DIR)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(state, state_dir=None):
+    state_dir = state_dir or STATE_DIR
+    os.makedirs(state_dir, exist_ok=True)
+    path = _state_path(state['symbol'], state_dir)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f)
+    os.replace(path + '.tmp', path)
+
+
+def update(symbol, as_of, state_dir=None, num_units=NUM_UNITS):
+    '''
+        Folds the daily bars of `symbol` after its last folded day, till `as_of` (yesterday at
+        most, see `_last_final_date`), into its persisted state, built from the start dates in
+        `START_DATES` for the trend of `num_units` units on the first run
+    '''
+    as_of = min(as_of, _last_final_date())
+    state = load_state(symbol, state_dir) or new_state(symbol, num_units=num_units)
+    if state['last_date'] is None:
+        start_date = min(
+            date.fromisoformat(timeframe_state['first_key'][:7] + '-01')
+            for timeframe_state in state['timeframes'].values()
+        )
+    else:
+        start_date = date.fromisoformat(state['last_date']) + datetime.timedelta(days=1)
+    if start_date <= as_of:
+        fold_history(state, get_history(symbol=symbol, start=start_date, end=as_of))
+        save_state(state, state_dir)
+    return state
+
+
+def main(symbols, num_units=NUM_UNITS, chart_type='weekly'):
+    today = datetime.datetime.today()
+    as_of = date(today.year, today.month, today.day)
+    for symbol in prefetched_symbols(symbols, as_of - datetime.timedelta(days=7), as_of):
+        with for_symbol(symbol):
+            state = update(symbol, as_of, num_units=num_units)
+            weekly_data = bars(state, 'weekly', as_of)
+            monthly_data = bars(state, 'monthly', as_of)
+            add_max_profit_percent_from_last_closing_column(monthly_data)
+            for timeframe, data in [('weekly', weekly_data), ('monthly', monthly_data)]:
+                output_writer.write(
+                    data, 'bars', timeframe, symbol, csv_path='output/%s_%s_data.csv' % (symbol, timeframe)
+                )
+        print('CONCLUSION ------ ', symbol, trend(state, as_of, num_units, chart_type=chart_type)['trend_by_peaks'])
+
+
+if __name__ == '__main__':
+    symbols = NIFTY50
+
+    import sys
+    if len(sys.argv) > 1:
+        symbols = sys.argv[1].split(',')
+
+    main(symbols)
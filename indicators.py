@@ -0,0 +1,477 @@
+'''
+    Technical indicators (SMA, EMA, RSI, ATR, Bollinger bands, MACD & rolling volatility),
+    computed over whole histories or updated bar by bar
+
+    Every indicator has two paths giving exactly the same values:
+        `compute`   the whole history of a universe at once, on symbols x units matrices
+        `update`    folds the next bar of every symbol into a small state per symbol (a window
+                    of its last values, running sums & averages, as NumPy arrays with a row per
+                    symbol), in O(1)
+    Both run the same arithmetic in the same order: the running sums are cumulative sums &
+    the averages are updated a unit at a time for all the symbols at once.
+
+    A symbol without a bar (NaN, e.g. the padding of `trend_scanner.closing_matrix` or a week
+    without trading days) keeps its state & gets NaN. So do the first units of a history,
+    till the indicator has seen enough of them.
+
+    `add_indicator_columns` adds the indicators to the frames of `get_daily_data`,
+    `get_weekly_data`, `get_monthly_data` & co. For a stream of bars:
+
+        stream = IndicatorStream(DEFAULT_INDICATORS, num_symbols=len(symbols))
+        values = stream.update(closings, highs, lows)     # on every new bar
+'''
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import timed
+
+
+def _window_state(num_symbols, size):
+    return {
+        # Last `size` values of every symbol, `position` is where the next one goes
+        'window': np.zeros((num_symbols, size)),
+        'position': np.zeros(num_symbols, dtype=int),
+        'count': np.zeros(num_symbols, dtype=int),
+        'total': np.zeros(num_symbols),
+        'total_squares': np.zeros(num_symbols),
+    }
+
+
+def _push(state, values, valid):
+    '''Adds `values` of the `valid` symbols to the window `state`, dropping the oldest ones'''
+    rows = np.flatnonzero(valid)
+    size = state['window'].shape[1]
+    positions = state['position'][rows]
+    new = values[rows]
+    # Zeros till the window is full
+    old = state['window'][rows, positions]
+    state['total'][rows] += new - old
+    state['total_squares'][rows] += new * new - old * old
+    state['window'][rows, positions] = new
+    state['position'][rows] = (positions + 1) % size
+    state['count'][rows] = np.minimum(state['count'][rows] + 1, size)
+
+
+def _average_state(num_symbols):
+    return {
+        'value': np.full(num_symbols, np.nan),
+        'count': np.zeros(num_symbols, dtype=int),
+        'total': np.zeros(num_symbols),
+    }
+
+
+def _average(state, values, valid, period, alpha):
+    '''
+        Exponential moving average (weight `alpha` for the new value) of the `valid` symbols,
+        starting with the simple average of their first `period` values. Returns the averages
+        of all the symbols, NaN for the invalid ones & the ones with too few values.
+    '''
+    rows = np.flatnonzero(valid)
+    new = values[rows]
+    count = np.minimum(state['count'][rows] + 1, period + 1)
+    state['count'][rows] = count
+    value = state['value'][rows]
+
+    seeding = count <= period
+    state['total'][rows[seeding]] += new[seeding]
+    seeded = count == period
+    value[seeded] = state['total'][rows[seeded]] / period
+    smoothing = count > period
+    value[smoothing] = value[smoothing] + alpha * (new[smoothing] - value[smoothing])
+    state['value'][rows] = value
+
+    averages = np.full(len(values), np.nan)
+    averages[rows] = np.where(count >= period, value, np.nan)
+    return averages
+
+
+def _valid(*values):
+    valid = np.ones(values[0].shape, dtype=bool)
+    for value in values:
+        valid &= ~np.isnan(value)
+    return valid
+
+
+def _compacted(valid):
+    '''
+        Returns `(order, positions)` for the `valid` values of a matrix: `_take(values, order)`
+        moves the valid values of every row after its invalid ones (keeping their order) &
+        `positions` is the position of every value of the result among the valid ones of its
+        row (negative for the invalid ones)
+    '''
+    order = np.argsort(valid, axis=1, kind='stable')
+    starts = (~valid).sum(axis=1)
+    return order, np.arange(valid.shape[1]) - starts[:, None]
+
+
+def _take(values, order):
+    return np.take_along_axis(values, order, axis=1)
+
+
+def _put_back(values, order):
+    '''Values of `_take(..., order)` back where they came from'''
+    result = np.empty(values.shape)
+    np.put_along_axis(result, order, values, axis=1)
+    return result
+
+
+def _window_sums(values, positions, size):
+    '''
+        Batch path of `_push`: returns `(totals, total_squares, full)` of the windows of the
+        last `size` values at every unit, leaving out the values with negative `positions`
+    '''
+    values = np.where(positions >= 0, values, 0)
+    old = np.zeros(values.shape)
+    old[:, size:] = values[:, :values.shape[1] - size]
+    totals = np.cumsum(values - old, axis=1)
+    total_squares = np.cumsum(values * values - old * old, axis=1)
+    return totals, total_squares, positions >= size - 1
+
+
+def _averages(values, positions, period, alpha):
+    '''Batch path of `_average`, leaving out the values with negative `positions`'''
+    num_units = values.shape[1]
+    totals = np.cumsum(np.where(positions >= 0, values, 0), axis=1)
+    seed_units = period - 1 - positions[:, 0]
+    reached = seed_units[seed_units < num_units]
+
+    averages = np.full(values.shape, np.nan)
+    value = np.full(values.shape[0], np.nan)
+    if not len(reached):
+        return averages
+    # Some symbols are still seeding till the last seed, all of them are smoothing after it
+    last_seed = reached.max()
+    for unit in range(reached.min(), last_seed + 1):
+        value = np.where(seed_units == unit, totals[:, unit] / period, value)
+        value = np.where(seed_units < unit, value + alpha * (values[:, unit] - value), value)
+        averages[:, unit] = value
+    for unit in range(last_seed + 1, num_units):
+        value = value + alpha * (values[:, unit] - value)
+        averages[:, unit] = value
+    return averages
+
+
+def _previous(values, positions):
+    '''Value of the unit before every unit, NaN for the first valid one & the invalid ones'''
+    previous = np.full(values.shape, np.nan)
+    previous[:, 1:] = values[:, :-1]
+    return np.where(positions >= 1, previous, np.nan)
+
+
+class SMA:
+    '''Simple moving average of the closings over `period` units'''
+
+    def __init__(self, period=20):
+        assert period >= 1, '`period` should be at least 1'
+        self.period = period
+        self.columns = ['sma_%s' % period]
+
+    def new_state(self, num_symbols):
+        return _window_state(num_symbols, self.period)
+
+    def update(self, state, closing, high, low):
+        valid = _valid(closing)
+        _push(state, closing, valid)
+        ready = valid & (state['count'] >= self.period)
+        return {self.columns[0]: np.where(ready, state['total'] / self.period, np.nan)}
+
+    def compute(self, closings, highs, lows):
+        order, positions = _compacted(~np.isnan(closings))
+        totals, _, full = _window_sums(_take(closings, order), positions, self.period)
+        return {self.columns[0]: _put_back(np.where(full, totals / self.period, np.nan), order)}
+
+
+class EMA:
+    '''Exponential moving average of the closings over `period` units, starting with their SMA'''
+
+    def __init__(self, period=20):
+        assert period >= 1, '`period` should be at least 1'
+        self.period = period
+        self.columns = ['ema_%s' % period]
+
+    def new_state(self, num_symbols):
+        return _average_state(num_symbols)
+
+    def update(self, state, closing, high, low):
+        return {
+            self.columns[0]: _average(state, closing, _valid(closing), self.period, 2 / (self.period + 1))
+        }
+
+    def compute(self, closings, highs, lows):
+        order, positions = _compacted(~np.isnan(closings))
+        averages = _averages(_take(closings, order), positions, self.period, 2 / (self.period + 1))
+        return {self.columns[0]: _put_back(averages, order)}
+
+
+class RSI:
+    '''Relative strength index of the closings, with Wilder's averages over `period` units'''
+
+    def __init__(self, period=14):
+        assert period >= 1, '`period` should be at least 1'
+        self.period = period
+        self.columns = ['rsi_%s' % period]
+
+    def new_state(self, num_symbols):
+        return {
+            'previous': np.full(num_symbols, np.nan),
+            'gains': _average_state(num_symbols),
+            'losses': _average_state(num_symbols),
+        }
+
+    def update(self, state, closing, high, low):
+        valid = _valid(closing)
+        changed = valid & ~np.isnan(state['previous'])
+        change = closing - state['previous']
+        gains = _average(state['gains'], np.fmax(change, 0), changed, self.period, 1 / self.period)
+        losses = _average(state['losses'], np.fmax(-change, 0), changed, self.period, 1 / self.period)
+        state['previous'][valid] = closing[valid]
+
+        return {self.columns[0]: self._rsi(gains, losses)}
+
+    def compute(self, closings, highs, lows):
+        order, positions = _compacted(~np.isnan(closings))
+        closings = _take(closings, order)
+        change = closings - _previous(closings, positions)
+        gains = _averages(np.fmax(change, 0), positions - 1, self.period, 1 / self.period)
+        losses = _averages(np.fmax(-change, 0), positions - 1, self.period, 1 / self.period)
+        return {self.columns[0]: _put_back(self._rsi(gains, losses), order)}
+
+    def _rsi(self, gains, losses):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi = 100 * gains / (gains + losses)
+        # Neither gains nor losses
+        rsi[(gains == 0) & (losses == 0)] = 50
+        return rsi
+
+
+class ATR:
+    '''Average true range, with Wilder's average over `period` units'''
+
+    def __init__(self, period=14):
+        assert period >= 1, '`period` should be at least 1'
+        self.period = period
+        self.columns = ['atr_%s' % period]
+
+    def new_state(self, num_symbols):
+        return {'previous': np.full(num_symbols, np.nan), 'ranges': _average_state(num_symbols)}
+
+    def update(self, state, closing, high, low):
+        valid = _valid(closing, high, low)
+        previous = state['previous']
+        # The high-low range of the first unit, as it has no previous closing
+        true_range = np.fmax(high - low, np.fmax(np.abs(high - previous), np.abs(low - previous)))
+        atr = _average(state['ranges'], true_range, valid, self.period, 1 / self.period)
+        previous[valid] = closing[valid]
+        return {self.columns[0]: atr}
+
+    def compute(self, closings, highs, lows):
+        order, positions = _compacted(_valid(closings, highs, lows))
+        closings, highs, lows = (_take(values, order) for values in [closings, highs, lows])
+        previous = _previous(closings, positions)
+        true_range = np.fmax(highs - lows, np.fmax(np.abs(highs - previous), np.abs(lows - previous)))
+        return {self.columns[0]: _put_back(_averages(true_range, positions, self.period, 1 / self.period), order)}
+
+
+class Bollinger:
+    '''Bollinger bands: SMA of the closings over `period` units & `num_std` standard deviations around it'''
+
+    def __init__(self, period=20, num_std=2):
+        assert period >= 1, '`period` should be at least 1'
+        self.period = period
+        self.num_std = num_std
+        self.columns = ['bollinger_%s_%s' % (band, period) for band in ['middle', 'upper', 'lower']]
+
+    def new_state(self, num_symbols):
+        return _window_state(num_symbols, self.period)
+
+    def update(self, state, closing, high, low):
+        valid = _valid(closing)
+        _push(state, closing, valid)
+        ready = valid & (state['count'] >= self.period)
+        return self._bands(state['total'], state['total_squares'], ready)
+
+    def compute(self, closings, highs, lows):
+        order, positions = _compacted(~np.isnan(closings))
+        bands = self._bands(*_window_sums(_take(closings, order), positions, self.period))
+        return {column: _put_back(values, order) for column, values in bands.items()}
+
+    def _bands(self, totals, total_squares, ready):
+        middle = totals / self.period
+        std = np.sqrt(np.fmax(total_squares / self.period - middle * middle, 0))
+        middle = np.where(ready, middle, np.nan)
+        return dict(zip(self.columns, [middle, middle + self.num_std * std, middle - self.num_std * std]))
+
+
+class MACD:
+    '''
+        Moving average convergence divergence: EMA over `fast` units - EMA over `slow` units,
+        its EMA over `signal` units & the difference of both (the histogram)
+    '''
+
+    def __init__(self, fast=12, slow=26, signal=9):
+        assert 1 <= fast < slow, '`fast` should be at least 1 & less than `slow`'
+        assert signal >= 1, '`signal` should be at least 1'
+        self.fast = fast
+        self.slow = slow
+        self.signal = signal
+        suffix = '%s_%s_%s' % (fast, slow, signal)
+        self.columns = ['macd_' + suffix, 'macd_signal_' + suffix, 'macd_histogram_' + suffix]
+
+    def new_state(self, num_symbols):
+        return {
+            'fast': _average_state(num_symbols),
+            'slow': _average_state(num_symbols),
+            'signal': _average_state(num_symbols),
+        }
+
+    def update(self, state, closing, high, low):
+        valid = _valid(closing)
+        fast = _average(state['fast'], closing, valid, self.fast, 2 / (self.fast + 1))
+        slow = _average(state['slow'], closing, valid, self.slow, 2 / (self.slow + 1))
+        macd = fast - slow
+        signal = _average(state['signal'], macd, _valid(macd), self.signal, 2 / (self.signal + 1))
+        return dict(zip(self.columns, [macd, signal, macd - signal]))
+
+    def compute(self, closings, highs, lows):
+        order, positions = _compacted(~np.isnan(closings))
+        closings = _take(closings, order)
+        fast = _averages(closings, positions, self.fast, 2 / (self.fast + 1))
+        slow = _averages(closings, positions, self.slow, 2 / (self.slow + 1))
+        macd = fast - slow
+        # MACD starts with the slow average
+        signal = _averages(macd, positions - (self.slow - 1), self.signal, 2 / (self.signal + 1))
+        return dict(zip(self.columns, [_put_back(values, order) for values in [macd, signal, macd - signal]]))
+
+
+class Volatility:
+    '''
+        Standard deviation (in %) of the log returns of the last `period` units, times the
+        square root of `periods_per_year` (252 for daily units gives the annualized volatility)
+    '''
+
+    def __init__(self, period=20, periods_per_year=1):
+        assert period >= 2, '`period` should be at least 2'
+        self.period = period
+        self.periods_per_year = periods_per_year
+        self.columns = ['volatility_%s' % period]
+
+    def new_state(self, num_symbols):
+        return {'previous': np.full(num_symbols, np.nan), 'returns': _window_state(num_symbols, self.period)}
+
+    def update(self, state, closing, high, low):
+        valid = _valid(closing)
+        returned = valid & ~np.isnan(state['previous'])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log_returns = np.log(closing / state['previous'])
+        returns = state['returns']
+        _push(returns, log_returns, returned)
+        state['previous'][valid] = closing[valid]
+
+        ready = returned & (returns['count'] >= self.period)
+        return {self.columns[0]: self._volatility(returns['total'], returns['total_squares'], ready)}
+
+    def compute(self, closings, highs, lows):
+        order, positions = _compacted(~np.isnan(closings))
+        closings = _take(closings, order)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log_returns = np.log(closings / _previous(closings, positions))
+        # The first valid unit has no return
+        volatility = self._volatility(*_window_sums(log_returns, positions - 1, self.period))
+        return {self.columns[0]: _put_back(volatility, order)}
+
+    def _volatility(self, totals, total_squares, ready):
+        variance = (total_squares - totals * totals / self.period) / (self.period - 1)
+        volatility = np.sqrt(np.fmax(variance, 0) * self.periods_per_year) * 100
+        return np.where(ready, volatility, np.nan)
+
+
+DEFAULT_INDICATORS = [SMA(20), EMA(20), RSI(14), ATR(14), Bollinger(20, 2), MACD(12, 26, 9), Volatility(20)]
+
+
+def _as_rows(values, num_symbols):
+    return np.full(num_symbols, np.nan) if values is None else np.asarray(values, dtype=float).reshape(num_symbols)
+
+
+class IndicatorStream:
+    '''
+        State of `indicators` for `num_symbols` symbols, updated a bar at a time. `state` is
+        the `state` of an earlier stream, to carry on from it.
+    '''
+
+    def __init__(self, indicators=None, num_symbols=1, state=None):
+        self.indicators = DEFAULT_INDICATORS if indicators is None else indicators
+        self.num_symbols = num_symbols
+        self.state = state if state is not None else [
+            indicator.new_state(num_symbols) for indicator in self.indicators
+        ]
+
+    @property
+    def columns(self):
+        return [column for indicator in self.indicators for column in indicator.columns]
+
+    def update(self, closing, high=None, low=None):
+        '''
+            Folds the next bar (the closing, high & low of every symbol, NaN for no bar) into
+            the state & returns the values of every column of the indicators for it
+        '''
+        closing, high, low = (_as_rows(values, self.num_symbols) for values in [closing, high, low])
+        values = {}
+        for indicator, state in zip(self.indicators, self.state):
+            values.update(indicator.update(state, closing, high, low))
+        return values
+
+
+def state_to_json(state):
+    '''`state` of an `IndicatorStream` as lists & dicts, e.g. to persist it with `json`'''
+    if isinstance(state, dict):
+        return {key: state_to_json(value) for key, value in state.items()}
+    if isinstance(state, list):
+        return [state_to_json(value) for value in state]
+    return {'dtype': state.dtype.name, 'values': state.tolist()}
+
+
+def state_from_json(state):
+    '''State of `state_to_json`, back as NumPy arrays'''
+    if isinstance(state, list):
+        return [state_from_json(value) for value in state]
+    if set(state) == {'dtype', 'values'}:
+        return np.array(state['values'], dtype=state['dtype'])
+    return {key: state_from_json(value) for key, value in state.items()}
+
+
+@timed('compute')
+def compute(closings, highs=None, lows=None, indicators=None):
+    '''
+        Indicators for every unit of `closings` (& `highs` & `lows`, for ATR): 1-D or
+        symbols x units arrays, oldest unit first. Returns a dict of column -> array shaped
+        like `closings`.
+    '''
+    closings = np.asarray(closings, dtype=float)
+    matrix = np.atleast_2d(closings)
+    highs, lows = (
+        np.full(matrix.shape, np.nan) if values is None else np.asarray(values, dtype=float).reshape(matrix.shape)
+        for values in [highs, lows]
+    )
+    columns = {}
+    for indicator in DEFAULT_INDICATORS if indicators is None else indicators:
+        columns.update(indicator.compute(matrix, highs, lows))
+    return {column: values.reshape(closings.shape) for column, values in columns.items()}
+
+
+def add_indicator_columns(data: pd.DataFrame, indicators=None) -> None:
+    '''
+        Adds a column per value of `indicators` (`DEFAULT_INDICATORS` by default) to `data`,
+        as returned by `get_daily_data`, `get_weekly_data`, `get_monthly_data` & co
+    '''
+    order = np.argsort(data.index.to_numpy(), kind='stable')
+    columns = compute(
+        data['closing'].to_numpy(dtype=float)[order],
+        data['high'].to_numpy(dtype=float)[order],
+        data['low'].to_numpy(dtype=float)[order],
+        indicators,
+    )
+    for column, values in columns.items():
+        data_column = np.empty(len(order))
+        data_column[order] = values
+        data[column] = data_column
@@ -0,0 +1,251 @@
+'''
+    Per-stage timings & counters of analysis runs
+
+    The stages (fetch, load, resample, compute, write) are wrapped in `span`s & `timed`
+    functions all over the modules. Until `enable` is called they do nothing but return, so
+    they can stay in place. Once enabled, every span & counter is recorded against the symbol
+    it ran for (the one of the enclosing `for_symbol`, when not given), & the records can be
+    written as a JSON lines file of per-symbol & aggregate figures (`write_jsonl`) & as a
+    Prometheus text snapshot (`write_prometheus`).
+
+    Spans nest, so the time of a stage includes the time of the stages it calls (e.g. the
+    'total' of a symbol includes everything else).
+'''
+
+import cProfile
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+import json
+import os
+import pstats
+import threading
+import time
+
+
+enabled = False
+_profile_symbol = None
+_profile_dir = os.path.join('output', 'profiles')
+
+# Records of the spans & counters: ('span', stage, symbol, seconds) or ('count', name, symbol, value)
+_records = []
+_records_lock = threading.Lock()
+_local = threading.local()
+
+
+class _NullSpan:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+
+    def __init__(self, stage, symbol):
+        self.stage = stage
+        self.symbol = symbol
+
+    def __enter__(self):
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.started_at
+        with _records_lock:
+            _records.append(('span', self.stage, self.symbol, seconds))
+        return False
+
+
+def enable(profile_symbol=None, profile_dir=None):
+    '''
+        Starts recording. The run of `profile_symbol` (see `for_symbol`) is also profiled &
+        its stats are written to `profile_dir`.
+    '''
+    global enabled, _profile_symbol, _profile_dir
+    enabled = True
+    _profile_symbol = profile_symbol
+    _profile_dir = profile_dir or _profile_dir
+
+
+def disable():
+    global enabled, _profile_symbol
+    enabled = False
+    _profile_symbol = None
+
+
+def settings():
+    '''Arguments to `enable` another process like this one with, None if not enabled'''
+    if not enabled:
+        return None
+    return _profile_symbol, _profile_dir
+
+
+def current_symbol():
+    '''Symbol of the innermost `for_symbol` of this thread, None outside of it'''
+    return getattr(_local, 'symbol', None)
+
+
+def span(stage, symbol=None):
+    '''Context manager timing `stage` for `symbol` (the current symbol by default)'''
+    if not enabled:
+        return _NULL_SPAN
+    return _Span(stage, symbol or current_symbol())
+
+
+def timed(stage):
+    '''Decorator timing every call of the function as `stage` of the current symbol'''
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            with _Span(stage, current_symbol()):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, value=1, symbol=None):
+    '''Adds `value` to the counter `name` of `symbol` (the current symbol by default)'''
+    if not enabled:
+        return
+    with _records_lock:
+        _records.append(('count', name, symbol or current_symbol(), value))
+
+
+@contextmanager
+def for_symbol(symbol):
+    '''
+        Attributes the spans & counters of this thread to `symbol` & times all of it as its
+        'total' stage. Profiles it too, if it's the `profile_symbol` given to `enable`.
+    '''
+    if not enabled:
+        yield
+        return
+    previous_symbol = current_symbol()
+    _local.symbol = symbol
+    profiler = cProfile.Profile() if symbol == _profile_symbol else None
+    try:
+        with _Span('total', symbol):
+            if profiler is None:
+                yield
+            else:
+                profiler.enable()
+                try:
+                    yield
+                finally:
+                    profiler.disable()
+                    _write_profile(profiler, symbol)
+    finally:
+        _local.symbol = previous_symbol
+
+
+def _write_profile(profiler, symbol):
+    os.makedirs(_profile_dir, exist_ok=True)
+    path = os.path.join(_profile_dir, '%s.prof' % symbol)
+    profiler.dump_stats(path)
+    with open(os.path.join(_profile_dir, '%s.txt' % symbol), 'w') as f:
+        pstats.Stats(path, stream=f).sort_stats('cumulative').print_stats(50)
+
+
+def take_records():
+    '''Returns & forgets the records so far, to be `add_records`ed in another process'''
+    global _records
+    with _records_lock:
+        records, _records = _records, []
+    return records
+
+
+def add_records(records):
+    with _records_lock:
+        _records.extend(tuple(record) for record in records)
+
+
+def reset():
+    take_records()
+
+
+def summary():
+    '''
+        Returns `(by_symbol, aggregate)` of the records so far. `by_symbol` maps every symbol
+        to its seconds per stage & its counters; `aggregate` has, for every stage, the number
+        of spans & their total & max seconds, the totals of the counters & the hit ratios
+        of the caches.
+    '''
+    with _records_lock:
+        records = list(_records)
+
+    by_symbol = defaultdict(lambda: {'seconds': defaultdict(float), 'counters': defaultdict(int)})
+    stages = defaultdict(lambda: {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+    counters = defaultdict(int)
+    for kind, name, symbol, value in records:
+        if kind == 'span':
+            stages[name]['count'] += 1
+            stages[name]['seconds'] += value
+            stages[name]['max_seconds'] = max(stages[name]['max_seconds'], value)
+            if symbol is not None:
+                by_symbol[symbol]['seconds'][name] += value
+        else:
+            counters[name] += value
+            if symbol is not None:
+                by_symbol[symbol]['counters'][name] += value
+
+    hit_ratios = {}
+    for cache in ['memo_cache', 'history_store']:
+        lookups = counters[cache + '_hits'] + counters[cache + '_misses']
+        if lookups:
+            hit_ratios[cache] = counters[cache + '_hits'] / lookups
+
+    by_symbol = {
+        symbol: {'seconds': dict(figures['seconds']), 'counters': dict(figures['counters'])}
+        for symbol, figures in by_symbol.items()
+    }
+    aggregate = {'stages': dict(stages), 'counters': dict(counters), 'cache_hit_ratios': hit_ratios}
+    return by_symbol, aggregate
+
+
+def write_jsonl(path):
+    '''Writes a line per symbol & a last line with the aggregate (see `summary`)'''
+    by_symbol, aggregate = summary()
+    with open(path, 'w') as f:
+        for symbol, figures in by_symbol.items():
+            f.write(json.dumps(dict(type='symbol', symbol=symbol, **figures)) + '\n')
+        f.write(json.dumps(dict(type='aggregate', **aggregate)) + '\n')
+
+
+def _label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def write_prometheus(path):
+    '''Writes the aggregate (see `summary`) in the Prometheus text exposition format'''
+    _, aggregate = summary()
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append('# HELP %s %s' % (name, help_text))
+        lines.append('# TYPE %s %s' % (name, kind))
+        for labels, value in samples:
+            label_text = ','.join('%s="%s"' % (key, _label_value(label)) for key, label in labels.items())
+            lines.append('%s{%s} %s' % (name, label_text, repr(float(value))))
+
+    stages = sorted(aggregate['stages'].items())
+    metric('nse_stage_seconds_total', 'counter', 'Time spent in the stage',
+           [({'stage': stage}, figures['seconds']) for stage, figures in stages])
+    metric('nse_stage_calls_total', 'counter', 'Number of times the stage ran',
+           [({'stage': stage}, figures['count']) for stage, figures in stages])
+    metric('nse_stage_max_seconds', 'gauge', 'Longest run of the stage',
+           [({'stage': stage}, figures['max_seconds']) for stage, figures in stages])
+    metric('nse_events_total', 'counter', 'Counted events',
+           [({'name': name}, value) for name, value in sorted(aggregate['counters'].items())])
+    metric('nse_cache_hit_ratio', 'gauge', 'Share of the lookups answered by the cache',
+           [({'cache': cache}, ratio) for cache, ratio in sorted(aggregate['cache_hit_ratios'].items())])
+
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
@@ -2,8 +2,30 @@ import datetime
 
 import pandas as pd
 
+from bulk_fetch import prefetched_symbols
 from constants import NIFTY50
 from monthly_closing_prices import get_monthly_data
+import output_writer
+
+def get_long_term_investment(symbol, start_date=datetime.date(2019, 1, 20)):
+    '''
+        Returns `(invested amount, last closing, profit %age, number of months invested)` of
+        buying 1 share of `symbol` at the closing of every month since `start_date` & selling
+        all of them at the last closing
+    '''
+    today = datetime.datetime.today()
+    monthly_data = get_monthly_data(
+        start_date,
+        datetime.date(today.year, today.month, today.day),
+        symbol
+    )
+    current_value = float(monthly_data['closing'].iloc[0])
+    investment_amounts = monthly_data['closing'][1:]
+    profit_percent = (
+        current_value * len(investment_amounts) - sum(investment_amounts)
+    ) / sum(investment_amounts) * 100
+    return sum(investment_amounts), current_value, profit_percent, len(investment_amounts)
+
 
 def main():
     '''
@@ -13,29 +35,18 @@ def main():
     '''
     data = {'symbol': [], 'Invested amount (₹)': [], 'Last closing (₹)': [], 'Profit (%)': []}
     today = datetime.datetime.today()
-    for symbol in NIFTY50:
-        monthly_data = get_monthly_data(
-            datetime.date(2019, 1, 20),
-            datetime.date(today.year, today.month, today.day),
-            symbol
-        )
-        current_value = float(monthly_data[:1]['closing'])
-        investment_amounts = monthly_data['closing'][1:]
+    for symbol in prefetched_symbols(NIFTY50, datetime.date(2019, 1, 1), today):
+        invested_amount, current_value, profit_percent, num_months = get_long_term_investment(symbol)
         data['symbol'].append(symbol)
-        data['Invested amount (₹)'].append(sum(investment_amounts))
+        data['Invested amount (₹)'].append(invested_amount)
         data['Last closing (₹)'].append(current_value)
-        data['Profit (%)'].append(
-            '{:0.2f}'.format(
-                (
-                    current_value * len(investment_amounts) - sum(investment_amounts)
-                ) / sum(investment_amounts) * 100
-            )
-        )
-
-    pd.DataFrame(data).set_index('symbol').to_csv(
-        'output/long_term_investment_%smonths.csv' % len(investment_amounts),
-        index=True,
-        header=True,
+        data['Profit (%)'].append('{:0.2f}'.format(profit_percent))
+
+    output_writer.write(
+        pd.DataFrame(data).set_index('symbol'),
+        'long_term_investment',
+        'monthly',
+        csv_path='output/long_term_investment_%smonths.csv' % num_months,
     )
 
 
@@ -1,8 +1,12 @@
+import datetime
+
+from bulk_fetch import prefetched_symbols
 from constants import NIFTY50
 from monthly_closing_prices import main
 
 
-for symbol in NIFTY50:
+today = datetime.date.today()
+for symbol in prefetched_symbols(NIFTY50, datetime.date(2017, 1, 1), today):
   print('Starting processing for %s.' % symbol)
   main(symbol)
   print('Processing for %s completed.' % symbol)
@@ -1,40 +1,65 @@
 import datetime
 
+from bulk_fetch import prefetched_symbols
 from constants import NIFTY50
 from monthly_closing_prices import (
-    add_max_profit_percent_from_last_closing_column, add_max_profit_percent_from_opening_column
+    add_max_profit_within_next_units_columns, max_profit_within_next_units_column
 )
 from daily_analysis import get_daily_data
 
-def main(PROFIT_LAALACH=0.5, NO_OF_UNITS=250, verbose=False, output_format='human'):
+def get_profitable_days_percent(
+    symbol,
+    PROFIT_LAALACH=0.5,
+    NO_OF_UNITS=250,
+    NO_OF_DAYS_TO_SELL_WITHIN=1,
+    verbose=False,
+):
+    '''
+        Probability (in %) that `symbol` bought at a days's closing returned PROFIT_LAALACH
+        percent of profit within the next `NO_OF_DAYS_TO_SELL_WITHIN` days, in the last
+        `NO_OF_UNITS` days
+    '''
+    today = datetime.datetime.today()
+    data = get_daily_data(
+        datetime.date(2020,1,20),
+        datetime.date(today.year, today.month, today.day),
+        symbol
+    )
+    add_max_profit_within_next_units_columns(data, NO_OF_DAYS_TO_SELL_WITHIN)
+    # Latest days first, skipping the ones which don't have enough days after them yet
+    max_profits = data[max_profit_within_next_units_column(NO_OF_DAYS_TO_SELL_WITHIN)]
+    max_profits = max_profits.sort_index(ascending=False).dropna()
+    PROFITABLE_COUNT = int((max_profits.iloc[:NO_OF_UNITS] > PROFIT_LAALACH).sum())
+    if verbose:
+        print(data)
+    return PROFITABLE_COUNT / NO_OF_UNITS * 100
+
+
+def main(
+    PROFIT_LAALACH=0.5,
+    NO_OF_UNITS=250,
+    verbose=False,
+    output_format='human',
+    NO_OF_DAYS_TO_SELL_WITHIN=1,
+):
     '''
         Finds the probability that a stock bought at a days's closing returned
-        PROFIT_LAALACH percent of profit within the next day, in the
-        last `NO_OF_DAYS` days
+        PROFIT_LAALACH percent of profit within the next `NO_OF_DAYS_TO_SELL_WITHIN` days,
+        in the last `NO_OF_UNITS` days
         Args:
             format:
                 If 'tsv' -> results are printed in tab-separated format
                 elif 'human' -> results are printed in human readable format
     '''
     today = datetime.datetime.today()
-    for symbol in NIFTY50:
-        data = get_daily_data(
-            datetime.date(2020,1,20),
-            datetime.date(today.year, today.month, today.day),
-            symbol
+    for symbol in prefetched_symbols(NIFTY50, datetime.date(2020, 1, 20), today):
+        profitable_percent = get_profitable_days_percent(
+            symbol, PROFIT_LAALACH, NO_OF_UNITS, NO_OF_DAYS_TO_SELL_WITHIN, verbose
         )
-        add_max_profit_percent_from_last_closing_column(data)
-        PROFITABLE_COUNT = 0
-        units = sorted(data.index.tolist(), reverse=True)
-        for unit in units[:NO_OF_UNITS]:
-            if data.loc[unit]['max profit percentage from last closing'] > PROFIT_LAALACH:
-                PROFITABLE_COUNT += 1
-        if verbose:
-            print(data)
         output_string = ''
         if output_format == 'human':
             output_string += 'CONCLUSION ------ '
-        output_string += '%s\t%s' % (symbol, str(PROFITABLE_COUNT / NO_OF_UNITS * 100))
+        output_string += '%s\t%s' % (symbol, str(profitable_percent))
         # output_string += '\n%s\t%s' % (symbol, min_profit)
         print(output_string)
 
@@ -1,10 +1,33 @@
 import datetime
 
+from bulk_fetch import prefetched_symbols
 from constants import NIFTY50
 from monthly_closing_prices import (
     add_max_profit_percent_from_last_closing_column, get_monthly_data
 )
 
+def get_profitable_months_percent(symbol, MONTHLY_PROFIT_LAALACH=4, NO_OF_MONTHS=18, verbose=False):
+    '''
+        Probability (in %) that `symbol` bought at a month's closing returned
+        MONTHLY_PROFIT_LAALACH percent of profit in the next month, in the last `NO_OF_MONTHS` months
+    '''
+    today = datetime.datetime.today()
+    monthly_data = get_monthly_data(
+        datetime.date(2020,1,20),
+        datetime.date(today.year, today.month, today.day),
+        symbol
+    )
+    add_max_profit_percent_from_last_closing_column(monthly_data)
+    PROFITABLE_MONTHS_COUNT = 0
+    months = sorted(monthly_data.index.tolist(), reverse=True)
+    for month in months[:NO_OF_MONTHS]:
+        if monthly_data.loc[month]['max profit percentage from last closing'] > MONTHLY_PROFIT_LAALACH:
+            PROFITABLE_MONTHS_COUNT += 1
+    if verbose:
+        print(monthly_data)
+    return PROFITABLE_MONTHS_COUNT / NO_OF_MONTHS * 100
+
+
 def main(MONTHLY_PROFIT_LAALACH=4, NO_OF_MONTHS=18, verbose=False, output_format='human'):
     '''
         Finds the probability that a stock bought at a month's closing returned
@@ -20,24 +43,14 @@ def main(MONTHLY_PROFIT_LAALACH=4, NO_OF_MONTHS=18, verbose=False, output_format
         f'MONTHLY_PROFIT_LAALACH={MONTHLY_PROFIT_LAALACH} and NO_OF_MONTHS={NO_OF_MONTHS}\n'
     )
     today = datetime.datetime.today()
-    for symbol in NIFTY50:
-        monthly_data = get_monthly_data(
-            datetime.date(2020,1,20),
-            datetime.date(today.year, today.month, today.day),
-            symbol
+    for symbol in prefetched_symbols(NIFTY50, datetime.date(2020, 1, 1), today):
+        profitable_percent = get_profitable_months_percent(
+            symbol, MONTHLY_PROFIT_LAALACH, NO_OF_MONTHS, verbose
         )
-        add_max_profit_percent_from_last_closing_column(monthly_data)
-        PROFITABLE_MONTHS_COUNT = 0
-        months = sorted(monthly_data.index.tolist(), reverse=True)
-        for month in months[:NO_OF_MONTHS]:
-            if monthly_data.loc[month]['max profit percentage from last closing'] > MONTHLY_PROFIT_LAALACH:
-                PROFITABLE_MONTHS_COUNT += 1
-        if verbose:
-            print(monthly_data)
         output_string = ''
         if output_format == 'human':
             output_string += 'CONCLUSION ------ '
-        output_string += '%s\t%s' % (symbol, str(PROFITABLE_MONTHS_COUNT / NO_OF_MONTHS * 100))
+        output_string += '%s\t%s' % (symbol, str(profitable_percent))
         print(output_string)
 
 
@@ -1,13 +1,34 @@
 import datetime
 
-from nsepy import get_history
-
+from bulk_fetch import prefetched_symbols
 from constants import NIFTY50
 from monthly_closing_prices import (
     add_max_profit_percent_from_last_closing_column
 )
 from weekly_analysis import get_weekly_data
 
+def get_profitable_weeks_percent(symbol, WEEKLY_PROFIT_LAALACH=1, NO_OF_WEEKS=52, verbose=False):
+    '''
+        Probability (in %) that `symbol` bought at a week's closing returned
+        WEEKLY_PROFIT_LAALACH percent of profit in the next week, in the last `NO_OF_WEEKS` weeks
+    '''
+    today = datetime.datetime.today()
+    weekly_data = get_weekly_data(
+        datetime.date(2020,8,10),
+        datetime.date(today.year, today.month, today.day),
+        symbol
+    )
+    add_max_profit_percent_from_last_closing_column(weekly_data)
+    PROFITABLE_WEEKS_COUNT = 0
+    weeks = sorted(weekly_data.index.tolist(), reverse=True)
+    for week in weeks[:NO_OF_WEEKS]:
+        if weekly_data.loc[week]['max profit percentage from last closing'] > WEEKLY_PROFIT_LAALACH:
+            PROFITABLE_WEEKS_COUNT += 1
+    if verbose:
+        print(weekly_data)
+    return PROFITABLE_WEEKS_COUNT / NO_OF_WEEKS * 100
+
+
 def main(WEEKLY_PROFIT_LAALACH=1, NO_OF_WEEKS=52, verbose=False):
     '''
         Finds the probability that a stock bought at a week's closing returned
@@ -19,21 +40,11 @@ def main(WEEKLY_PROFIT_LAALACH=1, NO_OF_WEEKS=52, verbose=False):
         f'WEEKLY_PROFIT_LAALACH={WEEKLY_PROFIT_LAALACH} and NO_OF_WEEKS={NO_OF_WEEKS}\n'
     )
     today = datetime.datetime.today()
-    for symbol in NIFTY50:
-        weekly_data = get_weekly_data(
-            datetime.date(2020,8,10),
-            datetime.date(today.year, today.month, today.day),
-            symbol
+    for symbol in prefetched_symbols(NIFTY50, datetime.date(2020, 8, 10), today):
+        profitable_percent = get_profitable_weeks_percent(
+            symbol, WEEKLY_PROFIT_LAALACH, NO_OF_WEEKS, verbose
         )
-        add_max_profit_percent_from_last_closing_column(weekly_data)
-        PROFITABLE_WEEKS_COUNT = 0
-        weeks = sorted(weekly_data.index.tolist(), reverse=True)
-        for week in weeks[:NO_OF_WEEKS]:
-            if weekly_data.loc[week]['max profit percentage from last closing'] > WEEKLY_PROFIT_LAALACH:
-                PROFITABLE_WEEKS_COUNT += 1
-        if verbose:
-            print(weekly_data)
-        print('CONCLUSION ------ ', symbol, PROFITABLE_WEEKS_COUNT / NO_OF_WEEKS * 100)
+        print('CONCLUSION ------ ', symbol, profitable_percent)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,126 @@
+'''
+    In-process memo cache of price history, in front of the local history store
+
+    A request for a date range contained in an already fetched range of the same symbol is
+    answered by slicing the cached frame. Concurrent requests for the same symbol & range
+    share a single fetch. Cached frames are evicted least-recently-used first, once their
+    total size goes above `max_bytes`.
+'''
+
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import date
+import threading
+
+import history_store
+import instrumentation
+
+
+MAX_BYTES = 256 * 1024 * 1024
+
+
+def _to_date(value):
+    return date(value.year, value.month, value.day)
+
+
+def _slice(history, start_date, end_date):
+    if history.empty:
+        return history.copy()
+    return history[(history.index >= start_date) & (history.index <= end_date)]
+
+
+class HistoryMemo:
+
+    def __init__(self, fetch, max_bytes=MAX_BYTES):
+        self.fetch = fetch
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        # symbol -> (start_date, end_date, history, size in bytes), least recently used first
+        self._entries = OrderedDict()
+        # symbol -> [(start_date, end_date, future)] of the fetches in progress
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def get_history(self, symbol, start, end):
+        '''Same as `get_history` of the history store, served from memory when possible'''
+        start_date = _to_date(start)
+        end_date = _to_date(end)
+        if start_date > end_date:
+            return self.fetch(symbol=symbol, start=start_date, end=end_date)
+
+        with self._lock:
+            entry = self._entries.get(symbol)
+            if entry and entry[0] <= start_date and end_date <= entry[1]:
+                self._entries.move_to_end(symbol)
+                self.hits += 1
+                instrumentation.count('memo_cache_hits', symbol=symbol)
+                return _slice(entry[2], start_date, end_date)
+
+            for in_flight_start, in_flight_end, future in self._in_flight.get(symbol, []):
+                if in_flight_start <= start_date and end_date <= in_flight_end:
+                    self.hits += 1
+                    instrumentation.count('memo_cache_hits', symbol=symbol)
+                    break
+            else:
+                future = None
+                self.misses += 1
+                instrumentation.count('memo_cache_misses', symbol=symbol)
+                own_future = Future()
+                self._in_flight.setdefault(symbol, []).append((start_date, end_date, own_future))
+
+        if future is not None:
+            return _slice(future.result(), start_date, end_date)
+
+        try:
+            history = self.fetch(symbol=symbol, start=start_date, end=end_date)
+        except BaseException as e:
+            with self._lock:
+                self._remove_in_flight(symbol, own_future)
+            own_future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._add(symbol, start_date, end_date, history)
+            self._remove_in_flight(symbol, own_future)
+        own_future.set_result(history)
+        return _slice(history, start_date, end_date)
+
+    def _remove_in_flight(self, symbol, future):
+        in_flight = [item for item in self._in_flight[symbol] if item[2] is not future]
+        if in_flight:
+            self._in_flight[symbol] = in_flight
+        else:
+            del self._in_flight[symbol]
+
+    def _add(self, symbol, start_date, end_date, history):
+        entry = self._entries.pop(symbol, None)
+        if entry:
+            self.total_bytes -= entry[3]
+            ranges = history_store.merge_ranges([(entry[0], entry[1]), (start_date, end_date)])
+            if len(ranges) == 1:
+                start_date, end_date = ranges[0]
+                history = history_store.merge_history(entry[2], [history])
+
+        size = int(history.memory_usage(index=True, deep=True).sum())
+        self._entries[symbol] = (start_date, end_date, history, size)
+        self.total_bytes += size
+        while self._entries and self.total_bytes > self.max_bytes:
+            _, (_, _, _, evicted_size) = self._entries.popitem(last=False)
+            self.total_bytes -= evicted_size
+
+
+memo = HistoryMemo(history_store.get_history)
+
+
+def get_history(symbol, start, end):
+    '''
+        Daily history of `symbol` for the days in [start, end], through the process-wide memo
+    '''
+    return memo.get_history(symbol, start, end)
@@ -5,19 +5,24 @@
 import datetime
 from datetime import date
 
-from nsepy import get_history
+import numpy as np
 import pandas as pd
 
+from instrumentation import timed
+from memo_cache import get_history
+import output_writer
+from resample import resample_ohlcv, with_string_index
+from trading_calendar import THURSDAY, get_calendar, previous_weekday
+from utils import sliding_window_max, sliding_window_min
+
 
 def find_previous_thursday(check_date):
     '''
         To find the Thursday, just before `check_date`
-        This is useful because Thursdays are used to find closing dates
+        This is useful because Thursdays are used to find closing dates (see `get_expiry_data`
+        for the expiry cycles, holidays included)
     '''
-    while True:
-        if check_date.weekday() == 3:
-            return check_date
-        check_date = check_date - datetime.timedelta(days=1)
+    return previous_weekday(check_date, THURSDAY)
 
 '''
 Sample code for using `find_previous_thursday`
@@ -45,97 +50,120 @@ def get_monthly_data(start_date, end_date, symbol, verbose=False):
     if history.empty:
         print('No data received for the given inputs')
         return pd.DataFrame(data)
-    history_dates = set(history.index.tolist())
-
-    while end_date > start_date:
-        current_month = '%s-%s' % (end_date.year, '{:02d}'.format(end_date.month))
-        if verbose:
-            print(current_month)
-        closing = None
-        high = None
-        low = None
-        opening = None
-        volume = None
-        while current_month == '%s-%s' % (end_date.year, '{:02d}'.format(end_date.month)):
-            if end_date not in history_dates:
-                end_date -= datetime.timedelta(days=1)
-                continue
-            if not closing:
-                closing = history.loc[end_date]['Close']
-                low = history.loc[end_date]['Low']
-                high = history.loc[end_date]['High']
-                opening = history.loc[end_date]['Open']
-                volume = history.loc[end_date]['Volume']
-            else:
-                low = min(low, history.loc[end_date]['Low'])
-                high = max(high, history.loc[end_date]['High'])
-                opening = history.loc[end_date]['Open']
-                volume += history.loc[end_date]['Volume']
-            end_date -= datetime.timedelta(days=1)
-        data['month'].append(current_month)
-        data['closing'].append(closing)
-        data['high'].append(high)
-        data['low'].append(low)
-        data['opening'].append(opening)
-        data['volume'].append(volume)
-
-    return pd.DataFrame(data).set_index('month')
-
-    # curr_date = end_date
-    # first_day_of_curr_month = date(curr_date.year, curr_date.month, 1)
-    # last_day_of_prev_month = first_day_of_curr_month - datetime.timedelta(days=1)
-
-    # while True:
-    #     maybe_closing_day = find_previous_thursday(last_day_of_prev_month)
-    #     if maybe_closing_day < start_date:
-    #         break
-    #     while True:
-    #         if maybe_closing_day < start_date:
-    #             break
-    #         if maybe_closing_day in history_dates:
-    #             print('Found closing date: %s' % maybe_closing_day)
-    #             closing_dates.append(maybe_closing_day)
-    #             break
-    #         else:
-    #             maybe_closing_day -= datetime.timedelta(days=1)
-    #     last_day_of_prev_month = date(last_day_of_prev_month.year, last_day_of_prev_month.month, 1) - datetime.timedelta(days=1)
-
-    # return history[history.index.isin(closing_dates)]
+    monthly_data = resample_ohlcv(history, 'monthly', start_date, end_date)
+    return with_string_index(monthly_data, 'monthly')
+
+
+def get_expiry_data(start_date, end_date, symbol, cycle='monthly', verbose=False):
+    '''Closing, high, low & opening of the F&O expiry cycles in [start_date, end_date)
+
+    A cycle runs from the day after an expiry till the next expiry: the last Thursday of the
+    month for the 'monthly' `cycle`, every Thursday for the 'weekly' one, on the trading day
+    before when it's a holiday. Only the cycles starting on or after `start_date` & expiring
+    before `end_date` are considered. The index is the expiry day ('YYYY-MM-DD').
+    '''
+    timeframe = 'expiry' if cycle == 'monthly' else 'weekly_expiry'
+    calendar = get_calendar()
+    start_date = date(start_date.year, start_date.month, start_date.day)
+    end_date = date(end_date.year, end_date.month, end_date.day)
+    # The first cycle starting on or after `start_date` & the last one expiring before `end_date`
+    first_id = calendar.expiry_ids(start_date - datetime.timedelta(days=1), cycle) + 1
+    last_id = calendar.expiry_ids(end_date, cycle) - 1
+    start_date = calendar.expiry_of(first_id - 1, cycle).item() + datetime.timedelta(days=1)
+    end_date = calendar.expiry_of(last_id, cycle).item()
+    if verbose:
+        print('start_date', start_date)
+        print('end_date', end_date)
+
+    data = {'expiry': [], 'closing': [], 'high': [], 'low': [], 'opening': [], 'volume': []}
+    if start_date > end_date:
+        return pd.DataFrame(data)
+
+    history = get_history(symbol=symbol, start=start_date, end=end_date)
+    print('Fetched history for %s, %s to %s...' % (symbol, start_date, end_date))
+    if history.empty:
+        print('No data received for the given inputs')
+        return pd.DataFrame(data)
+    expiry_data = resample_ohlcv(history, timeframe, start_date, end_date)
+    return with_string_index(expiry_data, timeframe)
+
 
+def get_weekly_expiry_data(start_date, end_date, symbol, verbose=False):
+    '''`get_expiry_data` of the weekly expiry cycles'''
+    return get_expiry_data(start_date, end_date, symbol, 'weekly', verbose)
 
+
+def _chronological_order(data: pd.DataFrame) -> np.ndarray:
+    '''Positions of the rows of `data`, oldest unit first'''
+    return np.argsort(data.index.to_numpy(), kind='stable')
+
+
+@timed('compute')
 def add_max_profit_percent_from_last_closing_column(monthly_data: pd.DataFrame) -> None:
     '''
         Adds the profit %age earned, if stock is bought at month closing & sold at next month's high
     '''
-    months = sorted(monthly_data.index.tolist(), reverse=True)
+    order = _chronological_order(monthly_data)
+    highs = monthly_data['high'].to_numpy(dtype=float)[order]
+    closings = monthly_data['closing'].to_numpy(dtype=float)[order]
 
-    high_close_profit_percent = []
-    for i in range(len(months) - 1):
-        month_high = monthly_data.loc[months[i]]['high']
-        last_month_closing = monthly_data.loc[months[i + 1]]['closing']
-        profit_percent = (month_high - last_month_closing) / last_month_closing * 100
-        high_close_profit_percent.append(profit_percent)
+    high_close_profit_percent = np.zeros(len(order))
+    high_close_profit_percent[1:] = (highs[1:] - closings[:-1]) / closings[:-1] * 100
 
-    monthly_data['max profit percentage from last closing'] = high_close_profit_percent + [0]
+    column = np.empty(len(order))
+    column[order] = high_close_profit_percent
+    monthly_data['max profit percentage from last closing'] = column
 
 
+@timed('compute')
 def add_max_profit_percent_from_opening_column(monthly_data: pd.DataFrame) -> None:
     '''
         Adds the profit %age earned, if stock is bought at a month opening & sold at next month's high
     '''
     COLUMN_NAME = 'max profit percentage from opening'
 
-    # monthly_data[COLUMN_NAME] = ['N/A'] * len(monthly_data)
-    high_open_profit_percent = []
-    months = monthly_data.index.tolist()
-    for i in range(len(monthly_data)):
-        month_high = monthly_data.loc[months[i]]['high']
-        month_opening = monthly_data.loc[months[i]]['opening']
-        profit_percent = (month_high - month_opening) / month_opening * 100
-        # monthly_data.loc[months[i]][COLUMN_NAME] = profit_percent
-        high_open_profit_percent.append(profit_percent)
+    month_high = monthly_data['high'].to_numpy(dtype=float)
+    month_opening = monthly_data['opening'].to_numpy(dtype=float)
+    monthly_data[COLUMN_NAME] = (month_high - month_opening) / month_opening * 100
+
+
+@timed('compute')
+def add_max_profit_within_next_units_columns(data: pd.DataFrame, num_units: int = 1) -> None:
+    '''
+        Adds the max profit %age possible & the max loss %age suffered (max adverse excursion),
+        if stock is bought at a unit's closing & held for the next `num_units` units, i.e. the
+        %age from the closing to the highest high & to the lowest low of those units.
+
+        The units without `num_units` units after them get NaN. The cost is O(len(data))
+        whatever the `num_units`.
+    '''
+    assert num_units >= 1, '`num_units` should be at least 1'
+    order = _chronological_order(data)
+    highs = data['high'].to_numpy(dtype=float)[order]
+    lows = data['low'].to_numpy(dtype=float)[order]
+    closings = data['closing'].to_numpy(dtype=float)[order]
+
+    next_highest = np.full(len(order), np.nan)
+    next_lowest = np.full(len(order), np.nan)
+    num_complete = max(len(order) - num_units, 0)
+    next_highest[:num_complete] = sliding_window_max(highs[1:], num_units)
+    next_lowest[:num_complete] = sliding_window_min(lows[1:], num_units)
+
+    for column_name, extreme in [
+        (max_profit_within_next_units_column(num_units), next_highest),
+        (max_loss_within_next_units_column(num_units), next_lowest),
+    ]:
+        column = np.empty(len(order))
+        column[order] = (extreme - closings) / closings * 100
+        data[column_name] = column
+
 
-    monthly_data[COLUMN_NAME] = high_open_profit_percent
+def max_profit_within_next_units_column(num_units: int) -> str:
+    return 'max profit percentage within next %s units' % num_units
+
+
+def max_loss_within_next_units_column(num_units: int) -> str:
+    return 'max loss percentage within next %s units' % num_units
 
 
 def main(symbol):
@@ -146,11 +174,7 @@ def main(symbol):
         symbol
     )
     add_max_profit_percent_from_last_closing_column(monthly_data)
-    monthly_data.to_csv(
-        'output/%s_monthly_data.csv' % symbol,
-        index=True,
-        header=True
-    )
+    output_writer.write(monthly_data, 'bars', 'monthly', symbol, csv_path='output/%s_monthly_data.csv' % symbol)
 
 if __name__ == '__main__':
     symbol = 'PIIND'
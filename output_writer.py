@@ -0,0 +1,228 @@
+'''
+    Output dataset of the analyses, written by a background thread
+
+    All the results go to one dataset, partitioned by analysis, timeframe & run date, with a
+    file per symbol (`__all__` for the tables of a whole universe):
+
+        output/dataset/                         (override with NSE_DATASET_DIR)
+            analysis=bars/timeframe=weekly/run_date=2024-05-17/
+                INFY.npz
+                TCS.npz
+            analysis=sip_backtest/timeframe=monthly/run_date=2024-05-17/
+                __all__.npz
+
+    Every file is an `.npz` with an array per column (text as unicode arrays), so reading back
+    a symbol only opens its file & reading a column only reads that column.
+
+    `write` only queues the frame: the files are written by a background thread, so the
+    analyses don't wait on the disk. `flush` waits for everything queued so far (it's called at
+    exit too). The CSVs of the analyses (`output/<symbol>_*_data.csv` & co) are written as well
+    when `csv_output` is set (`NSE_OUTPUT_CSV=1` or `cli.py --csv`), & `export_csv` turns any
+    partition into a CSV.
+'''
+
+import atexit
+from datetime import date
+import os
+import queue
+import threading
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import current_symbol, span
+
+
+DATASET_DIR = os.environ.get('NSE_DATASET_DIR', os.path.join('output', 'dataset'))
+csv_output = os.environ.get('NSE_OUTPUT_CSV') == '1'
+
+# Frames queued at most, before `write` waits for the writer to catch up
+MAX_PENDING = 64
+ALL_SYMBOLS = '__all__'
+
+_COLUMNS_KEY = '__columns__'
+_INDEX_KEY = '__index__'
+
+
+def partition_path(analysis, timeframe, run_date, dataset_dir=None):
+    return os.path.join(
+        dataset_dir or DATASET_DIR,
+        'analysis=%s' % analysis,
+        'timeframe=%s' % timeframe,
+        'run_date=%s' % run_date,
+    )
+
+
+def _file_path(partition, symbol):
+    return os.path.join(partition, '%s.npz' % (symbol or ALL_SYMBOLS))
+
+
+def save_frame(frame, path):
+    '''Writes `frame` (index included) to the `.npz` file `path`, an array per column'''
+    index_names = [
+        name if name is not None else ('index' if frame.index.nlevels == 1 else 'level_%s' % level)
+        for level, name in enumerate(frame.index.names)
+    ]
+    table = frame.reset_index(names=index_names)
+    arrays = {
+        _COLUMNS_KEY: np.array([str(column) for column in table.columns]),
+        _INDEX_KEY: np.array(index_names, dtype=str),
+    }
+    for column in table.columns:
+        values = table[column]
+        if pd.api.types.is_numeric_dtype(values) or pd.api.types.is_datetime64_dtype(values):
+            arrays[str(column)] = values.to_numpy()
+        else:
+            arrays[str(column)] = values.to_numpy().astype(str)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+
+
+def load_frame(path, columns=None):
+    '''Reads the frame of `save_frame`, with only `columns` (& the index) if given'''
+    with np.load(path) as stored:
+        index_names = stored[_INDEX_KEY].tolist()
+        all_columns = stored[_COLUMNS_KEY].tolist()
+        if columns is not None:
+            missing = [column for column in columns if column not in all_columns]
+            assert not missing, f'{missing} not in the columns {all_columns}'
+        wanted = [
+            column for column in all_columns
+            if columns is None or column in index_names or column in columns
+        ]
+        frame = pd.DataFrame({column: stored[column] for column in wanted}, columns=wanted)
+    return frame.set_index(index_names)
+
+
+class BackgroundWriter:
+    '''
+        Runs the queued writes on a thread of its own, in the order they were queued. A process
+        forked from this one starts its own thread on its first write.
+    '''
+
+    def __init__(self, max_pending=MAX_PENDING):
+        self.max_pending = max_pending
+        self.errors = []
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._queue = queue.Queue(self.max_pending)
+                self._thread = threading.Thread(target=self._run, name='output-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            write, symbol = self._queue.get()
+            try:
+                with span('write', symbol):
+                    write()
+            except Exception as e:
+                self.errors.append(e)
+                print('WARN: Writing the output of %s failed: %s: %s' % (symbol, type(e).__name__, e))
+            finally:
+                self._queue.task_done()
+
+    def submit(self, write, symbol=None):
+        '''Queues `write` (a function of no arguments) for the instrumentation symbol `symbol`'''
+        if self._pid != os.getpid():
+            self._start()
+        self._queue.put((write, symbol or current_symbol()))
+
+    def flush(self):
+        '''Waits for the writes queued so far & returns the errors of the failed ones'''
+        if self._pid == os.getpid():
+            self._queue.join()
+        errors, self.errors = self.errors, []
+        return errors
+
+
+writer = BackgroundWriter()
+atexit.register(writer.flush)
+
+
+def write(frame, analysis, timeframe, symbol=None, csv_path=None, run_date=None, dataset_dir=None):
+    '''
+        Queues `frame` (the results of `analysis` on `timeframe` for `symbol`, or for all the
+        symbols) to be written to the partition of `run_date` (today by default), & to
+        `csv_path` as well when `csv_output` is set. `frame` shouldn't be changed afterwards.
+    '''
+    path = _file_path(partition_path(analysis, timeframe, run_date or date.today(), dataset_dir), symbol)
+    write_csv = csv_output and csv_path is not None
+
+    def write_frame():
+        save_frame(frame, path)
+        if write_csv:
+            frame.to_csv(csv_path, index=True, header=True)
+
+    writer.submit(write_frame, symbol)
+
+
+def flush():
+    return writer.flush()
+
+
+def run_dates(analysis, timeframe, dataset_dir=None):
+    '''Run dates of the partitions of `analysis` & `timeframe`, oldest first'''
+    path = os.path.dirname(partition_path(analysis, timeframe, '', dataset_dir))
+    if not os.path.isdir(path):
+        return []
+    return sorted(name[len('run_date='):] for name in os.listdir(path) if name.startswith('run_date='))
+
+
+def _partition(analysis, timeframe, run_date, dataset_dir):
+    if run_date is None:
+        dates = run_dates(analysis, timeframe, dataset_dir)
+        assert dates, f'No results of {analysis} on {timeframe} in the dataset'
+        run_date = dates[-1]
+    return partition_path(analysis, timeframe, run_date, dataset_dir)
+
+
+def _symbols_in(partition):
+    return sorted(name[:-len('.npz')] for name in os.listdir(partition) if name.endswith('.npz'))
+
+
+def symbols(analysis, timeframe, run_date=None, dataset_dir=None):
+    '''
+        Symbols with results in the partition of `run_date` (the latest by default),
+        `ALL_SYMBOLS` for the tables of a whole universe
+    '''
+    return _symbols_in(_partition(analysis, timeframe, run_date, dataset_dir))
+
+
+def read(analysis, timeframe, symbol=None, columns=None, run_date=None, dataset_dir=None):
+    '''
+        Results of `analysis` on `timeframe` of the run of `run_date` (the latest by default),
+        with only `columns` if given. With a `symbol`, only its file is read, else the results
+        of all the symbols are put together with a 'symbol' column.
+    '''
+    partition = _partition(analysis, timeframe, run_date, dataset_dir)
+    if symbol is not None:
+        return load_frame(_file_path(partition, symbol), columns)
+
+    frames = []
+    for name in _symbols_in(partition):
+        frame = load_frame(_file_path(partition, name), columns)
+        if name != ALL_SYMBOLS:
+            frame.insert(0, 'symbol', name)
+        frames.append(frame)
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames)
+
+
+def export_csv(analysis, timeframe, path, symbol=None, run_date=None, dataset_dir=None):
+    '''Writes the results `read` would return to the CSV file `path`'''
+    read(analysis, timeframe, symbol, run_date=run_date, dataset_dir=dataset_dir).to_csv(
+        path, index=True, header=True
+    )
+    return path
@@ -0,0 +1,219 @@
+'''
+    Compact, memory-mapped OHLCV panel of a whole universe
+
+    A panel keeps a symbols x dates array per column (float32 prices, int64 volume) over a
+    date axis shared by all the symbols, each in its own `.npy` file, with the symbols & the
+    columns in `meta.json`:
+
+        cache/panel/<name>/
+            meta.json
+            dates.npy       datetime64[D], the trading dates of any of the symbols
+            open.npy        float32, symbols x dates, NaN where a symbol has no bar
+            high.npy        ...
+            low.npy
+            close.npy
+            volume.npy      int64, 0 where a symbol has no bar
+
+    `open_panel` maps the files in without reading them, so opening a panel takes about the
+    same time whatever its size & only the pages actually read are loaded. The rows of every
+    symbol are contiguous, so a symbol & a date range of it are read as views.
+
+    Prices are kept in float32, which is exact to the paisa for prices below ~1,00,000.
+'''
+
+import datetime
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from bulk_fetch import fetch_histories
+from constants import NIFTY50, NIFTY_NEXT_50
+import history_store
+
+
+PANEL_DIR = os.environ.get('NSE_PANEL_DIR', os.path.join('cache', 'panel'))
+
+# panel column -> (column of `get_history`, dtype, value where a symbol has no bar)
+COLUMNS = {
+    'open': ('Open', np.float32, np.nan),
+    'high': ('High', np.float32, np.nan),
+    'low': ('Low', np.float32, np.nan),
+    'close': ('Close', np.float32, np.nan),
+    'volume': ('Volume', np.int64, 0),
+}
+
+_META_FILE = 'meta.json'
+_DATES_FILE = 'dates.npy'
+
+
+def _column_path(panel_path, column):
+    return os.path.join(panel_path, '%s.npy' % column)
+
+
+def _to_datetime64(day):
+    return np.datetime64(datetime.date(day.year, day.month, day.day), 'D')
+
+
+class Panel:
+    '''
+        Columns of an opened panel. `columns[column]` is the symbols x dates array of `column`,
+        `symbols` & `dates` are the labels of its rows & columns.
+    '''
+
+    def __init__(self, symbols, dates, columns):
+        self.symbols = symbols
+        self.dates = dates
+        self.columns = columns
+        self._rows = {symbol: row for row, symbol in enumerate(symbols)}
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def row(self, symbol):
+        '''Row of `symbol` in the arrays'''
+        assert symbol in self._rows, f'{symbol} is not in the panel'
+        return self._rows[symbol]
+
+    def date_slice(self, start=None, end=None):
+        '''Slice of the date axis for the dates in [start, end], all of them by default'''
+        first = 0 if start is None else int(np.searchsorted(self.dates, _to_datetime64(start), 'left'))
+        last = len(self.dates) if end is None else int(np.searchsorted(self.dates, _to_datetime64(end), 'right'))
+        return slice(first, last)
+
+    def values(self, column, symbol=None, start=None, end=None):
+        '''
+            Values of `column` for the dates in [start, end], of `symbol` (1-D) or of all the
+            symbols (2-D). It's a view on the mapped file, nothing is copied.
+        '''
+        dates = self.date_slice(start, end)
+        if symbol is None:
+            return self.columns[column][:, dates]
+        return self.columns[column][self.row(symbol), dates]
+
+    def history(self, symbol, start=None, end=None):
+        '''
+            Daily history of `symbol` for the dates in [start, end], shaped like the output of
+            `get_history` (with the OHLCV columns only, & only the dates it has a bar on)
+        '''
+        dates = self.date_slice(start, end)
+        row = self.row(symbol)
+        closings = self.columns['close'][row, dates]
+        traded = ~np.isnan(closings)
+        history = pd.DataFrame(
+            {
+                source_column: self.columns[column][row, dates][traded]
+                for column, (source_column, _, _) in COLUMNS.items()
+            },
+            index=pd.Index(self.dates[dates][traded].astype(object), name='Date'),
+        )
+        return history
+
+
+def write_panel(histories, panel_path):
+    '''
+        Writes a panel of a dict of symbol -> history (as returned by `get_history`) to the
+        directory `panel_path`, replacing the panel there, if any
+    '''
+    symbols = list(histories)
+    dates = np.unique(np.concatenate(
+        [np.array(history.index.tolist(), dtype='datetime64[D]') for history in histories.values()]
+        + [np.array([], dtype='datetime64[D]')]
+    ))
+    return _write(symbols, dates, histories.__getitem__, panel_path)
+
+
+def _write(symbols, dates, get_history, panel_path):
+    tmp_path = panel_path.rstrip(os.sep) + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    np.save(os.path.join(tmp_path, _DATES_FILE), dates)
+
+    arrays = {
+        column: np.lib.format.open_memmap(
+            _column_path(tmp_path, column), mode='w+', dtype=dtype, shape=(len(symbols), len(dates))
+        )
+        for column, (_, dtype, _) in COLUMNS.items()
+    }
+    for column, (_, _, missing_value) in COLUMNS.items():
+        arrays[column][:] = missing_value
+
+    for row, symbol in enumerate(symbols):
+        history = get_history(symbol)
+        if history.empty:
+            continue
+        positions = np.searchsorted(dates, np.array(history.index.tolist(), dtype='datetime64[D]'))
+        for column, (source_column, dtype, _) in COLUMNS.items():
+            arrays[column][row, positions] = history[source_column].to_numpy(dtype=dtype)
+    for array in arrays.values():
+        array.flush()
+    del arrays
+
+    with open(os.path.join(tmp_path, _META_FILE), 'w') as f:
+        json.dump({
+            'symbols': symbols,
+            'columns': {column: np.dtype(dtype).name for column, (_, dtype, _) in COLUMNS.items()},
+            'shape': [len(symbols), len(dates)],
+            'start': str(dates[0]) if len(dates) else None,
+            'end': str(dates[-1]) if len(dates) else None,
+        }, f, indent=2)
+
+    old_path = panel_path.rstrip(os.sep) + '.old'
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(panel_path):
+        os.replace(panel_path, old_path)
+    os.replace(tmp_path, panel_path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    return panel_path
+
+
+def build_panel(name, symbols, start, end, panel_dir=None):
+    '''
+        Builds the panel `name` of `symbols` for the days in [start, end], from the local
+        history store (fetching what's missing in it first). The histories are read twice,
+        once for the date axis & once to fill it in, so only the ones fetched but not looked at
+        yet (at most a few, as only their dates are kept) are in memory at a time.
+    '''
+    dates = [np.array([], dtype='datetime64[D]')]
+    fetched_symbols = []
+    for result in fetch_histories(symbols, start, end, fetch=history_store.get_history):
+        if result.error is not None:
+            print('WARN: Leaving %s out of the panel: %s' % (result.symbol, result.error))
+            continue
+        fetched_symbols.append(result.symbol)
+        dates.append(np.array(result.history.index.tolist(), dtype='datetime64[D]'))
+    symbols = [symbol for symbol in symbols if symbol in fetched_symbols]
+
+    return _write(
+        symbols,
+        np.unique(np.concatenate(dates)),
+        lambda symbol: history_store.get_history(symbol, start, end),
+        os.path.join(panel_dir or PANEL_DIR, name),
+    )
+
+
+def open_panel(name=None, panel_dir=None, panel_path=None):
+    '''
+        Opens the panel `name` (or the one at `panel_path`), memory-mapping its columns
+        read-only
+    '''
+    panel_path = panel_path or os.path.join(panel_dir or PANEL_DIR, name)
+    with open(os.path.join(panel_path, _META_FILE)) as f:
+        meta = json.load(f)
+    columns = {
+        column: np.load(_column_path(panel_path, column), mmap_mode='r')
+        for column in meta['columns']
+    }
+    return Panel(meta['symbols'], np.load(os.path.join(panel_path, _DATES_FILE)), columns)
+
+
+def main(name='NIFTY100', symbols=NIFTY50 + NIFTY_NEXT_50, years=10):
+    today = datetime.date.today()
+    panel_path = build_panel(name, symbols, today - datetime.timedelta(days=years * 365), today)
+    print('Panel of %s symbols written to %s' % (len(open_panel(panel_path=panel_path)), panel_path))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+'''
+    Swing highs & swing lows (pivots) of prices, found with NumPy over whole arrays at once
+
+    A swing low of width (left, right) is a price strictly lower than the `left` prices
+    before it & the `right` prices after it (a swing high, strictly higher). The prices are
+    oldest first along the last axis, so a symbols x units matrix (see
+    `trend_scanner.closing_matrix`) gives the pivots of every symbol in one go. NaNs (the
+    padding of the shorter histories) are never pivots & a price next to one isn't either,
+    as its neighbours aren't all known.
+
+    The sequence of the latest pivots tells the swing structure: higher highs & higher lows
+    in an uptrend, lower highs & lower lows in a downtrend.
+'''
+
+import numpy as np
+
+from utils import sliding_window_max
+
+
+def _sliding_window_sum(values, window):
+    '''`result[..., i] = sum(values[..., i:i + window])`'''
+    sums = np.cumsum(values, axis=-1)
+    padding = [(0, 0)] * (sums.ndim - 1) + [(1, 0)]
+    sums = np.pad(sums, padding)
+    return sums[..., window:] - sums[..., :-window]
+
+
+def swing_highs(values, left=1, right=1):
+    '''
+        Boolean mask of the swing highs of `values` (1-D or 2-D, oldest first along the last
+        axis): the values higher than the `left` values before them & the `right` after them
+    '''
+    assert left >= 1 and right >= 1, '`left` & `right` should be at least 1'
+    values = np.asarray(values, dtype=float)
+    length = values.shape[-1]
+    is_swing = np.zeros(values.shape, dtype=bool)
+    if length < left + right + 1:
+        return is_swing
+
+    # For the value at i (left <= i < length - right): max of values[i - left:i] & of
+    # values[i + 1:i + 1 + right]
+    before = sliding_window_max(values, left)[..., :length - left - right]
+    after = sliding_window_max(values, right)[..., left + 1:length - right + 1]
+    centre = values[..., left:length - right]
+    complete = _sliding_window_sum(np.isnan(values), left + right + 1) == 0
+    is_swing[..., left:length - right] = complete & (centre > before) & (centre > after)
+    return is_swing
+
+
+def swing_lows(values, left=1, right=1):
+    '''
+        Boolean mask of the swing lows of `values`: the values lower than the `left` values
+        before them & the `right` after them, see `swing_highs`
+    '''
+    return swing_highs(-np.asarray(values, dtype=float), left, right)
+
+
+def latest_pivots(values, is_pivot, count=3):
+    '''
+        Returns `(pivots, found)` for 2-D `values` & their pivot mask `is_pivot` (see
+        `swing_highs`), where `pivots[:, k]` is the k-th latest pivot of every row & `found[:, k]`
+        tells if there was one
+    '''
+    values = np.asarray(values, dtype=float)
+    # 1 for the latest pivot of the row, 2 for the one before it & so on
+    pivot_rank = np.cumsum(is_pivot[:, ::-1], axis=1)[:, ::-1]
+
+    pivots = np.full((values.shape[0], count), np.nan)
+    found = np.zeros((values.shape[0], count), dtype=bool)
+    for k in range(count):
+        is_kth = is_pivot & (pivot_rank == k + 1)
+        found[:, k] = is_kth.any(axis=1)
+        pivots[found[:, k], k] = np.where(is_kth, values, 0)[found[:, k]].sum(axis=1)
+    return pivots, found
+
+
+def rising_streak(pivots, found):
+    '''
+        Number of pivots in a row (from the latest, going back) which are higher than the one
+        before them, for every row of `latest_pivots`. 2 means the 3 latest pivots are rising.
+    '''
+    higher = found[:, 1:] & (pivots[:, :-1] > pivots[:, 1:])
+    return np.cumprod(higher, axis=1).sum(axis=1)
+
+
+def falling_streak(pivots, found):
+    '''Number of pivots in a row lower than the one before them, see `rising_streak`'''
+    lower = found[:, 1:] & (pivots[:, :-1] < pivots[:, 1:])
+    return np.cumprod(lower, axis=1).sum(axis=1)
+
+
+def swing_structure(highs, lows, left=1, right=1, count=3):
+    '''
+        Swing structure of every row of `highs` & `lows` (2-D, oldest first, e.g. the highs &
+        lows of a symbols x units matrix): a dict of arrays with, for the latest `count` swing
+        highs & swing lows, the number of higher highs, lower highs, higher lows & lower lows in
+        a row (see `rising_streak`) & the trend code by the swing rule: 1 with a higher high &
+        a higher low, -1 with a lower high & a lower low, else 0.
+    '''
+    highs = np.asarray(highs, dtype=float)
+    lows = np.asarray(lows, dtype=float)
+    swing_high_values, found_highs = latest_pivots(highs, swing_highs(highs, left, right), count)
+    swing_low_values, found_lows = latest_pivots(lows, swing_lows(lows, left, right), count)
+    structure = {
+        'higher_highs': rising_streak(swing_high_values, found_highs),
+        'lower_highs': falling_streak(swing_high_values, found_highs),
+        'higher_lows': rising_streak(swing_low_values, found_lows),
+        'lower_lows': falling_streak(swing_low_values, found_lows),
+    }
+    structure['trend'] = np.select(
+        [
+            (structure['higher_highs'] > 0) & (structure['higher_lows'] > 0),
+            (structure['lower_highs'] > 0) & (structure['lower_lows'] > 0),
+        ],
+        [1, -1],
+        default=0,
+    )
+    return structure
@@ -0,0 +1,131 @@
+'''
+    Parameter sweep for the `max_profit_from_*` probability studies: the probability of
+    making a profit for a whole grid of profit thresholds & lookback lengths at once
+'''
+
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from bulk_fetch import prefetched_symbols
+from constants import NIFTY50
+from daily_analysis import get_daily_data
+from instrumentation import timed
+from monthly_closing_prices import (
+    add_max_profit_within_next_units_columns,
+    get_expiry_data,
+    get_monthly_data,
+    get_weekly_expiry_data,
+    max_profit_within_next_units_column,
+)
+import output_writer
+from weekly_analysis import get_weekly_data
+
+
+DATA_GETTERS = {
+    'daily': get_daily_data,
+    'weekly': get_weekly_data,
+    'monthly': get_monthly_data,
+    'expiry': get_expiry_data,
+    'weekly_expiry': get_weekly_expiry_data,
+}
+
+
+@timed('compute')
+def probability_surface(max_profits, thresholds, lookbacks):
+    '''
+        Percentage of the latest `lookback` values of `max_profits` (latest first) that are
+        greater than `threshold`, for every threshold & lookback. Like the `max_profit_from_*`
+        scripts, the count is divided by `lookback` even when there are fewer values.
+
+        Returns a DataFrame with a row per threshold & a column per lookback. The cost is
+        O(len(max_profits) * log(len(thresholds)) + len(thresholds) * len(lookbacks)).
+    '''
+    max_profits = np.asarray(max_profits, dtype=float)
+    max_profits = max_profits[~np.isnan(max_profits)]
+    sorted_thresholds = np.sort(np.asarray(thresholds, dtype=float))
+    sorted_lookbacks = np.sort(np.asarray(lookbacks, dtype=int))
+    assert (sorted_lookbacks > 0).all(), '`lookbacks` should be positive'
+
+    # Number of thresholds each value is greater than
+    ranks = np.searchsorted(sorted_thresholds, max_profits, side='left')
+    # Smallest lookback covering each value, values not covered by any lookback are dropped
+    segments = np.searchsorted(sorted_lookbacks, np.arange(1, len(max_profits) + 1), side='left')
+    covered = segments < len(sorted_lookbacks)
+
+    counts = np.bincount(
+        segments[covered] * (len(sorted_thresholds) + 1) + ranks[covered],
+        minlength=len(sorted_lookbacks) * (len(sorted_thresholds) + 1),
+    ).reshape(len(sorted_lookbacks), len(sorted_thresholds) + 1)
+    # counts[l, r] -> values within lookback `l` greater than exactly `r` thresholds
+    counts = counts.cumsum(axis=0)
+    # greater_counts[l, t] -> values within lookback `l` greater than threshold `t`
+    greater_counts = counts[:, ::-1].cumsum(axis=1)[:, ::-1][:, 1:]
+
+    surface = pd.DataFrame(
+        (greater_counts / sorted_lookbacks[:, None] * 100).T,
+        index=pd.Index(sorted_thresholds, name='threshold'),
+        columns=pd.Index(sorted_lookbacks, name='lookback'),
+    )
+    return surface.loc[np.asarray(thresholds, dtype=float), np.asarray(lookbacks, dtype=int)]
+
+
+def sweep(
+    symbols,
+    thresholds,
+    lookbacks,
+    timeframes=('daily', 'weekly', 'monthly'),
+    start_date=datetime.date(2020, 1, 20),
+    num_units_to_sell_within=1,
+):
+    '''
+        Probability (in %) that a stock bought at a unit's closing made more than `threshold`
+        percent of profit within the next `num_units_to_sell_within` units, over the last
+        `lookback` units, for every symbol, timeframe, threshold & lookback.
+
+        The history of every symbol is loaded once, all the timeframes are built from it.
+        Returns a tidy DataFrame with the columns symbol, timeframe, threshold, lookback &
+        probability.
+    '''
+    today = datetime.datetime.today()
+    end_date = datetime.date(today.year, today.month, today.day)
+    column_name = max_profit_within_next_units_column(num_units_to_sell_within)
+
+    surfaces = {}
+    for symbol in prefetched_symbols(symbols, start_date, end_date):
+        for timeframe in timeframes:
+            data = DATA_GETTERS[timeframe](start_date, end_date, symbol)
+            if data.empty:
+                continue
+            add_max_profit_within_next_units_columns(data, num_units_to_sell_within)
+            max_profits = data[column_name].sort_index(ascending=False)
+            surfaces[(symbol, timeframe)] = probability_surface(max_profits, thresholds, lookbacks)
+
+    rows = [
+        surfaces[(symbol, timeframe)].stack().rename('probability').reset_index().assign(
+            symbol=symbol, timeframe=timeframe
+        )
+        for symbol in symbols
+        for timeframe in timeframes
+        if (symbol, timeframe) in surfaces
+    ]
+    columns = ['symbol', 'timeframe', 'threshold', 'lookback', 'probability']
+    if not rows:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(rows, ignore_index=True)[columns]
+
+
+def main(
+    thresholds=(0.25, 0.5, 0.75, 1, 1.5, 2, 3, 4, 5),
+    lookbacks=(12, 18, 26, 52, 65, 125, 250),
+    symbols=NIFTY50,
+):
+    surfaces = sweep(symbols, thresholds, lookbacks)
+    output_writer.write(
+        surfaces, 'profit_probability_surface', 'all', csv_path='output/profit_probability_surface.csv'
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,323 @@
+'''
+    Long-running query service keeping the history of a universe in memory
+
+    Loads the daily history of every symbol of the universe once (into the memo cache) & answers
+    the analyses of `cli` over HTTP (or a Unix socket), as JSON:
+
+        GET /trend?symbol=INFY,TCS&chart_type=weekly&num_units=15
+        GET /ath?symbol=INFY&percentile=95
+        GET /profit_probability?symbol=INFY&timeframe=weekly&threshold=1&lookback=52
+        GET /health
+
+    Without `symbol`, the whole universe is answered, symbols outside of it are rejected. The weekly/monthly/expiry bars are built
+    from the history in memory, so a query takes a few milliseconds, & its results are kept
+    till the end of the day, so asking again costs a dictionary lookup. Concurrent clients
+    asking the same question share a single computation.
+
+    Every day at `--refresh-at` (after the market closes), the history store fetches the new
+    days of the universe (only those), the memo is reloaded from it & the results are dropped.
+
+    Try out:
+        python3 query_service.py --universe NIFTY100 --port 8765
+        curl 'localhost:8765/trend?symbol=INFY&chart_type=monthly'
+'''
+
+import argparse
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+from functools import partial
+import json
+import os
+import sys
+import time
+from urllib.parse import parse_qsl, urlsplit
+
+import cli
+import history_store
+import memo_cache
+
+
+# Oldest day kept in memory, covering the start dates of all the analyses of `cli`
+SINCE = datetime.date(2017, 1, 1)
+REFRESH_AT = '18:30'
+MAX_CACHED_RESULTS = 100000
+
+PROFIT_TIMEFRAMES = ['daily', 'weekly', 'monthly']
+
+# path -> query parameters (other than `symbol`) -> type
+ENDPOINTS = {
+    '/trend': {'num_units': int, 'chart_type': str},
+    '/ath': {'percentile': float},
+    '/profit_probability': {'timeframe': str, 'threshold': float, 'lookback': int},
+}
+
+STATUS_TEXTS = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+}
+
+
+class QueryError(Exception):
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _task(path, options):
+    '''Task of `cli` answering `path` with `options`'''
+    options = dict(options)
+    if path == '/trend':
+        from trend_scanner import CHART_DATA_GETTERS
+        chart_type = options.get('chart_type', 'weekly')
+        if chart_type not in CHART_DATA_GETTERS:
+            raise QueryError(400, f'chart_type should be one of {list(CHART_DATA_GETTERS)}')
+        return cli.trend_task, options
+    if path == '/ath':
+        return cli.ath_task, options
+    timeframe = options.pop('timeframe', 'weekly')
+    if timeframe not in PROFIT_TIMEFRAMES:
+        raise QueryError(400, f'timeframe should be one of {PROFIT_TIMEFRAMES}')
+    return cli.ANALYSES['max_profit_' + timeframe].task, options
+
+
+def _parse_options(path, query):
+    types = ENDPOINTS[path]
+    options = {}
+    for name, value in query.items():
+        if name == 'symbol':
+            continue
+        if name not in types:
+            raise QueryError(400, f'Unknown parameter {name}, expected one of {["symbol"] + list(types)}')
+        try:
+            options[name] = types[name](value)
+        except ValueError:
+            raise QueryError(400, f'{name} should be a {types[name].__name__}, received {value}')
+    return tuple(sorted(options.items()))
+
+
+def _json_default(value):
+    # NumPy scalars
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+class QueryService:
+    '''
+        Answers the queries for `symbols` from the history since `since` kept in memory, with
+        the analyses running on `threads` threads
+    '''
+
+    def __init__(self, symbols, since=SINCE, threads=4, prefetch=True):
+        self.symbols = list(symbols)
+        self._known_symbols = set(self.symbols)
+        self.since = since
+        self.prefetch = prefetch
+        self.as_of = None
+        self.loaded_at = None
+        self.started_at = time.time()
+        self.num_queries = 0
+        # (path, symbol, options, as_of) -> future of `(results, error)`, least recently used first
+        self._results = OrderedDict()
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='query')
+
+    def _load(self):
+        '''Fetches the missing days of the universe & loads its history into the memo'''
+        today = datetime.date.today()
+        if self.prefetch and not history_store.offline:
+            cli.prefetch(self.symbols, self.since, today)
+        memo_cache.memo.clear()
+        for symbol in self.symbols:
+            memo_cache.get_history(symbol, self.since, today)
+        return today
+
+    async def load(self):
+        loop = asyncio.get_running_loop()
+        as_of = await loop.run_in_executor(self._executor, self._load)
+        self.as_of = as_of
+        self.loaded_at = time.time()
+        self._results.clear()
+
+    def _cached_result(self, key, task, symbol):
+        future = self._results.get(key)
+        if future is not None:
+            self._results.move_to_end(key)
+            return future
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, cli._run_task, task, symbol)
+        self._results[key] = future
+        while len(self._results) > MAX_CACHED_RESULTS:
+            self._results.popitem(last=False)
+        return future
+
+    async def query(self, path, query):
+        '''Answer (a dict) of `path` with the `query` parameters'''
+        if path == '/health':
+            return self.health()
+        if path not in ENDPOINTS:
+            raise QueryError(404, f'Unknown path {path}, expected one of {["/health"] + list(ENDPOINTS)}')
+        options = _parse_options(path, query)
+        task, task_options = _task(path, options)
+        if task_options:
+            task = partial(task, **task_options)
+        symbols = query['symbol'].split(',') if query.get('symbol') else self.symbols
+        # Only the symbols of the universe, which are in memory (& are safe to name files after)
+        unknown = [symbol for symbol in symbols if symbol not in self._known_symbols]
+        if unknown:
+            raise QueryError(400, f'Unknown symbols {unknown}, not in the universe of the service')
+
+        today = datetime.date.today()
+        if today != self.as_of:
+            # Yesterday's results are stale, whether the history was refreshed or not
+            self.as_of = today
+            self._results.clear()
+        self.num_queries += 1
+        answers = await asyncio.gather(*[
+            self._cached_result((path, symbol, options, today), task, symbol) for symbol in symbols
+        ])
+        return {
+            'as_of': today.isoformat(),
+            'results': {symbol: results for symbol, results, error in answers if error is None},
+            'errors': {symbol: error for symbol, _, error in answers if error is not None},
+        }
+
+    def health(self):
+        return {
+            'status': 'ok' if self.loaded_at is not None else 'loading',
+            'symbols': len(self.symbols),
+            'as_of': self.as_of and self.as_of.isoformat(),
+            'uptime_seconds': time.time() - self.started_at,
+            'loaded_seconds_ago': self.loaded_at and time.time() - self.loaded_at,
+            'queries': self.num_queries,
+            'cached_results': len(self._results),
+            'memo_bytes': memo_cache.memo.total_bytes,
+            'offline': history_store.offline,
+        }
+
+    async def respond(self, method, target):
+        '''Returns `(status, answer)` of the request'''
+        if method != 'GET':
+            return 405, {'error': 'Only GET is supported'}
+        url = urlsplit(target)
+        try:
+            return 200, await self.query(url.path.rstrip('/') or '/', dict(parse_qsl(url.query)))
+        except QueryError as e:
+            return e.status, {'error': str(e)}
+
+    async def handle(self, reader, writer):
+        '''Serves the HTTP/1.1 requests of a connection, keeping it alive between them'''
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                parts = request_line.decode('latin-1').split()
+                if len(parts) != 3:
+                    break
+                method, target, version = parts
+                status, answer = await self.respond(method, target)
+                body = json.dumps(answer, default=_json_default).encode()
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                writer.write((
+                    'HTTP/1.1 %s %s\r\nContent-Type: application/json\r\nContent-Length: %s\r\n'
+                    'Connection: %s\r\n\r\n'
+                    % (status, STATUS_TEXTS[status], len(body), 'keep-alive' if keep_alive else 'close')
+                ).encode() + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def refresh_daily(self, refresh_at=REFRESH_AT):
+        '''Reloads the history every day at `refresh_at` ('HH:MM', local time)'''
+        hour, minute = (int(part) for part in refresh_at.split(':'))
+        while True:
+            now = datetime.datetime.now()
+            next_refresh = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+            if next_refresh <= now:
+                next_refresh += datetime.timedelta(days=1)
+            await asyncio.sleep((next_refresh - now).total_seconds())
+            try:
+                await self.load()
+                _log('Refreshed the history of %s symbols' % len(self.symbols))
+            except Exception as e:
+                _log('WARN: Refresh failed: %s: %s' % (type(e).__name__, e))
+
+    async def serve(self, host='127.0.0.1', port=8765, unix_path=None, refresh_at=REFRESH_AT):
+        await self.load()
+        if unix_path:
+            server = await asyncio.start_unix_server(self.handle, path=unix_path)
+            _log('Serving %s symbols on %s' % (len(self.symbols), unix_path))
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+            _log('Serving %s symbols on http://%s:%s' % (len(self.symbols), host, port))
+        refresher = asyncio.ensure_future(self.refresh_daily(refresh_at))
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            refresher.cancel()
+            self._executor.shutdown(wait=False)
+
+
+def _log(message):
+    # stdout is silenced (see `main`), the analyses print a lot
+    print(message, file=sys.stderr, flush=True)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Serves the analyses of a universe from memory')
+    parser.add_argument(
+        '--universe', default='NIFTY50',
+        help='One of %s or the path of a file of symbols' % ', '.join(cli.UNIVERSES),
+    )
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', default=None, help='Serves on this Unix socket instead')
+    parser.add_argument(
+        '--since', type=datetime.date.fromisoformat, default=SINCE,
+        help='Oldest day of history kept in memory (YYYY-MM-DD)',
+    )
+    parser.add_argument(
+        '--refresh-at', default=REFRESH_AT, help='Time of the daily refresh (HH:MM, local time)',
+    )
+    parser.add_argument('--threads', type=int, default=4, help='Threads running the analyses')
+    parser.add_argument('--no-prefetch', action='store_true', help="Don't fill the local history store first")
+    parser.add_argument('--offline', action='store_true', help='Only use the local history store')
+    parser.add_argument('--verbose', action='store_true', help='Show the output of the analyses')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.offline:
+        history_store.offline = True
+    if not args.verbose:
+        sys.stdout = open(os.devnull, 'w')
+    service = QueryService(
+        cli.load_universe(args.universe), args.since, args.threads, prefetch=not args.no_prefetch
+    )
+    try:
+        asyncio.run(service.serve(args.host, args.port, args.unix, args.refresh_at))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
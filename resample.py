@@ -0,0 +1,160 @@
+'''
+    Resampling of daily price history (as returned by `get_history`) into weekly & monthly bars,
+    & into bars of the monthly & weekly F&O expiry cycles
+'''
+
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import timed
+from trading_calendar import SATURDAY, get_calendar, month_ids, to_days, week_ids, weekdays
+
+
+# timeframe -> (pandas period frequency, index name, index format of the legacy string keys)
+TIMEFRAMES = {
+    'weekly': ('W-SUN', 'week', '%Y-%m-%d'),
+    'monthly': ('M', 'month', '%Y-%m'),
+    # Expiry cycles are periods of the month (or week) of their expiry, keyed by the expiry day
+    'expiry': ('M', 'expiry', '%Y-%m-%d'),
+    'weekly_expiry': ('W-SUN', 'expiry', '%Y-%m-%d'),
+}
+
+# expiry timeframe -> expiry cycle of `trading_calendar`
+EXPIRY_CYCLES = {
+    'expiry': 'monthly',
+    'weekly_expiry': 'weekly',
+}
+
+BAR_COLUMNS = ['closing', 'high', 'low', 'opening', 'volume']
+
+
+def _expiry_ids(dates, cycle):
+    return get_calendar().expiry_ids(dates, cycle)
+
+
+# timeframe -> ids of the bars of dates
+BAR_IDS = {
+    'weekly': week_ids,
+    'monthly': month_ids,
+    'expiry': partial(_expiry_ids, cycle='monthly'),
+    'weekly_expiry': partial(_expiry_ids, cycle='weekly'),
+}
+
+
+def _is_valid(values):
+    return ~np.isnan(values) if values.dtype.kind == 'f' else np.ones(len(values), dtype=bool)
+
+
+def _nan_to_zero(values):
+    return np.nan_to_num(values) if values.dtype.kind == 'f' else values
+
+
+def _first_valid(values, starts, ends):
+    '''Position of the first non-NaN value of every bar of [starts[i], ends[i]), -1 if none'''
+    positions = np.where(_is_valid(values), np.arange(len(values)), len(values))
+    first = np.minimum.reduceat(positions, starts)
+    return np.where(first < ends, first, -1)
+
+
+def _last_valid(values, starts):
+    '''Position of the last non-NaN value of every bar starting at `starts[i]`, -1 if none'''
+    positions = np.where(_is_valid(values), np.arange(len(values)), -1)
+    last = np.maximum.reduceat(positions, starts)
+    return np.where(last >= starts, last, -1)
+
+
+def _pick(values, positions):
+    picked = values[np.maximum(positions, 0)]
+    if (positions < 0).any():
+        picked = np.where(positions < 0, np.nan, picked)
+    return picked
+
+
+@timed('resample')
+def resample_ohlcv(history, timeframe, start_date=None, end_date=None):
+    '''Bars of `timeframe` from daily `history`, latest bar first
+
+    Every bar has the first open, max high, min low, last close & total volume of its days
+    (NaN prices are skipped, like pandas' aggregations do). The index is a `PeriodIndex`.
+    Weekly bars only consider Monday to Friday. An expiry cycle ('expiry' or 'weekly_expiry')
+    has the days after the previous expiry till its own expiry (moved back over holidays). If
+    `start_date` & `end_date` are given, every bar between them is present, with NaN values
+    for the ones without any trading day.
+
+    The days are bucketed by the week/month/expiry ids of `trading_calendar` & every bar is
+    reduced over its slice of the (sorted) days.
+    '''
+    assert timeframe in TIMEFRAMES, (
+        f"timeframe should be one of {list(TIMEFRAMES)}, received {timeframe}"
+    )
+    freq, index_name, _ = TIMEFRAMES[timeframe]
+
+    days = to_days(history.index)
+    columns = {
+        'closing': history['Close'].to_numpy(),
+        'high': history['High'].to_numpy(),
+        'low': history['Low'].to_numpy(),
+        'opening': history['Open'].to_numpy(),
+        'volume': history['Volume'].to_numpy(),
+    }
+    keep = weekdays(days) < SATURDAY if timeframe == 'weekly' else np.ones(len(days), dtype=bool)
+    order = np.argsort(days[keep], kind='stable')
+    ids = BAR_IDS[timeframe](days[keep][order])
+    columns = {column: values[keep][order] for column, values in columns.items()}
+
+    # Slice [starts[i], ends[i]) of the days of every bar
+    starts = np.flatnonzero(np.diff(ids, prepend=ids[:1] - 1))
+    ends = np.append(starts[1:], len(ids))
+    bar_ids = ids[starts]
+    if len(starts):
+        bars = {
+            'closing': _pick(columns['closing'], _last_valid(columns['closing'], starts)),
+            # fmax & fmin skip NaN
+            'high': np.fmax.reduceat(columns['high'], starts),
+            'low': np.fmin.reduceat(columns['low'], starts),
+            'opening': _pick(columns['opening'], _first_valid(columns['opening'], starts, ends)),
+            'volume': np.add.reduceat(_nan_to_zero(columns['volume']), starts),
+        }
+    else:
+        bars = {column: values[:0] for column, values in columns.items()}
+
+    if start_date is not None and end_date is not None:
+        # Every bar of [start_date, end_date], NaN where there's no trading day
+        first_id, last_id = BAR_IDS[timeframe]([to_days(start_date), to_days(end_date)])
+        all_ids = np.arange(first_id, last_id + 1)
+        inside = (bar_ids >= first_id) & (bar_ids <= last_id)
+        positions = bar_ids[inside] - first_id
+        for column, values in bars.items():
+            values = values[inside]
+            if len(positions) < len(all_ids):
+                filled = np.full(len(all_ids), np.nan)
+                filled[positions] = values
+                values = filled
+            bars[column] = values
+        bar_ids = all_ids
+
+    bars = pd.DataFrame(
+        {column: bars[column][::-1] for column in BAR_COLUMNS},
+        index=pd.PeriodIndex.from_ordinals(bar_ids[::-1], freq=freq),
+    )
+    bars.index.name = index_name
+    return bars
+
+
+def with_string_index(bars, timeframe):
+    '''
+        Replaces the `PeriodIndex` of `bars` with the string keys used in the output files,
+        i.e. the Monday of the week ('YYYY-MM-DD'), the month ('YYYY-MM') or the expiry day
+        of the cycle ('YYYY-MM-DD')
+    '''
+    _, index_name, index_format = TIMEFRAMES[timeframe]
+    bars = bars.copy()
+    if timeframe in EXPIRY_CYCLES:
+        expiries = get_calendar().expiry_of(bars.index.asi8, EXPIRY_CYCLES[timeframe])
+        keys = pd.DatetimeIndex(expiries).strftime(index_format)
+    else:
+        keys = bars.index.start_time.strftime(index_format)
+    bars.index = pd.Index(keys, name=index_name)
+    return bars
@@ -0,0 +1,428 @@
+'''
+    Stock screener: filters a universe with an expression over per-symbol metrics
+
+        trend == uptrend and ath_distance(95) > -10 and profit_probability('weekly', 1, 52) > 60
+
+    An expression is a Python expression restricted to:
+        metrics             `trend`, `ath_distance(95)`, ... (see `METRICS`), a metric without
+                            arguments takes its defaults
+        numbers             10, -2.5 & the trend codes uptrend, consolidation & downtrend
+        comparisons         <, <=, >, >=, ==, != (chained too: 0 < returns(20) < 10)
+        arithmetic          +, -, *, /, abs(x), min(x, y), max(x, y)
+        logic               and, or, not
+
+    The metrics are columns of a table of the universe, computed the first time an expression
+    refers to them & kept (till the end of the day), so an expression is evaluated with NumPy
+    over whole columns & only the metrics it refers to are ever computed.
+
+    Try out:
+        python3 screener.py "trend == uptrend and ath_distance(95) > -10" --universe NIFTY100
+        python3 screener.py "returns(20) > 5" --sort-by "returns(20)" --limit 10
+        python3 screener.py --list-metrics
+'''
+
+import argparse
+import ast
+from collections import namedtuple
+import contextlib
+import datetime
+import functools
+import inspect
+import io
+import sys
+
+import numpy as np
+import pandas as pd
+
+import cli
+from memo_cache import get_history
+
+
+class ExpressionError(ValueError):
+    pass
+
+
+def _per_symbol(symbols, compute):
+    '''`compute(symbol)` of every symbol, NaN for the ones it fails for'''
+    values = np.full(len(symbols), np.nan)
+    for i, symbol in enumerate(symbols):
+        try:
+            values[i] = compute(symbol)
+        except Exception as e:
+            print('WARN: Screener metric failed for %s: %s: %s' % (symbol, type(e).__name__, e))
+    return values
+
+
+def _trends(symbols, chart_type, num_units, rule):
+    from trend_scanner import CHART_DATA_GETTERS, get_chart_data, scan_chart_data
+    assert chart_type in CHART_DATA_GETTERS, (
+        f"chart_type should be one of {list(CHART_DATA_GETTERS)}, received {chart_type}"
+    )
+    end_date = datetime.datetime.today()
+    chart_data_by_symbol = {}
+    for symbol in symbols:
+        try:
+            chart_data_by_symbol[symbol] = get_chart_data(symbol, num_units, chart_type, end_date)
+        except Exception as e:
+            print('WARN: Screener metric failed for %s: %s: %s' % (symbol, type(e).__name__, e))
+    trends = scan_chart_data(chart_data_by_symbol, return_human_readable=False)
+    return trends[rule].reindex(symbols).to_numpy(dtype=float)
+
+
+def trend(symbols, chart_type='weekly', num_units=15):
+    return _trends(symbols, chart_type, num_units, 'trend_by_peaks')
+
+
+def trend_by_count(symbols, chart_type='weekly', num_units=15):
+    return _trends(symbols, chart_type, num_units, 'trend_by_count')
+
+
+def ltp(symbols):
+    today = datetime.date.today()
+    return _per_symbol(
+        symbols,
+        lambda symbol: get_history(symbol, today - datetime.timedelta(days=15), today)['Close'].iloc[-1],
+    )
+
+
+def ath_distance(symbols, percentile=95, days=365):
+    from ath_comparisons import get_current_with_ath
+
+    def distance(symbol):
+        percentile_highest_price, _, ltp = get_current_with_ath(symbol, percentile, days)
+        return (ltp / percentile_highest_price - 1) * 100
+
+    return _per_symbol(symbols, distance)
+
+
+def profit_probability(symbols, timeframe='weekly', threshold=1, lookback=52):
+    assert timeframe in PROFIT_TIMEFRAMES, (
+        f"timeframe should be one of {PROFIT_TIMEFRAMES}, received {timeframe}"
+    )
+    task = cli.ANALYSES['max_profit_' + timeframe].task
+    return _per_symbol(
+        symbols, lambda symbol: task(symbol, threshold=threshold, lookback=lookback)['probability']
+    )
+
+
+def returns(symbols, days=20):
+    assert days >= 1, '`days` should be at least 1'
+    today = datetime.date.today()
+
+    def percent_change(symbol):
+        # Twice the calendar days covers `days` trading days, holidays included
+        closings = get_history(symbol, today - datetime.timedelta(days=2 * days + 10), today)['Close']
+        if len(closings) <= days:
+            return np.nan
+        return (closings.iloc[-1] / closings.iloc[-1 - days] - 1) * 100
+
+    return _per_symbol(symbols, percent_change)
+
+
+PROFIT_TIMEFRAMES = ['daily', 'weekly', 'monthly']
+
+# compute: function of the symbols & the arguments of the metric, giving an array of a
+# value per symbol (NaN where there is none)
+Metric = namedtuple('Metric', ['compute', 'description'])
+
+METRICS = {
+    'trend': Metric(
+        trend, 'Trend by peaks (uptrend, consolidation or downtrend) on chart_type chart over num_units units'
+    ),
+    'trend_by_count': Metric(trend_by_count, 'Trend by counting the gains, see `trend`'),
+    'ltp': Metric(ltp, 'Last closing price'),
+    'ath_distance': Metric(
+        ath_distance, 'Percent of the last closing above (below if negative) the percentile high of the last days'
+    ),
+    'profit_probability': Metric(
+        profit_probability,
+        'Percent of the last lookback units (daily, weekly or monthly) bought at closing which made threshold % of profit in the next one',
+    ),
+    'returns': Metric(returns, 'Percent change of the closing over the last days trading days'),
+}
+
+CONSTANTS = {
+    'uptrend': 1,
+    'consolidation': 0,
+    'downtrend': -1,
+}
+
+FUNCTIONS = {
+    'abs': np.abs,
+    # NaN (no value) stays NaN
+    'min': np.minimum,
+    'max': np.maximum,
+}
+
+_COMPARISONS = {
+    ast.Lt: np.less,
+    ast.LtE: np.less_equal,
+    ast.Gt: np.greater,
+    ast.GtE: np.greater_equal,
+    ast.Eq: np.equal,
+    ast.NotEq: np.not_equal,
+}
+
+_ARITHMETIC = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.true_divide,
+}
+
+
+def _metric_parameters(name):
+    # The first parameter is the symbols
+    return list(inspect.signature(METRICS[name].compute).parameters.values())[1:]
+
+
+def _metric_key(node):
+    '''`(name, arguments)` of the metric referred to by the Name or Call `node`'''
+    if isinstance(node, ast.Name):
+        name, args, keywords = node.id, [], []
+    else:
+        name, args, keywords = node.func.id, node.args, node.keywords
+    parameters = _metric_parameters(name)
+    values = {}
+    for parameter, arg in zip(parameters, args):
+        values[parameter.name] = arg
+    if len(args) > len(parameters):
+        raise ExpressionError(f'{name} takes at most {len(parameters)} arguments, received {len(args)}')
+    for keyword in keywords:
+        if keyword.arg not in [parameter.name for parameter in parameters] or keyword.arg in values:
+            raise ExpressionError(f'Unexpected argument {keyword.arg} of {name}')
+        values[keyword.arg] = keyword.value
+    for arg_name, arg in values.items():
+        if not isinstance(arg, ast.Constant) or not isinstance(arg.value, (int, float, str)):
+            raise ExpressionError(f'Arguments of {name} should be numbers or strings, {arg_name} is not')
+    return name, tuple(
+        values[parameter.name].value if parameter.name in values else parameter.default
+        for parameter in parameters
+    )
+
+
+def metric_label(key):
+    '''Column of the metric `key` in the results, the name alone for the default arguments'''
+    name, args = key
+    if args == tuple(parameter.default for parameter in _metric_parameters(name)):
+        return name
+    return '%s(%s)' % (name, ', '.join(str(arg) for arg in args))
+
+
+def parse(expression):
+    '''
+        Checks that `expression` only uses what a screener expression may, returning its tree
+        & the keys (name, arguments) of the metrics it refers to, in order
+    '''
+    try:
+        tree = ast.parse(expression.strip(), mode='eval')
+    except SyntaxError as e:
+        raise ExpressionError(f'Invalid expression {expression!r}: {e.msg}')
+    keys = []
+
+    def check(node):
+        if isinstance(node, ast.Name) and node.id in METRICS or (
+            isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in METRICS
+        ):
+            key = _metric_key(node)
+            if key not in keys:
+                keys.append(key)
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS:
+            num_args = 1 if node.func.id == 'abs' else 2
+            if node.keywords or len(node.args) != num_args:
+                raise ExpressionError(f'{node.func.id} takes {num_args} arguments')
+            for arg in node.args:
+                check(arg)
+        elif isinstance(node, ast.Name):
+            if node.id not in CONSTANTS:
+                raise ExpressionError(
+                    f'Unknown name {node.id}, expected one of {list(METRICS) + list(CONSTANTS)}'
+                )
+        elif isinstance(node, ast.Constant):
+            if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+                raise ExpressionError(f'Unexpected constant {node.value!r}, only numbers are allowed')
+        elif isinstance(node, ast.BoolOp):
+            for value in node.values:
+                check(value)
+        elif isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Not, ast.USub, ast.UAdd)):
+            check(node.operand)
+        elif isinstance(node, ast.Compare) and all(type(op) in _COMPARISONS for op in node.ops):
+            for operand in [node.left] + node.comparators:
+                check(operand)
+        elif isinstance(node, ast.BinOp) and type(node.op) in _ARITHMETIC:
+            check(node.left)
+            check(node.right)
+        else:
+            raise ExpressionError(f'{ast.unparse(node)!r} is not allowed in a screener expression')
+
+    check(tree.body)
+    return tree.body, keys
+
+
+def _evaluate(node, columns):
+    '''Value of the checked `node` (see `parse`), with `columns` of metric key -> values'''
+    if isinstance(node, ast.Constant):
+        return node.value
+    if isinstance(node, ast.Name) and node.id in CONSTANTS:
+        return CONSTANTS[node.id]
+    if isinstance(node, ast.Call) and node.func.id in FUNCTIONS:
+        return FUNCTIONS[node.func.id](*[_evaluate(arg, columns) for arg in node.args])
+    if isinstance(node, (ast.Name, ast.Call)):
+        return columns[_metric_key(node)]
+    if isinstance(node, ast.BoolOp):
+        combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+        return functools.reduce(combine, [_evaluate(value, columns) for value in node.values])
+    if isinstance(node, ast.UnaryOp):
+        operand = _evaluate(node.operand, columns)
+        if isinstance(node.op, ast.Not):
+            return np.logical_not(operand)
+        return np.negative(operand) if isinstance(node.op, ast.USub) else operand
+    if isinstance(node, ast.Compare):
+        left = _evaluate(node.left, columns)
+        result = True
+        for op, comparator in zip(node.ops, node.comparators):
+            right = _evaluate(comparator, columns)
+            result = np.logical_and(result, _COMPARISONS[type(op)](left, right))
+            left = right
+        return result
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return _ARITHMETIC[type(node.op)](_evaluate(node.left, columns), _evaluate(node.right, columns))
+
+
+class Screener:
+    '''
+        Metrics table of `symbols`, filled in as the expressions refer to the metrics. Its
+        metrics are the ones of the day it was made on.
+    '''
+
+    def __init__(self, symbols):
+        self.symbols = list(symbols)
+        self.as_of = datetime.date.today()
+        # metric key -> values, in the order of `symbols`
+        self.columns = {}
+
+    def metric(self, key):
+        '''Values of the metric `key` (name, arguments) for all the symbols'''
+        if key not in self.columns:
+            name, args = key
+            values = np.asarray(METRICS[name].compute(self.symbols, *args), dtype=float)
+            assert values.shape == (len(self.symbols),), f'{name} should give a value per symbol'
+            self.columns[key] = values
+        return self.columns[key]
+
+    @property
+    def table(self):
+        '''The metrics computed so far, as a table indexed by symbol'''
+        return pd.DataFrame(
+            {metric_label(key): values for key, values in self.columns.items()},
+            index=pd.Index(self.symbols, name='symbol'),
+        )
+
+    def screen(self, expression, sort_by=None, ascending=False, limit=None):
+        '''
+            Symbols for which `expression` holds, with the metrics it (& `sort_by`) refers to,
+            sorted by the values of the expression `sort_by` (missing values last) & cut to
+            the first `limit`. Symbols missing a value of a metric of `expression` never match.
+        '''
+        tree, expression_keys = parse(expression)
+        keys = list(expression_keys)
+        if sort_by is not None:
+            sort_tree, sort_keys = parse(sort_by)
+            keys += [key for key in sort_keys if key not in keys]
+        columns = {key: self.metric(key) for key in keys}
+
+        selected = np.broadcast_to(
+            np.asarray(_evaluate(tree, columns), dtype=bool), (len(self.symbols),)
+        )
+        # `not`, `!=` & `or` can be true without a value, NaN only fails the comparisons
+        if expression_keys:
+            missing = np.isnan(np.column_stack([
+                np.asarray(columns[key], dtype=float) for key in expression_keys
+            ])).any(axis=1)
+            selected = selected & ~missing
+        results = pd.DataFrame(
+            {metric_label(key): values[selected] for key, values in columns.items()},
+            index=pd.Index(np.array(self.symbols, dtype=object)[selected], name='symbol'),
+        )
+        if sort_by is not None:
+            sort_values = np.broadcast_to(
+                np.asarray(_evaluate(sort_tree, columns), dtype=float), (len(self.symbols),)
+            )[selected]
+            order = np.argsort(sort_values if ascending else -sort_values, kind='stable')
+            results = results.iloc[order]
+        if limit is not None:
+            results = results.iloc[:limit]
+        return results
+
+
+# tuple of symbols -> screener of today
+_screeners = {}
+
+
+def get_screener(symbols):
+    '''Screener of `symbols`, sharing its metrics with the earlier calls of the day'''
+    key = tuple(symbols)
+    screener = _screeners.get(key)
+    if screener is None or screener.as_of != datetime.date.today():
+        screener = _screeners[key] = Screener(symbols)
+    return screener
+
+
+def screen(expression, symbols, sort_by=None, ascending=False, limit=None):
+    '''`Screener.screen` over the metrics of the day of `symbols`'''
+    return get_screener(symbols).screen(expression, sort_by, ascending, limit)
+
+
+def describe_metrics():
+    return '\n'.join(
+        '%s(%s): %s' % (
+            name,
+            ', '.join('%s=%r' % (parameter.name, parameter.default) for parameter in _metric_parameters(name)),
+            metric.description,
+        )
+        for name, metric in METRICS.items()
+    )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Filters a universe with an expression over metrics')
+    parser.add_argument('expression', nargs='?', help='e.g. "trend == uptrend and ath_distance(95) > -10"')
+    parser.add_argument(
+        '--universe', default='NIFTY50',
+        help='One of %s or the path of a file of symbols' % ', '.join(cli.UNIVERSES),
+    )
+    parser.add_argument('--sort-by', default=None, help='Expression to sort the results by, highest first')
+    parser.add_argument('--ascending', action='store_true', help='Sort lowest first')
+    parser.add_argument('--limit', type=int, default=None, help='Number of results to show')
+    parser.add_argument('--output', default=None, help='CSV file to write the results to')
+    parser.add_argument('--offline', action='store_true', help='Only use the local history store')
+    parser.add_argument('--verbose', action='store_true', help='Show the output of the metrics')
+    parser.add_argument('--list-metrics', action='store_true', help='Describe the metrics & exit')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.list_metrics or not args.expression:
+        print(describe_metrics())
+        return
+    if args.offline:
+        import history_store
+        history_store.offline = True
+
+    output = sys.stdout if args.verbose else io.StringIO()
+    try:
+        with contextlib.redirect_stdout(output):
+            results = screen(
+                args.expression, cli.load_universe(args.universe), args.sort_by, args.ascending, args.limit
+            )
+    except (ExpressionError, AssertionError) as e:
+        print('ERROR: %s' % e)
+        sys.exit(2)
+    print(results.to_string())
+    if args.output:
+        results.to_csv(args.output, index=True, header=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+'''
+    Backtest of monthly SIPs: investing a fixed amount at the closing of every month, from
+    every start month, for every holding period, & selling everything at the closing of the
+    month the period ends in. Reports the absolute profit & the XIRR of every one of them.
+
+    Same strategy as `long_term_invesment`, for every (start month, holding period) instead
+    of only since 2019-01 till today, & buying for a fixed amount instead of 1 share.
+'''
+
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from bulk_fetch import prefetched_symbols
+from constants import NIFTY50
+from instrumentation import timed
+from monthly_closing_prices import get_monthly_data
+import output_writer
+from utils import get_xirr_arrays
+
+
+RESULT_COLUMNS = [
+    'symbol', 'start_month', 'years', 'invested', 'final_value', 'profit_percent', 'xirr',
+]
+
+
+def _month_end_dates(months):
+    '''Last day of every 'YYYY-MM' of `months`, as numpy days'''
+    periods = pd.PeriodIndex(months, freq='M')
+    return np.asarray(periods.end_time.normalize().to_numpy(), dtype='datetime64[D]')
+
+
+@timed('compute')
+def sip_grid(monthly_data, holding_years=range(1, 11), monthly_amount=1000):
+    '''
+        Backtest of a SIP of `monthly_amount` from every month of `monthly_data` (as returned
+        by `get_monthly_data`) for every number of `holding_years`: bought at the closings of
+        the `12 * years` months from the start month & sold at the closing of the month after.
+        Months without a closing (no trading) are skipped, the SIPs starting or ending on one
+        are left out, so every SIP starts with an installment.
+
+        Units, invested amounts & final values come from cumulative sums over the months,
+        the XIRRs are solved for all the SIPs together. Cash flows are dated at month ends.
+
+        Returns a DataFrame with a row per (start month, years) that can be backtested.
+    '''
+    columns = RESULT_COLUMNS[1:]
+    monthly_data = monthly_data.sort_index()
+    closings = monthly_data['closing'].to_numpy(dtype=float)
+    months = monthly_data.index.to_numpy()
+    num_months = len(closings)
+    holding_months = 12 * np.asarray(list(holding_years), dtype=int)
+    if num_months == 0 or len(holding_months) == 0:
+        return pd.DataFrame(columns=columns)
+
+    traded = ~np.isnan(closings)
+    # Cumulative amounts invested & units bought, with a 0 in front for the empty sum
+    cumulative_invested = np.concatenate([[0.0], np.cumsum(np.where(traded, monthly_amount, 0.0))])
+    cumulative_units = np.concatenate(
+        [[0.0], np.cumsum(np.where(traded, monthly_amount / np.where(traded, closings, 1), 0.0))]
+    )
+
+    # Every (start month, holding period) with its selling month inside the data
+    starts, periods = np.meshgrid(np.arange(num_months), holding_months, indexing='ij')
+    ends = starts + periods
+    possible = ends < num_months
+    starts, periods, ends = starts[possible], periods[possible], ends[possible]
+    bought_and_sold = traded[starts] & traded[ends]
+    starts, periods, ends = starts[bought_and_sold], periods[bought_and_sold], ends[bought_and_sold]
+
+    invested = cumulative_invested[ends] - cumulative_invested[starts]
+    final_values = (cumulative_units[ends] - cumulative_units[starts]) * closings[ends]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        profit_percents = (final_values - invested) / invested * 100
+
+    # Cash flows of every SIP, padded with 0 investments up to the longest holding period
+    dates = _month_end_dates(months)
+    installments = starts[:, None] + np.arange(holding_months.max())[None, :]
+    paid = (installments < ends[:, None])
+    installments = np.minimum(installments, num_months - 1)
+    amounts = np.where(paid & traded[installments], float(monthly_amount), 0.0)
+    days_ago = (dates[ends][:, None] - dates[installments]).astype(int)
+    # The money is invested for half the holding period on average
+    with np.errstate(divide='ignore', invalid='ignore'):
+        guesses = ((final_values / invested) ** (2 / (periods / 12)) - 1) * 100
+    xirrs = get_xirr_arrays(
+        amounts, np.where(paid, days_ago, 0), final_values, np.nan_to_num(guesses, nan=10.0)
+    )
+
+    return pd.DataFrame({
+        'start_month': months[starts],
+        'years': periods // 12,
+        'invested': invested,
+        'final_value': final_values,
+        'profit_percent': profit_percents,
+        'xirr': xirrs,
+    }, columns=columns)
+
+
+def backtest(symbols, start_date=datetime.date(2008, 1, 1), holding_years=range(1, 11), monthly_amount=1000):
+    '''`sip_grid` of every symbol on its monthly data since `start_date`, as one tidy table'''
+    today = datetime.datetime.today()
+    grids = {}
+    for symbol in prefetched_symbols(symbols, start_date, today):
+        monthly_data = get_monthly_data(start_date, today, symbol)
+        if monthly_data.empty:
+            continue
+        grids[symbol] = sip_grid(monthly_data, holding_years, monthly_amount)
+
+    tables = [grids[symbol].assign(symbol=symbol) for symbol in symbols if symbol in grids]
+    if not tables:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+    return pd.concat(tables, ignore_index=True)[RESULT_COLUMNS]
+
+
+def main(symbols=NIFTY50):
+    results = backtest(symbols)
+    output_writer.write(results, 'sip_backtest', 'monthly', csv_path='output/sip_backtest.csv')
+    # Median XIRR of every symbol for every holding period
+    print(results.pivot_table(index='symbol', columns='years', values='xirr', aggfunc='median').round(2))
+
+
+if __name__ == '__main__':
+    main()
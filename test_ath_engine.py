@@ -0,0 +1,49 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from ath_comparisons import get_ath_from_history
+from ath_engine import rolling_ath, rolling_max, rolling_min, rolling_percentile_high
+
+
+class TestRollingHighs(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.highs = 100 + np.cumsum(rng.normal(size=(4, 120)), axis=1)
+        self.highs[rng.random(self.highs.shape) < 0.05] = np.nan
+        self.highs[0, :30] = np.nan  # listed later than the others
+
+    def window_values(self, row, date, window):
+        values = self.highs[row, max(0, date - window + 1):date + 1]
+        return values[~np.isnan(values)]
+
+    def test_rolling_max_min_and_ath(self):
+        window = 20
+        maxs = rolling_max(self.highs, window)
+        mins = rolling_min(self.highs, window)
+        aths = rolling_ath(self.highs)
+        for row in range(4):
+            for date in range(30, 120):
+                values = self.window_values(row, date, window)
+                self.assertEqual(maxs[row, date], values.max())
+                self.assertEqual(mins[row, date], values.min())
+                self.assertEqual(aths[row, date], np.nanmax(self.highs[row, :date + 1]))
+
+    def test_percentile_high_matches_get_current_with_ath(self):
+        window = 50
+        for percentile in [0, 50, 95, 100]:
+            percentile_highs = rolling_percentile_high(self.highs, window, percentile)
+            self.assertTrue(np.isnan(percentile_highs[0, :30]).all())
+            for row in range(4):
+                for date in range(30, 120, 7):
+                    values = self.window_values(row, date, window)
+                    expected, _, _ = get_ath_from_history(
+                        pd.DataFrame({'High': values, 'Close': values}), percentile
+                    )
+                    self.assertEqual(percentile_highs[row, date], expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+from datetime import date
+import json
+import unittest
+
+import numpy as np
+
+from benchmark import SyntheticProvider, market_holidays, run_benchmarks, stand_in_history
+import history_store
+from weekly_analysis import get_weekly_data
+
+
+class TestSyntheticProvider(unittest.TestCase):
+
+    def setUp(self):
+        self.provider = SyntheticProvider(years=3, end_date=date(2023, 6, 30), newly_listed_fraction=0)
+
+    def test_trading_days(self):
+        history = self.provider('TCS', date(2022, 1, 1), date(2022, 12, 31))
+        days = set(history.index)
+        self.assertTrue(all(day.weekday() < 5 for day in days))
+        self.assertFalse(days & market_holidays(2022))
+        self.assertEqual(len(days), 260 - len(market_holidays(2022)))
+
+    def test_prices(self):
+        history = self.provider('TCS', date(2020, 1, 1), date(2023, 6, 30))
+        self.assertTrue((history['High'] >= history[['Open', 'Close']].max(axis=1)).all())
+        self.assertTrue((history['Low'] <= history[['Open', 'Close']].min(axis=1)).all())
+        self.assertTrue((history['Low'] > 0).all())
+        np.testing.assert_array_equal(history['Prev Close'].to_numpy()[1:], history['Close'].to_numpy()[:-1])
+
+    def test_deterministic(self):
+        other = SyntheticProvider(years=3, end_date=date(2023, 6, 30), newly_listed_fraction=0)
+        self.assertTrue(self.provider.history('INFY').equals(other.history('INFY')))
+
+    def test_newly_listed(self):
+        provider = SyntheticProvider(years=3, end_date=date(2023, 6, 30), newly_listed_fraction=0.5)
+        symbols = ['SYN%03d' % i for i in range(20)]
+        listing_dates = [provider.listing_date(symbol) for symbol in symbols]
+        newly_listed = [symbol for symbol, day in zip(symbols, listing_dates) if day > provider.start_date]
+        self.assertTrue(0 < len(newly_listed) < len(symbols))
+        history = provider(newly_listed[0], provider.start_date, provider.end_date)
+        self.assertEqual(history.index[0], provider.listing_date(newly_listed[0]))
+
+    def test_stand_in_history(self):
+        saved_provider = history_store.provider
+        with stand_in_history(self.provider):
+            weekly_data = get_weekly_data(date(2023, 1, 1), date(2023, 6, 30), 'TCS')
+        self.assertEqual(len(weekly_data), 26)
+        self.assertIs(history_store.provider, saved_provider)
+
+
+class TestRunBenchmarks(unittest.TestCase):
+
+    def test_report(self):
+        report = run_benchmarks(
+            ['get_weekly_data', 'get_xirr'], years_list=(1, 2), num_symbols=2, repeat=1, startup=False
+        )
+        report = json.loads(json.dumps(report))
+        self.assertEqual(
+            [(result['name'], result['years']) for result in report['results']],
+            [('get_weekly_data', 1), ('get_weekly_data', 2), ('get_xirr', 1), ('get_xirr', 2)],
+        )
+        self.assertTrue(all(result['min_seconds'] > 0 for result in report['results']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+from datetime import date
+import os
+import tempfile
+import unittest
+from unittest import mock
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+import bhavcopy
+from daily_analysis import get_daily_data
+import history_store
+from trading_calendar import TradingCalendar
+
+CM_HEADER = 'SYMBOL,SERIES,OPEN,HIGH,LOW,CLOSE,LAST,PREVCLOSE,TOTTRDQTY,TOTTRDVAL,TIMESTAMP,TOTALTRADES,ISIN,\n'
+UDIFF_HEADER = (
+    'TradDt,BizDt,Sgmt,Src,FinInstrmTp,FinInstrmId,ISIN,TckrSymb,SctySrs,XpryDt,FininstrmActlXpryDt,'
+    'StrkPric,OptnTp,FinInstrmNm,OpnPric,HghPric,LwPric,ClsPric,LastPric,PrvsClsgPric,UndrlygPric,'
+    'SttlmPric,OpnIntrst,ChngInOpnIntrst,TtlTradgVol,TtlTrfVal,TtlNbOfTxsExctd,SsnId,NewBrdLotQty,'
+    'Rmks,Rsvd1,Rsvd2,Rsvd3,Rsvd4\n'
+)
+
+
+def cm_row(symbol, series, close, day):
+    return '%s,%s,%s,%s,%s,%s,%s,%s,100,%s,%s,10,INE000000000,\n' % (
+        symbol, series, close - 1, close + 1, close - 2, close, close, close - 0.5, close * 100,
+        day.strftime('%d-%b-%Y').upper(),
+    )
+
+
+def udiff_row(symbol, series, close, day):
+    return '%s,%s,CM,NSE,STK,1,INE000000000,%s,%s,,,,,-,%s,%s,%s,%s,%s,%s,,%s,,,100,%s,10,F1,1,,,,,\n' % (
+        day, day, symbol, series, close - 1, close + 1, close - 2, close, close, close - 0.5, close,
+        close * 100,
+    )
+
+
+class TestBhavcopy(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.files_dir = os.path.join(self.tmp_dir.name, 'bhavcopies')
+        self.store_dir = os.path.join(self.tmp_dir.name, 'history')
+        os.makedirs(self.files_dir)
+        # Every weekday of Jan 2023 is a trading day but Thursday the 26th
+        self.calendar = TradingCalendar(date(2023, 1, 1), date(2023, 1, 31), [date(2023, 1, 26)])
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_cm(self, day, rows, zipped=False):
+        name = 'cm%sbhav.csv' % day.strftime('%d%b%Y').upper()
+        content = CM_HEADER + ''.join(cm_row(*row, day) for row in rows)
+        self.write(name, content, zipped)
+
+    def write_udiff(self, day, rows, zipped=True):
+        name = 'BhavCopy_NSE_CM_0_0_0_%s_F_0000.csv' % day.strftime('%Y%m%d')
+        content = UDIFF_HEADER + ''.join(udiff_row(*row, day) for row in rows)
+        self.write(name, content, zipped)
+
+    def write(self, name, content, zipped):
+        path = os.path.join(self.files_dir, name)
+        if zipped:
+            with zipfile.ZipFile(path + '.zip', 'w') as f:
+                f.writestr(name, content)
+        else:
+            with open(path, 'w') as f:
+                f.write(content)
+
+    def ingest(self, **kwargs):
+        return bhavcopy.ingest(self.files_dir, store_dir=self.store_dir, calendar=self.calendar, **kwargs)
+
+    def test_read_both_formats(self):
+        self.write_cm(date(2023, 1, 6), [('TCS', 'EQ', 10.0), ('TCS', 'BL', 11.0), ('INFY', 'EQ', 20.0)])
+        self.write_udiff(date(2023, 1, 9), [('TCS', 'EQ', 12.0), ('NIFTYBEES', 'EQ', 30.0)])
+        udiff_bars, cm_bars = [bhavcopy.read_bhavcopy(path) for path in bhavcopy.bhavcopy_files(self.files_dir)]
+
+        for bars in [cm_bars, udiff_bars]:
+            self.assertEqual(bars.columns.tolist(), ['Date'] + bhavcopy.HISTORY_COLUMNS)
+            self.assertEqual(set(bars['Series']), {'EQ'})
+        self.assertEqual(cm_bars['Symbol'].tolist(), ['TCS', 'INFY'])
+        self.assertEqual(cm_bars['Date'].tolist(), [date(2023, 1, 6)] * 2)
+        self.assertEqual(cm_bars['Close'].tolist(), [10.0, 20.0])
+        self.assertEqual(udiff_bars['Date'].tolist(), [date(2023, 1, 9)] * 2)
+        self.assertEqual(udiff_bars['High'].tolist(), [13.0, 31.0])
+        self.assertEqual(udiff_bars['VWAP'].tolist(), [12.0, 30.0])
+        self.assertTrue(udiff_bars['%Deliverble'].isna().all())
+
+    def test_ingest_into_store(self):
+        self.write_cm(date(2023, 1, 5), [('TCS', 'EQ', 10.0), ('INFY', 'EQ', 20.0)], zipped=True)
+        self.write_cm(date(2023, 1, 6), [('TCS', 'EQ', 11.0), ('INFY', 'EQ', 21.0)])
+        self.write_udiff(date(2023, 1, 9), [('TCS', 'EQ', 12.0)])
+        self.write_udiff(date(2023, 1, 25), [('TCS', 'EQ', 13.0)])
+        with open(os.path.join(self.files_dir, 'broken.csv'), 'w') as f:
+            f.write('not,a\nbhavcopy,file\n')
+
+        with mock.patch('builtins.print'):
+            result = self.ingest(workers=2)
+        self.assertEqual(result.days, [date(2023, 1, 5), date(2023, 1, 6), date(2023, 1, 9), date(2023, 1, 25)])
+        self.assertEqual(result.symbols, ['INFY', 'TCS'])
+        self.assertEqual([os.path.basename(path) for path, _ in result.errors], ['broken.csv'])
+
+        history, covered = history_store.load('TCS', self.store_dir)
+        self.assertEqual(history['Close'].tolist(), [10.0, 11.0, 12.0, 13.0])
+        # The weekend after the 6th & the holiday after the 25th are covered, the days without files aren't
+        self.assertEqual(covered, [
+            (date(2023, 1, 5), date(2023, 1, 9)),
+            (date(2023, 1, 25), date(2023, 1, 26)),
+        ])
+
+        provider = mock.Mock(side_effect=AssertionError('fetched'))
+        with mock.patch.object(history_store, 'provider', provider), \
+                mock.patch.object(history_store, 'HISTORY_DIR', self.store_dir), \
+                mock.patch('builtins.print'):
+            daily_data = get_daily_data(date(2023, 1, 5), date(2023, 1, 9), 'TCS')
+        self.assertEqual(daily_data.index.tolist(), ['2023-01-09', '2023-01-06'])
+        self.assertEqual(daily_data['closing'].tolist(), [12.0, 11.0])
+        self.assertEqual(daily_data['high'].tolist(), [13.0, 12.0])
+
+    def test_ingest_merges_with_stored_history(self):
+        stored = pd.DataFrame(
+            {'Symbol': ['TCS', 'TCS'], 'Close': [1.0, 2.0]},
+            index=pd.Index([date(2023, 1, 2), date(2023, 1, 3)], name='Date'),
+        )
+        history_store.save('TCS', stored, [(date(2023, 1, 2), date(2023, 1, 3))], self.store_dir)
+        self.write_cm(date(2023, 1, 3), [('TCS', 'EQ', 5.0)])
+        self.write_cm(date(2023, 1, 4), [('TCS', 'EQ', 6.0), ('INFY', 'EQ', 7.0)])
+
+        result = self.ingest(symbols=['TCS'])
+        self.assertEqual(result.symbols, ['TCS'])
+        self.assertFalse(os.path.exists(os.path.join(self.store_dir, 'INFY.npz')))
+        history, covered = history_store.load('TCS', self.store_dir)
+        self.assertEqual(history['Close'].tolist(), [1.0, 5.0, 6.0])
+        self.assertEqual(covered, [(date(2023, 1, 2), date(2023, 1, 4))])
+
+    def test_covered_ranges(self):
+        covered = bhavcopy.covered_ranges(np.array(['2023-01-13', '2023-01-25'], dtype='datetime64[D]'), self.calendar)
+        self.assertEqual(covered, [
+            (date(2023, 1, 13), date(2023, 1, 15)),
+            (date(2023, 1, 25), date(2023, 1, 26)),
+        ])
+        self.assertEqual(bhavcopy.covered_ranges([], self.calendar), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+from datetime import date
+import gc
+import threading
+import time
+import unittest
+import weakref
+
+import pandas as pd
+
+from benchmark import stand_in_history
+from bulk_fetch import TokenBucket, fetch_histories, prefetched_symbols
+import history_store
+import memo_cache
+
+
+class StandInProvider:
+    '''
+        Local stand-in for `get_history`, with a latency & a number of transient failures
+        per symbol
+    '''
+
+    def __init__(self, latencies, failures=None):
+        self.latencies = latencies
+        self.failures = dict(failures or {})
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, symbol, start, end):
+        with self.lock:
+            self.calls.append(symbol)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.latencies[symbol])
+            with self.lock:
+                if self.failures.get(symbol, 0) > 0:
+                    self.failures[symbol] -= 1
+                    raise ConnectionError('connection reset by peer')
+            return pd.DataFrame({'Close': [1.0]}, index=pd.Index([start], name='Date'))
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+class TestFetchHistories(unittest.TestCase):
+
+    def fetch(self, provider, symbols, **kwargs):
+        kwargs.setdefault('requests_per_second', None)
+        kwargs.setdefault('backoff', 0.001)
+        return list(fetch_histories(
+            symbols, date(2022, 1, 1), date(2022, 1, 31), fetch=provider, **kwargs
+        ))
+
+    def test_results_arrive_as_they_finish(self):
+        provider = StandInProvider({'SLOW': 0.3, 'FAST1': 0.0, 'FAST2': 0.01})
+        results = self.fetch(provider, ['SLOW', 'FAST1', 'FAST2'])
+
+        self.assertEqual(results[-1].symbol, 'SLOW')
+        self.assertEqual({result.symbol for result in results}, {'SLOW', 'FAST1', 'FAST2'})
+        self.assertTrue(all(result.error is None for result in results))
+
+    def test_concurrency_cap(self):
+        symbols = ['S%d' % i for i in range(12)]
+        provider = StandInProvider({symbol: 0.02 for symbol in symbols})
+        self.fetch(provider, symbols, max_workers=3)
+
+        self.assertEqual(provider.max_in_flight, 3)
+
+    def test_transient_failures_are_retried(self):
+        provider = StandInProvider({'FLAKY': 0.0, 'DOWN': 0.0}, failures={'FLAKY': 2, 'DOWN': 10})
+        results = {result.symbol: result for result in self.fetch(provider, ['FLAKY', 'DOWN'], retries=3)}
+
+        self.assertIsNone(results['FLAKY'].error)
+        self.assertEqual(provider.calls.count('FLAKY'), 3)
+        self.assertIsInstance(results['DOWN'].error, ConnectionError)
+        self.assertIsNone(results['DOWN'].history)
+        self.assertEqual(provider.calls.count('DOWN'), 4)
+
+    def test_yielded_histories_are_not_kept(self):
+        symbols = ['S%d' % i for i in range(5)]
+        provider = StandInProvider({symbol: 0.0 for symbol in symbols})
+        histories = []
+        for result in fetch_histories(
+            symbols, date(2022, 1, 1), date(2022, 1, 31), fetch=provider, requests_per_second=None
+        ):
+            histories.append(weakref.ref(result.history))
+            del result
+            gc.collect()
+            self.assertEqual([history() is None for history in histories[:-1]], [True] * (len(histories) - 1))
+        self.assertEqual(len(histories), 5)
+
+    def test_store_errors_are_not_retried(self):
+        calls = []
+
+        def fetch(symbol, start, end):
+            calls.append(symbol)
+            raise PermissionError('cache/history/TCS.npz')
+
+        results = self.fetch(fetch, ['TCS'], retries=3)
+        self.assertIsInstance(results[0].error, PermissionError)
+        self.assertEqual(calls, ['TCS'])
+
+    def test_prefetched_symbols_keep_their_order(self):
+        provider = StandInProvider({'SLOW': 0.1, 'FAST1': 0.0, 'FAST2': 0.01}, failures={'FAST2': 10})
+        symbols = list(prefetched_symbols(
+            ['SLOW', 'FAST1', 'FAST2'], date(2022, 1, 1), date(2022, 1, 31),
+            fetch=provider, requests_per_second=None, retries=0,
+        ))
+        self.assertEqual(symbols, ['SLOW', 'FAST1', 'FAST2'])
+
+    def test_only_requests_to_nse_are_rate_limited(self):
+        symbols = ['S%d' % i for i in range(25)]
+        provider = StandInProvider({symbol: 0.0 for symbol in symbols + ['NEW1', 'NEW2', 'NEW3']})
+        self.addCleanup(setattr, history_store, 'rate_limiter', history_store.rate_limiter)
+        with stand_in_history(provider):
+            list(fetch_histories(symbols, date(2022, 1, 1), date(2022, 1, 31), requests_per_second=None))
+            for clear_memo in [True, False]:
+                if clear_memo:
+                    memo_cache.memo.clear()
+                started = time.monotonic()
+                results = list(fetch_histories(symbols, date(2022, 1, 1), date(2022, 1, 31), requests_per_second=5))
+                # Served by the warm store (or the memo) without waiting for the 5 requests/s
+                self.assertLess(time.monotonic() - started, len(symbols) / 5 / 10)
+                self.assertEqual([result.error for result in results], [None] * len(symbols))
+                self.assertEqual(len(provider.calls), len(symbols))
+
+            started = time.monotonic()
+            list(fetch_histories(['NEW1', 'NEW2', 'NEW3'], date(2022, 1, 1), date(2022, 1, 31), requests_per_second=20))
+            self.assertGreaterEqual(time.monotonic() - started, 0.09)
+            self.assertEqual(len(provider.calls), len(symbols) + 3)
+
+    def test_rate_limit(self):
+        bucket = TokenBucket(rate=50)
+        started = time.monotonic()
+        for _ in range(6):
+            bucket.acquire()
+
+        self.assertGreaterEqual(time.monotonic() - started, 0.09)
+
+
+if __name__ == "__main__":
+    unittest.main()
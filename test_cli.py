@@ -0,0 +1,47 @@
+import os
+import tempfile
+import unittest
+
+from cli import load_universe, run
+
+
+def square_task(symbol):
+    if symbol == 'BAD':
+        raise ValueError('no data')
+    return {'pid': os.getpid(), 'square': int(symbol) ** 2}
+
+
+class TestLoadUniverse(unittest.TestCase):
+
+    def test_named_universe(self):
+        self.assertEqual(len(load_universe('NIFTY100')), 100)
+        self.assertEqual(load_universe('NIFTY50')[0], 'ADANIPORTS')
+
+    def test_file(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+            f.write('# my picks\nTCS, INFY\nPIIND  TCS\n\nITC # cigarettes\n')
+        try:
+            self.assertEqual(load_universe(f.name), ['TCS', 'INFY', 'PIIND', 'ITC'])
+        finally:
+            os.remove(f.name)
+
+
+class TestRun(unittest.TestCase):
+
+    def test_results_in_order(self):
+        symbols = [str(i) for i in range(20)] + ['BAD']
+        for kwargs in [{'workers': 0}, {'workers': 3, 'chunksize': 2}, {'workers': 2, 'max_tasks_per_child': 1}]:
+            results = list(run(square_task, symbols, **kwargs))
+            self.assertEqual([symbol for symbol, _, _ in results], symbols)
+            self.assertEqual(
+                [row['square'] for _, row, _ in results[:-1]], [i * i for i in range(20)]
+            )
+            self.assertEqual(results[-1][1:], ({}, 'ValueError: no data'))
+
+    def test_runs_over_processes(self):
+        pids = {row['pid'] for _, row, _ in run(square_task, [str(i) for i in range(8)], workers=2, chunksize=1)}
+        self.assertNotIn(os.getpid(), pids)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+from datetime import date, datetime
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+import daily_analysis
+from daily_analysis import get_daily_data, to_daily_data
+
+
+def make_history(days):
+    '''A bar for every day of `days`, its closing is the day of the month'''
+    return pd.DataFrame({
+        'Symbol': ['TCS'] * len(days),
+        'Open': [day.day - 0.5 for day in days],
+        'High': [day.day + 1.0 for day in days],
+        'Low': [day.day - 1.0 for day in days],
+        'Close': [float(day.day) for day in days],
+        'Volume': [100 * day.day for day in days],
+    }, index=pd.Index(days, name='Date'))
+
+
+class TestDailyData(unittest.TestCase):
+
+    def test_latest_day_first(self):
+        history = make_history([date(2023, 1, 2), date(2023, 1, 3), date(2023, 1, 5)])
+        daily_data = to_daily_data(history)
+
+        self.assertEqual(daily_data.index.name, 'day')
+        self.assertEqual(daily_data.index.tolist(), ['2023-01-05', '2023-01-03', '2023-01-02'])
+        self.assertEqual(daily_data.columns.tolist(), ['closing', 'high', 'low', 'opening', 'volume'])
+        self.assertEqual(daily_data.loc['2023-01-03'].tolist(), [3.0, 4.0, 2.0, 2.5, 300])
+
+    def test_after_date_is_excluded(self):
+        history = make_history([date(2023, 1, 2), date(2023, 1, 3), date(2023, 1, 5), date(2023, 1, 6)])
+        self.assertEqual(to_daily_data(history, date(2023, 1, 3)).index.tolist(), ['2023-01-06', '2023-01-05'])
+        # A day without a bar cuts at the next one
+        self.assertEqual(to_daily_data(history, date(2023, 1, 4)).index.tolist(), ['2023-01-06', '2023-01-05'])
+        self.assertEqual(to_daily_data(history, date(2023, 1, 1)).index.tolist()[-1], '2023-01-02')
+        self.assertTrue(to_daily_data(history, date(2023, 1, 6)).empty)
+
+    def test_unsorted_history(self):
+        history = make_history([date(2023, 1, 5), date(2023, 1, 2), date(2023, 1, 3)])
+        daily_data = to_daily_data(history, date(2023, 1, 2))
+        self.assertEqual(daily_data.index.tolist(), ['2023-01-05', '2023-01-03'])
+        self.assertEqual(daily_data['closing'].tolist(), [5.0, 3.0])
+
+    def test_copy(self):
+        history = make_history([date(2023, 1, 2), date(2023, 1, 3)])
+        daily_data = to_daily_data(history)
+        daily_data['closing'] = 0.0
+        self.assertEqual(history['Close'].tolist(), [2.0, 3.0])
+
+        view = to_daily_data(history, copy=False)
+        self.assertTrue(np.shares_memory(view['closing'].to_numpy(), history['Close'].to_numpy()))
+
+    def test_get_daily_data(self):
+        history = make_history([date(2023, 1, 2), date(2023, 1, 3), date(2023, 1, 4)])
+        with mock.patch.object(daily_analysis, 'get_history', return_value=history) as get_history, \
+                mock.patch('builtins.print'):
+            daily_data = get_daily_data(datetime(2023, 1, 2, 15, 30), date(2023, 1, 4), 'TCS')
+            get_history.assert_called_once_with(symbol='TCS', start=date(2023, 1, 2), end=date(2023, 1, 4))
+            self.assertEqual(daily_data.index.tolist(), ['2023-01-04', '2023-01-03'])
+
+            self.assertTrue(get_daily_data(date(2023, 1, 5), date(2023, 1, 4), 'TCS').empty)
+            get_history.return_value = history.iloc[:0]
+            self.assertTrue(get_daily_data(date(2023, 1, 1), date(2023, 1, 4), 'TCS').empty)
+
+
+if __name__ == "__main__":
+    unittest.main()
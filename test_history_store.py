@@ -0,0 +1,98 @@
+import datetime
+from datetime import date
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+import history_store
+
+
+class FakeProvider:
+    '''Serves one bar for every weekday & records the ranges asked for'''
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, symbol, start, end):
+        self.calls.append((start, end))
+        days = []
+        day = start
+        while day <= end:
+            if day.weekday() < 5:
+                days.append(day)
+            day += datetime.timedelta(days=1)
+        closes = [float(d.toordinal() % 1000) for d in days]
+        return pd.DataFrame(
+            {'Symbol': [symbol] * len(days), 'Close': closes, 'Volume': [100] * len(days)},
+            index=pd.Index(days, name='Date'),
+        )
+
+
+class TestHistoryStore(unittest.TestCase):
+
+    def setUp(self):
+        self.store_dir = tempfile.TemporaryDirectory()
+        self.provider = FakeProvider()
+        patcher = mock.patch.object(history_store, 'provider', self.provider)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.store_dir.cleanup)
+
+    def get_history(self, start, end):
+        return history_store.get_history('TEST', start, end, store_dir=self.store_dir.name)
+
+    def test_only_missing_ranges_are_fetched(self):
+        first = self.get_history(date(2022, 1, 1), date(2022, 3, 31))
+        self.assertEqual(self.provider.calls, [(date(2022, 1, 1), date(2022, 3, 31))])
+
+        again = self.get_history(date(2022, 2, 1), date(2022, 2, 28))
+        self.assertEqual(len(self.provider.calls), 1)
+        self.assertTrue(again.equals(first.loc[date(2022, 2, 1):date(2022, 2, 28)]))
+
+        self.get_history(date(2021, 12, 1), date(2022, 4, 10))
+        self.assertEqual(self.provider.calls[1:], [
+            (date(2021, 12, 1), date(2021, 12, 31)),
+            (date(2022, 4, 1), date(2022, 4, 10)),
+        ])
+
+    def test_round_trip_keeps_nsepy_shape(self):
+        fetched = self.provider('TEST', date(2022, 1, 3), date(2022, 1, 7))
+        history = self.get_history(date(2022, 1, 3), date(2022, 1, 7))
+        self.assertEqual(history.index.name, 'Date')
+        self.assertEqual(history.index.tolist(), fetched.index.tolist())
+        self.assertEqual(history['Close'].tolist(), fetched['Close'].tolist())
+        self.assertEqual(history['Symbol'].tolist(), ['TEST'] * 5)
+
+    def test_missing_ranges(self):
+        covered = [(date(2022, 1, 10), date(2022, 1, 20)), (date(2022, 1, 21), date(2022, 1, 25))]
+        self.assertEqual(
+            history_store.missing_ranges(covered, date(2022, 1, 1), date(2022, 1, 31)),
+            [(date(2022, 1, 1), date(2022, 1, 9)), (date(2022, 1, 26), date(2022, 1, 31))],
+        )
+        self.assertEqual(
+            history_store.missing_ranges(covered, date(2022, 1, 12), date(2022, 1, 22)), []
+        )
+
+    def test_offline(self):
+        stored = self.get_history(date(2022, 1, 1), date(2022, 1, 31))
+        with mock.patch.object(history_store, 'offline', True):
+            history = self.get_history(date(2021, 12, 1), date(2022, 2, 28))
+        self.assertEqual(len(self.provider.calls), 1)
+        self.assertTrue(history.equals(stored))
+
+    def test_nsepy_is_imported_lazily(self):
+        code = "import sys, cli, history_store, trend_scanner; print('nsepy' in sys.modules)"
+        output = subprocess.run(
+            [sys.executable, '-c', code], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        self.assertEqual(output.stdout.strip(), 'False')
+
+
+if __name__ == "__main__":
+    unittest.main()
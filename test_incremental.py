@@ -0,0 +1,118 @@
+import datetime
+from datetime import date
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+import incremental
+import monthly_closing_prices
+import weekly_analysis
+
+
+def make_history(start_date, end_date, listing_date, seed=0):
+    rng = np.random.default_rng(seed)
+    days = []
+    day = start_date
+    while day <= end_date:
+        # A few Saturday sessions, random holidays & a suspended month
+        trading = day.weekday() < 5 or rng.random() < 0.02
+        if trading and day >= listing_date and rng.random() > 0.05 and (day.year, day.month) != (2021, 5):
+            days.append(day)
+        day += datetime.timedelta(days=1)
+    closings = 100 + np.cumsum(rng.normal(size=len(days)))
+    return pd.DataFrame({
+        'Symbol': 'TEST',
+        'Open': closings + rng.normal(size=len(days)),
+        'High': closings + rng.random(len(days)) * 3,
+        'Low': closings - rng.random(len(days)) * 3,
+        'Close': closings,
+        'Volume': rng.integers(1, 1000, len(days)),
+    }, index=pd.Index(days, name='Date'))
+
+
+class TestIncremental(unittest.TestCase):
+
+    def setUp(self):
+        self.history = make_history(date(2020, 1, 1), date(2022, 3, 31), listing_date=date(2020, 3, 11))
+
+        def get_history(symbol, start, end):
+            return self.history[(self.history.index >= start) & (self.history.index <= end)]
+
+        for module in [incremental, weekly_analysis, monthly_closing_prices]:
+            patcher = mock.patch.object(module, 'get_history', get_history)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch('builtins.print')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.start_dates = {'weekly': date(2020, 1, 15), 'monthly': date(2020, 1, 20)}
+
+    def assert_latest_bars_equal(self, latest, full, num_units=incremental.NUM_UNITS):
+        self.assertGreaterEqual(len(latest), min(num_units, len(full)))
+        # Without the empty bars of the suspension in the window, volume stays an int column
+        pd.testing.assert_frame_equal(latest, full.iloc[:len(latest)], check_dtype=False)
+
+    def test_folding_day_by_day_matches_full_recompute(self):
+        state = incremental.new_state('TEST', self.start_dates, num_units=None)
+        latest_state = incremental.new_state('TEST', self.start_dates, num_units=4)
+        as_of_dates = [
+            date(2020, 2, 1), date(2020, 3, 13), date(2020, 3, 14), date(2020, 7, 1),
+            date(2021, 5, 20), date(2021, 6, 4), date(2022, 3, 31),
+        ]
+        day = date(2020, 1, 1)
+        for as_of in as_of_dates:
+            for folded_state in [state, latest_state]:
+                incremental.fold_history(
+                    folded_state, self.history[(self.history.index >= day) & (self.history.index <= as_of)]
+                )
+            day = as_of + datetime.timedelta(days=1)
+
+            pd.testing.assert_frame_equal(
+                incremental.bars(state, 'weekly', as_of),
+                weekly_analysis.get_weekly_data(self.start_dates['weekly'], as_of, 'TEST'),
+            )
+            pd.testing.assert_frame_equal(
+                incremental.bars(state, 'monthly', as_of),
+                monthly_closing_prices.get_monthly_data(self.start_dates['monthly'], as_of, 'TEST'),
+            )
+            self.assertLessEqual(len(latest_state['timeframes']['weekly']['bars']), 6)
+            for chart_type in ['weekly', 'monthly']:
+                self.assert_latest_bars_equal(
+                    incremental.bars(latest_state, chart_type, as_of), incremental.bars(state, chart_type, as_of), 4
+                )
+                pd.testing.assert_series_equal(
+                    incremental.trend(latest_state, as_of, 4, chart_type=chart_type),
+                    incremental.trend(state, as_of, 4, chart_type=chart_type),
+                )
+
+    def test_persisted_state_is_updated(self):
+        with tempfile.TemporaryDirectory() as state_dir, \
+                mock.patch.object(incremental, 'START_DATES', self.start_dates):
+            incremental.update('TEST', date(2021, 12, 31), state_dir)
+            state = incremental.update('TEST', date(2022, 3, 18), state_dir)
+
+            self.assertEqual(state, incremental.load_state('TEST', state_dir))
+            self.assert_latest_bars_equal(
+                incremental.bars(state, 'weekly', date(2022, 3, 18)),
+                weekly_analysis.get_weekly_data(self.start_dates['weekly'], date(2022, 3, 18), 'TEST'),
+            )
+
+    def test_only_final_bars_are_folded(self):
+        with tempfile.TemporaryDirectory() as state_dir, \
+                mock.patch.object(incremental, 'START_DATES', self.start_dates), \
+                mock.patch.object(incremental, '_last_final_date', return_value=date(2022, 3, 16)):
+            state = incremental.update('TEST', date(2022, 3, 17), state_dir)
+            self.assertEqual(state['last_date'], str(self.history.index[self.history.index <= date(2022, 3, 16)][-1]))
+
+            # Today's bar (of the 17th) is folded in with its final values on the next day's run
+            self.history.loc[date(2022, 3, 17), 'Close'] += 10
+            with mock.patch.object(incremental, '_last_final_date', return_value=date(2022, 3, 17)):
+                state = incremental.update('TEST', date(2022, 3, 18), state_dir)
+            self.assertEqual(state['timeframes']['weekly']['partial'][1], self.history.loc[date(2022, 3, 17), 'Close'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import json
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import indicators
+from indicators import ATR, EMA, MACD, RSI, SMA, Bollinger, IndicatorStream, Volatility
+
+
+def make_bars(num_units, seed=0):
+    '''Bars of 5 symbols, oldest first'''
+    rng = np.random.default_rng(seed)
+    closings = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (5, num_units)), axis=1))
+    highs = closings * (1 + rng.random(closings.shape) * 0.02)
+    lows = closings * (1 - rng.random(closings.shape) * 0.02)
+    # A newly listed symbol, a suspended one & a bar without a high
+    closings[1, :40] = highs[1, :40] = lows[1, :40] = np.nan
+    closings[2, 30:40] = np.nan
+    highs[3, 50] = np.nan
+    return closings, highs, lows
+
+
+class TestIndicators(unittest.TestCase):
+
+    def test_batch_and_streaming_are_identical(self):
+        closings, highs, lows = make_bars(300)
+        batch = indicators.compute(closings, highs, lows)
+
+        stream = IndicatorStream(num_symbols=5)
+        streamed = [stream.update(closings[:, unit], highs[:, unit], lows[:, unit]) for unit in range(300)]
+        self.assertEqual(list(batch), stream.columns)
+        for column, values in batch.items():
+            np.testing.assert_array_equal(np.stack([row[column] for row in streamed], axis=1), values)
+
+    def test_state_carries_over(self):
+        closings, highs, lows = make_bars(120)
+        stream = IndicatorStream(num_symbols=5)
+        for unit in range(100):
+            stream.update(closings[:, unit], highs[:, unit], lows[:, unit])
+        state = json.loads(json.dumps(indicators.state_to_json(stream.state)))
+
+        resumed = IndicatorStream(num_symbols=5, state=indicators.state_from_json(state))
+        for unit in range(100, 120):
+            values = resumed.update(closings[:, unit], highs[:, unit], lows[:, unit])
+        batch = indicators.compute(closings, highs, lows)
+        for column, last_values in values.items():
+            np.testing.assert_array_equal(last_values, batch[column][:, -1])
+
+    def test_against_pandas(self):
+        closings, highs, lows = make_bars(200)
+        closing = pd.Series(closings[0])
+        values = indicators.compute(
+            closings[0], highs[0], lows[0], [SMA(10), Bollinger(10, 2), Volatility(10), EMA(10), MACD(3, 6, 4)]
+        )
+        np.testing.assert_allclose(values['sma_10'], closing.rolling(10).mean(), rtol=1e-12)
+        np.testing.assert_allclose(
+            values['bollinger_lower_10'], closing.rolling(10).mean() - 2 * closing.rolling(10).std(ddof=0), rtol=1e-9
+        )
+        np.testing.assert_allclose(
+            values['volatility_10'], np.log(closing / closing.shift()).rolling(10).std() * 100, rtol=1e-9
+        )
+        # Seeded with the SMA of the first 10 closings
+        seeded = closing.copy()
+        seeded[:9] = np.nan
+        seeded[9] = closing[:10].mean()
+        np.testing.assert_allclose(
+            values['ema_10'], seeded.ewm(span=10, adjust=False, ignore_na=True).mean().where(seeded.notna().cumsum() > 0),
+            rtol=1e-12,
+        )
+        self.assertEqual(np.isnan(values['macd_signal_3_6_4']).sum(), 5 + 3)
+
+    def test_rsi_and_atr(self):
+        closings = np.array([10, 11, 12, 11, 13, 13, 14], dtype=float)
+        rsi = indicators.compute(closings, indicators=[RSI(3)])['rsi_3']
+        # Gains 1, 1 & losses 1 over the first 3 changes
+        self.assertAlmostEqual(rsi[3], 100 * 2 / 3)
+        np.testing.assert_array_equal(np.isnan(rsi), [True] * 3 + [False] * 4)
+        self.assertEqual(indicators.compute(np.full(5, 10.0), indicators=[RSI(2)])['rsi_2'][-1], 50)
+
+        atr = indicators.compute([10, 12, 9], [11, 13, 10], [9, 11, 7], [ATR(2)])['atr_2']
+        # True ranges 2, 3 (13 - 10) & 5 (12 - 7)
+        np.testing.assert_allclose(atr, [np.nan, 2.5, 2.5 + (5 - 2.5) / 2])
+
+    def test_add_indicator_columns(self):
+        closings, highs, lows = make_bars(60)
+        weeks = pd.date_range('2022-01-03', periods=60, freq='7D').strftime('%Y-%m-%d')
+        data = pd.DataFrame(
+            {'closing': closings[0], 'high': highs[0], 'low': lows[0], 'opening': closings[0], 'volume': 1},
+            index=pd.Index(weeks, name='week'),
+        ).iloc[::-1]
+        data.iloc[5, :3] = np.nan
+        indicators.add_indicator_columns(data, [SMA(5), RSI(5)])
+
+        expected = indicators.compute(
+            data['closing'].to_numpy()[::-1], indicators=[SMA(5), RSI(5)]
+        )
+        np.testing.assert_array_equal(data['sma_5'].to_numpy()[::-1], expected['sma_5'])
+        self.assertTrue(np.isnan(data['sma_5'].iloc[5]))
+        self.assertEqual(list(data.columns[-2:]), ['sma_5', 'rsi_5'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import json
+import os
+import tempfile
+import unittest
+
+import instrumentation
+
+
+@instrumentation.timed('compute')
+def double(value):
+    return value * 2
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        instrumentation.reset()
+
+    def tearDown(self):
+        instrumentation.disable()
+        instrumentation.reset()
+
+    def test_disabled(self):
+        with instrumentation.for_symbol('TCS'):
+            with instrumentation.span('fetch'):
+                self.assertEqual(double(2), 4)
+            instrumentation.count('memo_cache_hits')
+        self.assertEqual(instrumentation.take_records(), [])
+
+    def test_records_by_symbol(self):
+        instrumentation.enable()
+        with instrumentation.for_symbol('TCS'):
+            with instrumentation.span('fetch'):
+                pass
+            double(2)
+            instrumentation.count('memo_cache_hits')
+            instrumentation.count('memo_cache_misses', symbol='INFY')
+        instrumentation.count('memo_cache_hits')
+
+        by_symbol, aggregate = instrumentation.summary()
+        self.assertEqual(set(by_symbol['TCS']['seconds']), {'fetch', 'compute', 'total'})
+        self.assertEqual(by_symbol['TCS']['counters'], {'memo_cache_hits': 1})
+        self.assertEqual(by_symbol['INFY']['counters'], {'memo_cache_misses': 1})
+        self.assertEqual(aggregate['stages']['compute']['count'], 1)
+        self.assertGreaterEqual(
+            aggregate['stages']['total']['seconds'], aggregate['stages']['fetch']['seconds']
+        )
+        self.assertAlmostEqual(aggregate['cache_hit_ratios']['memo_cache'], 2 / 3)
+
+    def test_records_across_processes(self):
+        instrumentation.enable()
+        with instrumentation.span('fetch', 'TCS'):
+            pass
+        records = instrumentation.take_records()
+        self.assertEqual(instrumentation.summary()[1]['stages'], {})
+        instrumentation.add_records(json.loads(json.dumps(records)))
+        self.assertEqual(instrumentation.summary()[1]['stages']['fetch']['count'], 1)
+
+    def test_outputs(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            instrumentation.enable('TCS', os.path.join(output_dir, 'profiles'))
+            for symbol in ['TCS', 'INFY']:
+                with instrumentation.for_symbol(symbol):
+                    double(2)
+                    instrumentation.count('history_store_hits')
+
+            instrumentation.write_jsonl(os.path.join(output_dir, 'metrics.jsonl'))
+            with open(os.path.join(output_dir, 'metrics.jsonl')) as f:
+                lines = [json.loads(line) for line in f]
+            self.assertEqual([line['type'] for line in lines], ['symbol', 'symbol', 'aggregate'])
+            self.assertEqual(lines[-1]['cache_hit_ratios'], {'history_store': 1.0})
+
+            instrumentation.write_prometheus(os.path.join(output_dir, 'metrics.prom'))
+            with open(os.path.join(output_dir, 'metrics.prom')) as f:
+                prometheus = f.read()
+            self.assertIn('nse_stage_calls_total{stage="compute"} 2.0\n', prometheus)
+            self.assertIn('# TYPE nse_cache_hit_ratio gauge\n', prometheus)
+
+            self.assertEqual(sorted(os.listdir(os.path.join(output_dir, 'profiles'))), ['TCS.prof', 'TCS.txt'])
+
+
+if __name__ == '__main__':
+    unittest.main()
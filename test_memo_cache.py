@@ -0,0 +1,72 @@
+import datetime
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import unittest
+
+import pandas as pd
+
+from memo_cache import HistoryMemo
+
+
+class CountingFetch:
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, symbol, start, end):
+        with self.lock:
+            self.calls.append((symbol, start, end))
+        time.sleep(self.latency)
+        days = [start + datetime.timedelta(days=i) for i in range((end - start).days + 1)]
+        return pd.DataFrame(
+            {'Close': [float(i) for i in range(len(days))]}, index=pd.Index(days, name='Date')
+        )
+
+
+class TestHistoryMemo(unittest.TestCase):
+
+    def test_contained_ranges_are_sliced(self):
+        fetch = CountingFetch()
+        memo = HistoryMemo(fetch)
+        memo.get_history('A', date(2022, 1, 1), date(2022, 1, 31))
+        history = memo.get_history('A', date(2022, 1, 10), date(2022, 1, 12))
+
+        self.assertEqual(len(fetch.calls), 1)
+        self.assertEqual(history.index.tolist(), [date(2022, 1, 10), date(2022, 1, 11), date(2022, 1, 12)])
+        self.assertEqual((memo.hits, memo.misses), (1, 1))
+
+        # Overlapping ranges are fetched & merged with the cached one
+        memo.get_history('A', date(2022, 1, 20), date(2022, 2, 10))
+        memo.get_history('A', date(2022, 1, 5), date(2022, 2, 5))
+        self.assertEqual(len(fetch.calls), 2)
+
+    def test_concurrent_requests_share_one_fetch(self):
+        fetch = CountingFetch(latency=0.1)
+        memo = HistoryMemo(fetch)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(
+                lambda _: memo.get_history('A', date(2022, 1, 1), date(2022, 1, 31)), range(8)
+            ))
+
+        self.assertEqual(len(fetch.calls), 1)
+        self.assertTrue(all(result.equals(results[0]) for result in results))
+
+    def test_least_recently_used_is_evicted(self):
+        fetch = CountingFetch()
+        size = int(fetch('X', date(2022, 1, 1), date(2022, 1, 31)).memory_usage(index=True, deep=True).sum())
+        memo = HistoryMemo(fetch, max_bytes=2 * size)
+        fetch.calls.clear()
+
+        for symbol in ['A', 'B', 'A', 'C', 'A', 'B']:
+            memo.get_history(symbol, date(2022, 1, 1), date(2022, 1, 31))
+
+        self.assertEqual([call[0] for call in fetch.calls], ['A', 'B', 'C', 'B'])
+        self.assertLessEqual(memo.total_bytes, 2 * size)
+
+
+if __name__ == "__main__":
+    unittest.main()
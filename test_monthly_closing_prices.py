@@ -0,0 +1,84 @@
+from datetime import date
+import math
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+import monthly_closing_prices
+from monthly_closing_prices import (
+    add_max_profit_percent_from_last_closing_column,
+    add_max_profit_within_next_units_columns,
+    get_expiry_data,
+    max_loss_within_next_units_column,
+    max_profit_within_next_units_column,
+)
+import trading_calendar
+
+
+def make_data():
+    # Latest unit first, like the output of `get_monthly_data`
+    return pd.DataFrame({
+        'closing': [100.0, 110.0, 90.0, 100.0],
+        'high': [120.0, 115.0, 105.0, 100.0],
+        'low': [95.0, 85.0, 80.0, 95.0],
+        'opening': [100.0, 100.0, 100.0, 100.0],
+        'volume': [1, 1, 1, 1],
+    }, index=pd.Index(['2023-04', '2023-03', '2023-02', '2023-01'], name='month'))
+
+
+class TestProfitColumns(unittest.TestCase):
+
+    def test_max_profit_from_last_closing(self):
+        data = make_data()
+        add_max_profit_percent_from_last_closing_column(data)
+
+        self.assertEqual(
+            data['max profit percentage from last closing'].round(4).tolist(),
+            [round(10 / 110 * 100, 4), round(25 / 90 * 100, 4), 5.0, 0.0],
+        )
+
+    def test_max_profit_within_next_units(self):
+        data = make_data()
+        add_max_profit_within_next_units_columns(data, 2)
+        max_profits = data[max_profit_within_next_units_column(2)]
+        max_losses = data[max_loss_within_next_units_column(2)]
+
+        self.assertTrue(math.isnan(max_profits['2023-04']))
+        self.assertTrue(math.isnan(max_profits['2023-03']))
+        self.assertAlmostEqual(max_profits['2023-02'], 120 / 90 * 100 - 100)
+        self.assertAlmostEqual(max_profits['2023-01'], 15.0)
+        self.assertAlmostEqual(max_losses['2023-01'], -20.0)
+
+
+class TestGetExpiryData(unittest.TestCase):
+
+    def test_complete_cycles_only(self):
+        days = [day for day in pd.bdate_range('2023-02-01', '2023-05-31').date if day != date(2023, 3, 30)]
+        history = pd.DataFrame({
+            'Open': range(len(days)),
+            'High': range(len(days)),
+            'Low': range(len(days)),
+            'Close': range(len(days)),
+            'Volume': 1,
+        }, index=pd.Index(days, name='Date'))
+        fetched = []
+
+        def get_history(symbol, start, end):
+            fetched.append((start, end))
+            return history[(history.index >= start) & (history.index <= end)]
+
+        calendar = trading_calendar.TradingCalendar(date(2023, 1, 1), date(2023, 12, 31), [date(2023, 3, 30)])
+        with mock.patch.object(trading_calendar, '_calendar', calendar), \
+                mock.patch.object(monthly_closing_prices, 'get_history', get_history):
+            expiry_data = get_expiry_data(date(2023, 2, 10), date(2023, 5, 25), 'TEST')
+
+        # From the day after the expiry of February till the expiry of April
+        self.assertEqual(fetched, [(date(2023, 2, 24), date(2023, 4, 27))])
+        self.assertEqual(expiry_data.index.tolist(), ['2023-04-27', '2023-03-29'])
+        self.assertEqual(expiry_data.index.name, 'expiry')
+        self.assertEqual(expiry_data['volume'].tolist(), [20, 24])
+
+
+if __name__ == "__main__":
+    unittest.main()
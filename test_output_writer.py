@@ -0,0 +1,107 @@
+from datetime import date
+from functools import partial
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from cli import run
+import output_writer
+
+
+def make_bars(closing):
+    return pd.DataFrame({
+        'closing': [closing, closing + 1.5],
+        'volume': [100, 200],
+        'trend': ['uptrend', 'downtrend'],
+    }, index=pd.Index(['2023-01-09', '2023-01-02'], name='week'))
+
+
+def write_bars_task(dataset_dir, symbol):
+    output_writer.write(make_bars(float(len(symbol))), 'bars', 'weekly', symbol, dataset_dir=dataset_dir)
+    return {}
+
+
+class TestOutputWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.dataset_dir = os.path.join(self.tmp_dir.name, 'dataset')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_read_back(self):
+        for symbol, closing in [('TCS', 10.0), ('INFY', 20.0)]:
+            output_writer.write(make_bars(closing), 'bars', 'weekly', symbol, dataset_dir=self.dataset_dir)
+        output_writer.write(
+            make_bars(0.0), 'bars', 'weekly', 'TCS', run_date=date(2020, 1, 1), dataset_dir=self.dataset_dir
+        )
+        self.assertEqual(output_writer.flush(), [])
+
+        self.assertEqual(output_writer.run_dates('bars', 'weekly', self.dataset_dir), ['2020-01-01', str(date.today())])
+        self.assertEqual(output_writer.symbols('bars', 'weekly', dataset_dir=self.dataset_dir), ['INFY', 'TCS'])
+        pd.testing.assert_frame_equal(
+            output_writer.read('bars', 'weekly', 'TCS', dataset_dir=self.dataset_dir), make_bars(10.0)
+        )
+        pd.testing.assert_frame_equal(
+            output_writer.read('bars', 'weekly', 'TCS', columns=['volume'], dataset_dir=self.dataset_dir),
+            make_bars(10.0)[['volume']],
+        )
+        old_bars = output_writer.read('bars', 'weekly', 'TCS', run_date='2020-01-01', dataset_dir=self.dataset_dir)
+        self.assertEqual(old_bars['closing'].tolist(), [0.0, 1.5])
+
+        everything = output_writer.read('bars', 'weekly', columns=['closing'], dataset_dir=self.dataset_dir)
+        self.assertEqual(everything['symbol'].tolist(), ['INFY', 'INFY', 'TCS', 'TCS'])
+        self.assertEqual(everything['closing'].tolist(), [20.0, 21.5, 10.0, 11.5])
+
+    def test_universe_table_with_multi_index(self):
+        table = pd.DataFrame(
+            {'LTP': [1.0, 2.0, 3.0]},
+            index=pd.MultiIndex.from_tuples(
+                [(np.datetime64('2023-01-02'), 'INFY'), (np.datetime64('2023-01-02'), 'TCS'), (np.datetime64('2023-01-03'), 'TCS')],
+                names=['date', 'symbol'],
+            ),
+        )
+        output_writer.write(table, 'ath_time_series', 'daily', dataset_dir=self.dataset_dir)
+        output_writer.flush()
+
+        self.assertEqual(output_writer.symbols('ath_time_series', 'daily', dataset_dir=self.dataset_dir), ['__all__'])
+        pd.testing.assert_frame_equal(output_writer.read('ath_time_series', 'daily', dataset_dir=self.dataset_dir), table)
+
+    def test_csv_is_opt_in(self):
+        csv_path = os.path.join(self.tmp_dir.name, 'TCS_weekly_data.csv')
+        output_writer.write(make_bars(1.0), 'bars', 'weekly', 'TCS', csv_path=csv_path, dataset_dir=self.dataset_dir)
+        output_writer.flush()
+        self.assertFalse(os.path.exists(csv_path))
+
+        with mock.patch.object(output_writer, 'csv_output', True):
+            output_writer.write(make_bars(1.0), 'bars', 'weekly', 'TCS', csv_path=csv_path, dataset_dir=self.dataset_dir)
+        output_writer.flush()
+        pd.testing.assert_frame_equal(pd.read_csv(csv_path, index_col='week'), make_bars(1.0))
+
+        export_path = os.path.join(self.tmp_dir.name, 'export.csv')
+        output_writer.export_csv('bars', 'weekly', export_path, dataset_dir=self.dataset_dir)
+        self.assertEqual(pd.read_csv(export_path)['symbol'].tolist(), ['TCS', 'TCS'])
+
+    def test_failed_writes_are_reported(self):
+        blocker = os.path.join(self.tmp_dir.name, 'file')
+        open(blocker, 'w').close()
+        with mock.patch('builtins.print'):
+            output_writer.write(make_bars(1.0), 'bars', 'weekly', 'TCS', dataset_dir=blocker)
+            errors = output_writer.flush()
+        self.assertEqual(len(errors), 1)
+
+    def test_workers_write_before_returning(self):
+        symbols = ['A', 'BB', 'CCC', 'DDDD', 'EEEEE']
+        results = list(run(partial(write_bars_task, self.dataset_dir), symbols, workers=2, chunksize=2))
+        self.assertEqual([error for _, _, error in results], [None] * len(symbols))
+        everything = output_writer.read('bars', 'weekly', dataset_dir=self.dataset_dir)
+        self.assertEqual(sorted(set(everything['symbol'])), symbols)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+from datetime import date
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from ath_engine import ath_time_series, panel_ath_time_series
+from benchmark import SyntheticProvider, stand_in_history
+from panel import build_panel, open_panel, write_panel
+
+
+class TestPanel(unittest.TestCase):
+
+    def setUp(self):
+        self.provider = SyntheticProvider(years=2, end_date=date(2023, 6, 30), newly_listed_fraction=0)
+        self.histories = {
+            symbol: self.provider(symbol, date(2022, 1, 1), date(2023, 6, 30))
+            for symbol in ['TCS', 'INFY', 'ITC']
+        }
+        # Newly listed & with a gap
+        self.histories['INFY'] = self.histories['INFY'][self.histories['INFY'].index >= date(2023, 1, 1)]
+        self.histories['ITC'] = self.histories['ITC'].drop(self.histories['ITC'].index[10:15])
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.panel_path = os.path.join(self.tmp_dir.name, 'test')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_round_trip(self):
+        write_panel(self.histories, self.panel_path)
+        panel = open_panel(panel_path=self.panel_path)
+        self.assertEqual(panel.symbols, ['TCS', 'INFY', 'ITC'])
+        self.assertEqual(panel.columns['close'].dtype, np.float32)
+        self.assertEqual(panel.columns['volume'].dtype, np.int64)
+        self.assertEqual(len(panel.dates), len(self.histories['TCS']))
+
+        for symbol, history in self.histories.items():
+            read = panel.history(symbol)
+            self.assertEqual(read.index.tolist(), history.index.tolist())
+            np.testing.assert_array_equal(read['Close'], history['Close'].astype(np.float32))
+            np.testing.assert_array_equal(read['Volume'], history['Volume'])
+
+        infy_closings = panel.values('close', 'INFY', end=date(2022, 12, 31))
+        self.assertTrue(np.isnan(infy_closings).all())
+        self.assertTrue((panel.values('volume', 'INFY', end=date(2022, 12, 31)) == 0).all())
+
+    def test_views(self):
+        write_panel(self.histories, self.panel_path)
+        panel = open_panel(panel_path=self.panel_path)
+        values = panel.values('high', 'TCS', date(2023, 1, 1), date(2023, 3, 31))
+        self.assertTrue(np.shares_memory(values, panel.columns['high']))
+        self.assertIsInstance(panel.columns['high'], np.memmap)
+        history = self.histories['TCS']
+        in_range = history[(history.index >= date(2023, 1, 1)) & (history.index <= date(2023, 3, 31))]
+        np.testing.assert_array_equal(values, in_range['High'].astype(np.float32))
+        self.assertEqual(panel.values('high', start=date(2023, 1, 1)).shape[0], 3)
+
+    def test_build_panel(self):
+        with stand_in_history(self.provider):
+            build_panel('test', ['TCS', 'INFY'], date(2023, 1, 1), date(2023, 3, 31), self.tmp_dir.name)
+            build_panel('test', ['TCS', 'INFY', 'ITC'], date(2023, 1, 1), date(2023, 6, 30), self.tmp_dir.name)
+            panel = open_panel('test', self.tmp_dir.name)
+            self.assertEqual(panel.symbols, ['TCS', 'INFY', 'ITC'])
+            self.assertEqual(str(panel.dates[-1]), '2023-06-30')
+            self.assertEqual(sorted(os.listdir(self.tmp_dir.name)), ['test'])
+
+            series = ath_time_series(['TCS', 'INFY', 'ITC'], date(2023, 1, 1), date(2023, 6, 30), window=20)
+            panel_series = panel_ath_time_series(panel, window=20)
+            self.assertEqual(series.index.tolist(), panel_series.index.tolist())
+            # Prices are float32 in the panel
+            np.testing.assert_allclose(series.to_numpy(), panel_series.to_numpy(), rtol=1e-6, atol=1e-4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import contextlib
+import io
+import unittest
+
+import numpy as np
+
+from benchmark import SyntheticProvider, stand_in_history
+import get_current_trend
+import memo_cache
+import pivots
+
+
+def loop_swing_lows(values, left, right):
+    '''Swing lows the slow way, as `get_trend_by_peaks` used to find its bottoms'''
+    is_swing = np.zeros(len(values), dtype=bool)
+    for i in range(left, len(values) - right):
+        neighbours = np.concatenate([values[i - left:i], values[i + 1:i + 1 + right]])
+        is_swing[i] = bool(np.all(values[i] < neighbours))
+    return is_swing
+
+
+class TestSwings(unittest.TestCase):
+
+    def test_matches_loop(self):
+        random = np.random.default_rng(7)
+        values = np.round(random.normal(100, 5, (20, 60)))
+        values[3, :10] = np.nan
+        for left, right in [(1, 1), (2, 2), (1, 3), (4, 2)]:
+            expected = np.array([loop_swing_lows(row, left, right) for row in values])
+            np.testing.assert_array_equal(pivots.swing_lows(values, left, right), expected)
+            expected_highs = np.array([loop_swing_lows(-row, left, right) for row in values])
+            np.testing.assert_array_equal(pivots.swing_highs(values, left, right), expected_highs)
+
+    def test_one_dimensional_and_short(self):
+        np.testing.assert_array_equal(
+            pivots.swing_lows([5, 3, 4, 2, 6], 1, 1), [False, True, False, True, False]
+        )
+        np.testing.assert_array_equal(pivots.swing_lows([5, 3, 4, 2, 6], 2, 1), [False, False, False, True, False])
+        np.testing.assert_array_equal(pivots.swing_highs([1, 2], 1, 1), [False, False])
+
+    def test_streaks_and_structure(self):
+        values = np.array([
+            [10, 8, 12, 10, 14, 12, 16],
+            [16, 12, 14, 10, 12, 8, 10],
+        ], dtype=float)
+        lows, found = pivots.latest_pivots(values, pivots.swing_lows(values))
+        np.testing.assert_array_equal(lows, [[12, 10, 8], [8, 10, 12]])
+        np.testing.assert_array_equal(pivots.rising_streak(lows, found), [2, 0])
+        np.testing.assert_array_equal(pivots.falling_streak(lows, found), [0, 2])
+
+        structure = pivots.swing_structure(values, values)
+        np.testing.assert_array_equal(structure['trend'], [1, -1])
+        np.testing.assert_array_equal(structure['higher_highs'], [1, 0])
+        np.testing.assert_array_equal(structure['lower_lows'], [0, 2])
+
+
+class TestGetTrendByPeaks(unittest.TestCase):
+
+    def test_no_refetch(self):
+        with stand_in_history(SyntheticProvider(years=3)), contextlib.redirect_stdout(io.StringIO()):
+            get_current_trend.get_trend_by_count('TCS', num_units=40, chart_type='daily')
+            misses = memo_cache.memo.misses
+            for swing_width in [1, 2, 3]:
+                trend = get_current_trend.get_trend_by_peaks(
+                    'TCS', num_units=40, chart_type='daily', swing_width=swing_width
+                )
+                self.assertIn(trend, ['uptrend', 'consolidation', 'downtrend'])
+            self.assertEqual(memo_cache.memo.misses, misses)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,27 @@
+import unittest
+
+import numpy as np
+
+from profit_sweep import probability_surface
+
+
+class TestProbabilitySurface(unittest.TestCase):
+
+    def test_matches_counting(self):
+        rng = np.random.default_rng(0)
+        max_profits = np.round(rng.normal(1, 2, 300), 1)
+        max_profits[:3] = np.nan  # latest units without enough units after them
+        thresholds = [2, -1, 0.5, 1, 1.3, 10]
+        lookbacks = [250, 1, 52, 12, 400]
+
+        surface = probability_surface(max_profits, thresholds, lookbacks)
+
+        valid_max_profits = max_profits[3:]
+        for threshold in thresholds:
+            for lookback in lookbacks:
+                expected = (valid_max_profits[:lookback] > threshold).sum() / lookback * 100
+                self.assertAlmostEqual(surface.loc[threshold, lookback], expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import asyncio
+import contextlib
+import datetime
+import io
+import json
+import unittest
+
+from benchmark import SyntheticProvider, stand_in_history
+import cli
+import memo_cache
+from query_service import QueryService
+
+
+SYMBOLS = ['TCS', 'INFY', 'PIIND']
+
+
+async def get(port, paths):
+    '''Status & answer of every path, asked one after the other on one connection'''
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    answers = []
+    for path in paths:
+        writer.write(('GET %s HTTP/1.1\r\nHost: localhost\r\n\r\n' % path).encode())
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode().strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.lower()] = value.strip()
+        body = await reader.readexactly(int(headers['content-length']))
+        answers.append((status, json.loads(body)))
+    writer.close()
+    return answers
+
+
+class TestQueryService(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.history = stand_in_history(SyntheticProvider(years=9, newly_listed_fraction=0))
+        self.history.__enter__()
+        self.output = contextlib.redirect_stdout(io.StringIO())
+        self.output.__enter__()
+        self.service = QueryService(SYMBOLS, since=datetime.date(2018, 1, 1), threads=2, prefetch=False)
+        await self.service.load()
+        self.server = await asyncio.start_server(self.service.handle, '127.0.0.1', 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.output.__exit__(None, None, None)
+        self.history.__exit__(None, None, None)
+
+    async def test_answers_match_cli(self):
+        misses = memo_cache.memo.misses
+        (trend_status, trend), (ath_status, ath), (profit_status, profit) = await get(self.port, [
+            '/trend?chart_type=monthly&num_units=12',
+            '/ath?symbol=INFY&percentile=90',
+            '/profit_probability?symbol=TCS,INFY&timeframe=monthly&threshold=3&lookback=12',
+        ])
+        # All of it from the history loaded in memory
+        self.assertEqual(memo_cache.memo.misses, misses)
+
+        self.assertEqual((trend_status, ath_status, profit_status), (200, 200, 200))
+        self.assertEqual(list(trend['results']), SYMBOLS)
+        self.assertEqual(trend['results']['PIIND'], {
+            key: (value.item() if hasattr(value, 'item') else value)
+            for key, value in cli.trend_task('PIIND', num_units=12, chart_type='monthly').items()
+        })
+        self.assertEqual(ath['results']['INFY'], {
+            key: float(value) for key, value in cli.ath_task('INFY', percentile=90).items()
+        })
+        self.assertEqual(list(profit['results']), ['TCS', 'INFY'])
+        self.assertEqual(
+            profit['results']['TCS'], cli.max_profit_monthly_task('TCS', threshold=3, lookback=12)
+        )
+
+    async def test_concurrent_clients_share_results(self):
+        answers = await asyncio.gather(*[get(self.port, ['/trend?symbol=TCS']) for _ in range(20)])
+        self.assertEqual(len({json.dumps(answer) for answer in answers}), 1)
+        self.assertEqual(self.service.health()['cached_results'], 1)
+
+    async def test_errors(self):
+        answers = await get(self.port, [
+            '/nope', '/trend?chart_type=yearly', '/ath?percentile=high', '/ath?symbol=TCS&days=3',
+            '/trend?symbol=TCS,../../tmp/x', '/trend?symbol=WIPRO', '/health',
+        ])
+        self.assertEqual([status for status, _ in answers], [404, 400, 400, 400, 400, 400, 200])
+        self.assertEqual(len(self.service._results), 0)
+        self.assertEqual(answers[-1][1]['symbols'], 3)
+        self.assertEqual(answers[-1][1]['status'], 'ok')
+
+
+if __name__ == "__main__":
+    unittest.main()
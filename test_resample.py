@@ -0,0 +1,73 @@
+from datetime import date
+import math
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from resample import resample_ohlcv, with_string_index
+import trading_calendar
+
+
+def make_history(rows):
+    '''`rows` is a list of (date, open, high, low, close, volume)'''
+    return pd.DataFrame(
+        [row[1:] for row in rows],
+        columns=['Open', 'High', 'Low', 'Close', 'Volume'],
+        index=pd.Index([row[0] for row in rows], name='Date'),
+    )
+
+
+class TestResampleOHLCV(unittest.TestCase):
+
+    def test_weekly_bars(self):
+        history = make_history([
+            (date(2023, 1, 2), 10, 12, 9, 11, 100),
+            (date(2023, 1, 4), 11, 15, 10, 14, 200),
+            (date(2023, 1, 6), 14, 14, 8, 9, 300),
+            # Saturday sessions are not part of any week
+            (date(2023, 1, 7), 9, 30, 1, 20, 400),
+            (date(2023, 1, 16), 20, 21, 19, 20, 50),
+        ])
+        weekly = with_string_index(
+            resample_ohlcv(history, 'weekly', date(2023, 1, 2), date(2023, 1, 20)), 'weekly'
+        )
+
+        self.assertEqual(weekly.index.tolist(), ['2023-01-16', '2023-01-09', '2023-01-02'])
+        self.assertEqual(
+            weekly.loc['2023-01-02'].tolist(), [9, 15, 8, 10, 600]
+        )
+        self.assertTrue(all(math.isnan(value) for value in weekly.loc['2023-01-09']))
+
+    def test_monthly_bars(self):
+        history = make_history([
+            (date(2023, 1, 31), 10, 12, 9, 11, 100),
+            (date(2023, 2, 1), 11, 15, 10, 14, 200),
+            (date(2023, 2, 25), 14, 16, 8, 9, 300),
+        ])
+        monthly = resample_ohlcv(history, 'monthly')
+
+        self.assertEqual(monthly.index.tolist(), [pd.Period('2023-02', 'M'), pd.Period('2023-01', 'M')])
+        self.assertEqual(monthly.iloc[0].tolist(), [9, 16, 8, 11, 500])
+
+    def test_expiry_bars(self):
+        history = make_history([
+            (date(2023, 3, 1), 10, 12, 9, 11, 100),
+            # Expiry of March, moved back from the 30th, a holiday
+            (date(2023, 3, 29), 11, 15, 10, 14, 200),
+            (date(2023, 3, 31), 14, 16, 8, 9, 300),
+            (date(2023, 4, 27), 9, 10, 7, 8, 400),
+        ])
+        calendar = trading_calendar.TradingCalendar(date(2023, 1, 1), date(2023, 12, 31), [date(2023, 3, 30)])
+        with mock.patch.object(trading_calendar, '_calendar', calendar):
+            monthly = with_string_index(resample_ohlcv(history, 'expiry'), 'expiry')
+            weekly = with_string_index(resample_ohlcv(history, 'weekly_expiry'), 'weekly_expiry')
+
+        self.assertEqual(monthly.index.tolist(), ['2023-04-27', '2023-03-29'])
+        self.assertEqual(monthly.loc['2023-03-29'].tolist(), [14, 15, 9, 10, 300])
+        self.assertEqual(monthly.loc['2023-04-27'].tolist(), [8, 16, 7, 14, 700])
+        self.assertEqual(weekly.index.tolist(), ['2023-04-27', '2023-04-06', '2023-03-29', '2023-03-02'])
+
+
+if __name__ == "__main__":
+    unittest.main()
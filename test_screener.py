@@ -0,0 +1,108 @@
+import contextlib
+import io
+import unittest
+
+import numpy as np
+
+from benchmark import SyntheticProvider, stand_in_history
+import cli
+import memo_cache
+import screener
+from screener import ExpressionError, Screener
+
+
+SYMBOLS = ['TCS', 'INFY', 'PIIND', 'SBIN', 'ITC']
+
+
+class TestParse(unittest.TestCase):
+
+    def test_metric_keys(self):
+        _, keys = screener.parse(
+            "trend == uptrend and ath_distance(90) > -10 and profit_probability('monthly', lookback=12) > 60"
+        )
+        self.assertEqual(keys, [
+            ('trend', ('weekly', 15)),
+            ('ath_distance', (90, 365)),
+            ('profit_probability', ('monthly', 1, 12)),
+        ])
+        self.assertEqual(screener.metric_label(keys[0]), 'trend')
+        self.assertEqual(screener.metric_label(keys[1]), 'ath_distance(90, 365)')
+
+    def test_rejects(self):
+        for expression in [
+            "__import__('os').system('ls')",
+            'ltp.real > 1',
+            'price > 1',
+            'returns(20, 3) > 1',
+            'returns(days=ltp) > 1',
+            "'a' < 'b'",
+            'ltp > 1 if True else 0',
+            'ltp >',
+        ]:
+            with self.assertRaises(ExpressionError, msg=expression):
+                screener.parse(expression)
+
+
+class TestScreener(unittest.TestCase):
+
+    def setUp(self):
+        self.history = stand_in_history(SyntheticProvider(years=6, newly_listed_fraction=0))
+        self.history.__enter__()
+        self.output = contextlib.redirect_stdout(io.StringIO())
+        self.output.__enter__()
+        self.screener = Screener(SYMBOLS)
+
+    def tearDown(self):
+        self.output.__exit__(None, None, None)
+        self.history.__exit__(None, None, None)
+
+    def test_matches_analyses(self):
+        results = self.screener.screen(
+            'ath_distance(90) > -1000 and trend >= downtrend', sort_by='ath_distance(90)', ascending=True
+        )
+        self.assertEqual(sorted(results.index), sorted(SYMBOLS))
+        self.assertTrue(results['ath_distance(90, 365)'].is_monotonic_increasing)
+        for symbol in SYMBOLS:
+            ath = cli.ath_task(symbol, percentile=90)
+            self.assertAlmostEqual(
+                results.loc[symbol, 'ath_distance(90, 365)'], (ath['LTP'] / ath['nth_percentile_high'] - 1) * 100
+            )
+            self.assertEqual(results.loc[symbol, 'trend'], {'uptrend': 1, 'consolidation': 0, 'downtrend': -1}[
+                cli.trend_task(symbol)['trend_by_peaks']
+            ])
+
+        probabilities = self.screener.metric(('profit_probability', ('monthly', 3, 12)))
+        np.testing.assert_array_equal(probabilities, [
+            cli.max_profit_monthly_task(symbol, threshold=3, lookback=12)['probability'] for symbol in SYMBOLS
+        ])
+
+    def test_only_referenced_metrics_are_computed_once(self):
+        self.screener.screen('returns(5) > 0 or ltp < 0')
+        self.assertEqual(list(self.screener.table.columns), ['returns(5)', 'ltp'])
+
+        misses = memo_cache.memo.misses
+        results = self.screener.screen('not returns(5) > 0', sort_by='abs(returns(5)) * -1', limit=2)
+        self.assertEqual(memo_cache.memo.misses, misses)
+        self.assertEqual(list(self.screener.table.columns), ['returns(5)', 'ltp'])
+        self.assertLessEqual(len(results), 2)
+        self.assertTrue((results['returns(5)'] <= 0).all())
+        self.assertTrue(results['returns(5)'].abs().is_monotonic_increasing)
+
+    def test_scalars_and_missing_values(self):
+        self.assertEqual(sorted(self.screener.screen('ltp > 1 and 1').index), sorted(SYMBOLS))
+        self.assertEqual(len(self.screener.screen('0 or ltp < 0 or 0')), 0)
+
+        ltp = self.screener.metric(('ltp', ())).copy()
+        ltp[1] = np.nan
+        self.screener.columns[('ltp', ())] = ltp
+        for expression in [
+            'min(ltp, 1) > 0', 'max(ltp, 1) > 0', 'ltp > 0 or 1 > 2', 'not (ltp < 0)', 'ltp != 0',
+            'ltp != 0 or returns(5) > -1000',
+        ]:
+            self.assertNotIn(SYMBOLS[1], self.screener.screen(expression).index, msg=expression)
+            self.assertEqual(len(self.screener.screen(expression)), len(SYMBOLS) - 1)
+        self.assertEqual(len(self.screener.screen('not (ltp > 0)')), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
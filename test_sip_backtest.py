@@ -0,0 +1,68 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from sip_backtest import sip_grid
+from utils import get_xirr
+
+
+def monthly_data(closings, first_month='2020-01'):
+    months = pd.period_range(first_month, periods=len(closings), freq='M').strftime('%Y-%m')
+    # Latest month first, like `get_monthly_data`
+    return pd.DataFrame({'closing': closings}, index=pd.Index(months, name='month')).iloc[::-1]
+
+
+def month_end(month):
+    return pd.Period(month, 'M').end_time.date()
+
+
+class TestSipGrid(unittest.TestCase):
+
+    def test_against_loop(self):
+        rng = np.random.default_rng(0)
+        data = monthly_data(100 * np.exp(np.cumsum(rng.normal(0.01, 0.05, 40))))
+        grid = sip_grid(data, holding_years=[1, 2, 3], monthly_amount=500)
+        # 28, 16 & 4 start months for the 1, 2 & 3 years
+        self.assertEqual(len(grid), 28 + 16 + 4)
+
+        closings = data['closing'].sort_index()
+        for _, row in grid.iterrows():
+            start = closings.index.get_loc(row['start_month'])
+            end = start + 12 * row['years']
+            units = sum(500 / closing for closing in closings.iloc[start:end])
+            final_value = units * closings.iloc[end]
+            investments = [
+                (500, (month_end(closings.index[end]) - month_end(month)).days)
+                for month in closings.index[start:end]
+            ]
+            self.assertAlmostEqual(row['invested'], 500 * 12 * row['years'])
+            self.assertAlmostEqual(row['final_value'], final_value)
+            self.assertAlmostEqual(row['profit_percent'], (final_value / row['invested'] - 1) * 100)
+            self.assertAlmostEqual(row['xirr'], get_xirr(investments, final_value), places=6)
+
+    def test_flat_price(self):
+        grid = sip_grid(monthly_data([10.0] * 13), holding_years=[1])
+        self.assertEqual(grid['start_month'].tolist(), ['2020-01'])
+        self.assertAlmostEqual(grid['profit_percent'][0], 0)
+        self.assertAlmostEqual(grid['xirr'][0], 0)
+
+    def test_months_without_closing(self):
+        closings = [10.0] * 26
+        closings[0] = closings[1] = np.nan  # Not listed yet
+        closings[13] = np.nan
+        grid = sip_grid(monthly_data(closings), holding_years=[1])
+        # The SIPs before the listing & from the month without a closing don't start with an
+        # installment, the one from the 2nd month ends on the month without a closing
+        self.assertEqual(grid['start_month'].tolist()[:3], ['2020-03', '2020-04', '2020-05'])
+        self.assertEqual(grid['invested'].tolist()[:3], [11000, 11000, 11000])
+        self.assertNotIn('2021-02', grid['start_month'].tolist())
+        self.assertEqual(len(grid), 26 - 12 - 3)
+
+    def test_too_short(self):
+        self.assertTrue(sip_grid(monthly_data([10.0] * 12), holding_years=[1]).empty)
+        self.assertTrue(sip_grid(monthly_data([]), holding_years=[1]).empty)
+
+
+if __name__ == '__main__':
+    unittest.main()
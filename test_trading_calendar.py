@@ -0,0 +1,116 @@
+from datetime import date
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import trading_calendar
+from trading_calendar import TradingCalendar
+
+
+def days(*dates):
+    return np.array(dates, dtype='datetime64[D]')
+
+
+class TestDateIds(unittest.TestCase):
+
+    def test_ids_are_period_ordinals(self):
+        dates = pd.date_range('1965-01-01', '2035-12-31')
+        np.testing.assert_array_equal(trading_calendar.week_ids(dates), dates.to_period('W-SUN').asi8)
+        np.testing.assert_array_equal(trading_calendar.month_ids(dates), dates.to_period('M').asi8)
+        np.testing.assert_array_equal(trading_calendar.weekdays(dates), dates.dayofweek)
+
+    def test_starts(self):
+        self.assertEqual(
+            trading_calendar.week_starts(trading_calendar.week_ids(date(2023, 5, 7))), np.datetime64('2023-05-01')
+        )
+        self.assertEqual(
+            trading_calendar.month_starts(trading_calendar.month_ids(date(2023, 5, 31))), np.datetime64('2023-05-01')
+        )
+
+    def test_weekday_alignment(self):
+        # 2023-05-03 is a Wednesday
+        self.assertEqual(trading_calendar.next_weekday(date(2023, 5, 3), trading_calendar.MONDAY), date(2023, 5, 8))
+        self.assertEqual(trading_calendar.next_weekday(date(2023, 5, 8), trading_calendar.MONDAY), date(2023, 5, 8))
+        self.assertEqual(trading_calendar.previous_weekday(date(2023, 5, 3), trading_calendar.FRIDAY), date(2023, 4, 28))
+        self.assertEqual(trading_calendar.previous_weekday(date(2023, 5, 3), trading_calendar.WEDNESDAY), date(2023, 5, 3))
+
+
+class TestTradingCalendar(unittest.TestCase):
+
+    def setUp(self):
+        # 2023-03-30 (a Thursday, the last one of March) & 2023-01-26 are holidays
+        self.calendar = TradingCalendar(date(2023, 1, 1), date(2023, 12, 31), [date(2023, 3, 30), date(2023, 1, 26)])
+
+    def test_trading_days(self):
+        self.assertEqual(len(self.calendar), 260 - 2)
+        np.testing.assert_array_equal(
+            self.calendar.trading_days(date(2023, 3, 29), date(2023, 4, 3)), days('2023-03-29', '2023-03-31', '2023-04-03')
+        )
+        np.testing.assert_array_equal(
+            self.calendar.is_trading_day([date(2023, 3, 30), date(2023, 3, 31), date(2023, 4, 1)]), [False, True, False]
+        )
+
+    def test_previous_next_trading_day(self):
+        queries = [date(2023, 3, 30), date(2023, 3, 31), date(2023, 4, 1)]
+        np.testing.assert_array_equal(
+            self.calendar.previous_trading_day(queries), days('2023-03-29', '2023-03-29', '2023-03-31')
+        )
+        np.testing.assert_array_equal(
+            self.calendar.previous_trading_day(queries, inclusive=True), days('2023-03-29', '2023-03-31', '2023-03-31')
+        )
+        np.testing.assert_array_equal(
+            self.calendar.next_trading_day(queries), days('2023-03-31', '2023-04-03', '2023-04-03')
+        )
+        self.assertTrue(np.isnat(self.calendar.previous_trading_day(date(2023, 1, 2))))
+        self.assertTrue(np.isnat(self.calendar.next_trading_day(date(2023, 12, 29))))
+
+    def test_expiries(self):
+        # Last Thursdays, the one of March moved to the Wednesday before the holiday
+        np.testing.assert_array_equal(
+            self.calendar.expiries()[:4], days('2023-01-25', '2023-02-23', '2023-03-29', '2023-04-27')
+        )
+        self.assertIn(np.datetime64('2023-03-29'), self.calendar.expiries('weekly'))
+        self.assertIn(np.datetime64('2023-03-23'), self.calendar.expiries('weekly'))
+
+    def test_expiry_ids(self):
+        march = pd.Period('2023-03', 'M').ordinal
+        ids = self.calendar.expiry_ids([date(2023, 3, 1), date(2023, 3, 29), date(2023, 3, 31)])
+        np.testing.assert_array_equal(ids, [march, march, march + 1])
+        np.testing.assert_array_equal(self.calendar.expiry_of(ids), days('2023-03-29', '2023-03-29', '2023-04-27'))
+
+        weekly_ids = self.calendar.expiry_ids([date(2023, 3, 27), date(2023, 3, 31)], 'weekly')
+        np.testing.assert_array_equal(
+            self.calendar.expiry_of(weekly_ids, 'weekly'), days('2023-03-29', '2023-04-06')
+        )
+
+
+class TestHolidaysFile(unittest.TestCase):
+
+    def test_observed_holidays_round_trip(self):
+        traded = [date(2023, 3, 27), date(2023, 3, 28), date(2023, 3, 29), date(2023, 3, 31)]
+        histories = [(traded, [(date(2023, 3, 27), date(2023, 4, 2))])] * 2 + [
+            # Listed on the 29th, suspended on the 31st
+            ([date(2023, 3, 29)], [(date(2023, 3, 20), date(2023, 3, 31))]),
+        ]
+        holidays = trading_calendar.observed_holidays(histories, min_symbols=2)
+        np.testing.assert_array_equal(holidays, days('2023-03-30'))
+        # A single symbol isn't enough to tell
+        self.assertEqual(len(trading_calendar.observed_holidays(histories[2:], min_symbols=2)), 0)
+        self.assertEqual(len(trading_calendar.observed_holidays([])), 0)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'holidays.txt')
+            with open(path, 'w') as f:
+                f.write('# NSE holidays\n2023-01-26\n')
+            trading_calendar.write_holidays(holidays, path)
+            np.testing.assert_array_equal(trading_calendar.load_holidays(path), days('2023-01-26', '2023-03-30'))
+            with open(path) as f:
+                self.assertEqual(f.readline(), '# NSE holidays\n')
+            self.assertIsNone(trading_calendar.load_holidays(os.path.join(tmp_dir, 'missing.txt')))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+
+import pandas as pd
+
+from trend_scanner import scan_chart_data
+
+
+def make_chart_data(closings):
+    '''`closings` are oldest first, chart data is latest first'''
+    weeks = ['2023-01-%02d' % (day + 1) for day in range(len(closings))]
+    return pd.DataFrame(
+        {'closing': closings[::-1]}, index=pd.Index(weeks[::-1], name='week')
+    )
+
+
+class TestScanChartData(unittest.TestCase):
+
+    def test_trends(self):
+        trends = scan_chart_data({
+            # Higher bottoms & closing above the latest one
+            'RISING': make_chart_data([10, 8, 12, 10, 14, 12, 16]),
+            # Closing below the latest bottom
+            'FALLING': make_chart_data([10, 8, 12, 10, 14, 12, 9]),
+            # Lower latest bottom
+            'LOWER_BOTTOM': make_chart_data([10, 8, 12, 7, 9]),
+            # Single bottom, falls back to counting gains: 4 out of 5
+            'FEW_BOTTOMS': make_chart_data([1, 2, 3, 2, 4, 5]),
+            'NO_DATA': pd.DataFrame({'week': [], 'closing': []}),
+        })
+
+        self.assertEqual(trends.loc['RISING'].tolist(), [7, 'consolidation', 'uptrend'])
+        self.assertEqual(trends.loc['FALLING', 'trend_by_peaks'], 'downtrend')
+        self.assertEqual(trends.loc['LOWER_BOTTOM', 'trend_by_peaks'], 'downtrend')
+        self.assertEqual(trends.loc['FEW_BOTTOMS'].tolist(), [6, 'uptrend', 'uptrend'])
+        self.assertEqual(trends.loc['NO_DATA', 'units'], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
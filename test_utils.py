@@ -1,6 +1,8 @@
 import unittest
 
-from utils import get_xirr
+import numpy as np
+
+from utils import get_xirr, get_xirr_batch
 
 
 class TestGetXIRR(unittest.TestCase):
@@ -11,7 +13,7 @@ class TestGetXIRR(unittest.TestCase):
             ([(1000, 365)], 2000, 100.0),
             ([(1000, 0)], 1000, 0.0),
             ([(1000, 365), (2000, 0)], 3000, 0.0),
-            ([(1000, 365), (1000, 730)], 8000, 137.22),
+            ([(1000, 365), (1000, 730)], 8000, 137.23),
         ]
 
         for investments, current_value, expected_xirr in test_cases:
@@ -27,5 +29,39 @@ class TestGetXIRR(unittest.TestCase):
                 )
             )
 
+class TestGetXIRRBatch(unittest.TestCase):
+
+    def test_ragged_portfolios(self):
+        rng = np.random.default_rng(0)
+        investments_list = []
+        current_values = []
+        for _ in range(500):
+            length = rng.integers(1, 40)
+            investments_list.append(list(zip(
+                rng.uniform(100, 1000, length), rng.integers(1, 3650, length)
+            )))
+            current_values.append(
+                sum(amount for amount, _ in investments_list[-1]) * rng.uniform(0.05, 5)
+            )
+
+        xirrs = get_xirr_batch(investments_list, current_values)
+
+        self.assertFalse(np.isnan(xirrs).any())
+        self.assertTrue((xirrs > -100).all())
+        for investments, current_value, xirr in zip(investments_list, current_values, xirrs):
+            future_value = sum(
+                amount * (1 + xirr / 100) ** (days / 365) for amount, days in investments
+            )
+            self.assertAlmostEqual(future_value, current_value, places=4)
+
+    def test_warm_start_and_unsolvable(self):
+        investments_list = [[(1000, 365), (1000, 730)], [(1000, 0)], []]
+        xirrs = get_xirr_batch(investments_list, [8000, 2000, 0], initial_guesses=[130, 0, 0])
+
+        self.assertAlmostEqual(xirrs[0], (np.sqrt(33) - 3) / 2 * 100)
+        self.assertTrue(np.isnan(xirrs[1]))
+        self.assertEqual(xirrs[2], 0.0)
+
+
 if __name__ == "__main__":
     unittest.main()
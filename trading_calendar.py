@@ -0,0 +1,284 @@
+'''
+    NSE trading calendar: the sorted array of the trading days & vectorized date bucketing
+
+    The trading days are the weekdays which are not holidays. The holidays are read from a
+    local file (`nse_holidays.txt`, override with the `NSE_HOLIDAYS_FILE` environment
+    variable), one 'YYYY-MM-DD' per line with '#' starting a comment. `python3
+    trading_calendar.py` adds the holidays seen in the local history store to it: the weekdays
+    none of the symbols (with history for them) traded on.
+
+    Dates map to the id of their week, month & expiry cycle with plain arithmetic on
+    `datetime64[D]` arrays, so bucketing days is array indexing. The week & month ids are the
+    ordinals of pandas' 'W-SUN' & 'M' periods, so they can be turned back into periods with
+    `pd.PeriodIndex.from_ordinals`. Previous/next trading day queries are binary searches
+    on the trading days.
+'''
+
+import datetime
+from datetime import date
+import os
+
+import numpy as np
+import pandas as pd
+
+
+HOLIDAYS_FILE = os.environ.get(
+    'NSE_HOLIDAYS_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'nse_holidays.txt')
+)
+
+MONDAY, TUESDAY, WEDNESDAY, THURSDAY, FRIDAY, SATURDAY, SUNDAY = range(7)
+
+# Expiries are on the last Thursday of the month (monthly cycle) or on every Thursday
+# (weekly cycle), on the trading day before when it's a holiday
+EXPIRY_WEEKDAY = THURSDAY
+EXPIRY_CYCLES = ['monthly', 'weekly']
+
+# Symbols which should have history for a day for it to be taken as a holiday when none of
+# them traded on it, see `observed_holidays`
+MIN_SYMBOLS = 5
+
+# 1970-01-01 is a Thursday: the days since then + 3 are the days since the Monday before it
+_DAYS_FROM_MONDAY = 3
+# Ordinal of the 'W-SUN' period of the week of 1970-01-01
+_FIRST_WEEK_ID = 1
+
+_calendar = None
+
+
+def to_days(dates):
+    '''`dates` (a date, a list or an array/Index of dates or datetimes) as `datetime64[D]`'''
+    if isinstance(dates, (pd.Index, pd.Series)):
+        return pd.DatetimeIndex(pd.to_datetime(dates)).to_numpy().astype('datetime64[D]')
+    if isinstance(dates, datetime.datetime):
+        dates = dates.date()
+    return np.asarray(dates, dtype='datetime64[D]')
+
+
+def _day_numbers(dates):
+    return to_days(dates).astype(np.int64)
+
+
+def weekdays(dates):
+    '''Day of the week of `dates`, Monday being 0'''
+    return (_day_numbers(dates) + _DAYS_FROM_MONDAY) % 7
+
+
+def week_ids(dates):
+    '''Id of the (Monday to Sunday) week of `dates`, the ordinal of its 'W-SUN' period'''
+    return (_day_numbers(dates) + _DAYS_FROM_MONDAY) // 7 + _FIRST_WEEK_ID
+
+
+def month_ids(dates):
+    '''Id of the month of `dates`, the ordinal of its 'M' period'''
+    return to_days(dates).astype('datetime64[M]').astype(np.int64)
+
+
+def week_starts(ids):
+    '''Monday of the weeks of `week_ids`'''
+    ids = np.asarray(ids, dtype=np.int64) - _FIRST_WEEK_ID
+    return (ids * 7 - _DAYS_FROM_MONDAY).astype('datetime64[D]')
+
+
+def month_starts(ids):
+    '''1st day of the months of `month_ids`'''
+    return np.asarray(ids, dtype=np.int64).astype('datetime64[M]').astype('datetime64[D]')
+
+
+def next_weekday(day, weekday):
+    '''The first `weekday` (Monday being 0) on or after `day`'''
+    return day + datetime.timedelta(days=(weekday - day.weekday()) % 7)
+
+
+def previous_weekday(day, weekday):
+    '''The last `weekday` (Monday being 0) on or before `day`'''
+    return day - datetime.timedelta(days=(day.weekday() - weekday) % 7)
+
+
+def load_holidays(path=None):
+    '''Sorted holidays of the holidays file, `datetime64[D]`. None if there's no such file.'''
+    path = path or HOLIDAYS_FILE
+    if not os.path.isfile(path):
+        return None
+    holidays = []
+    with open(path) as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                holidays.append(date.fromisoformat(line))
+    return np.unique(np.array(holidays, dtype='datetime64[D]'))
+
+
+class TradingCalendar:
+    '''
+        Trading days of [start, end] (sorted `datetime64[D]`) & the expiries of every week &
+        month of it. All the queries take a date or an array of them.
+    '''
+
+    def __init__(self, start, end, holidays=()):
+        self.start = np.datetime64(to_days(start), 'D')
+        self.end = np.datetime64(to_days(end), 'D')
+        assert self.start <= self.end, f'start {self.start} is after end {self.end}'
+        self.holidays = np.unique(to_days(list(holidays)))
+
+        all_days = np.arange(self.start, self.end + 1, dtype='datetime64[D]')
+        business_days = all_days[weekdays(all_days) < SATURDAY]
+        self.days = np.setdiff1d(business_days, self.holidays)
+
+        # Expiry of every week & month touching [start, end], indexed by id - first id
+        self._first_week = int(week_ids(self.start))
+        self._first_month = int(month_ids(self.start))
+        weeks = np.arange(self._first_week, week_ids(self.end) + 1)
+        months = np.arange(self._first_month, month_ids(self.end) + 1)
+        self._weekly_expiries = self._on_trading_day(week_starts(weeks) + EXPIRY_WEEKDAY)
+        last_days = month_starts(months + 1) - 1
+        last_expiry_weekdays = last_days - (weekdays(last_days) - EXPIRY_WEEKDAY) % 7
+        self._monthly_expiries = self._on_trading_day(last_expiry_weekdays)
+
+    def __len__(self):
+        return len(self.days)
+
+    def _check_range(self, days):
+        assert days.size == 0 or (days.min() >= self.start and days.max() <= self.end), (
+            f'dates should be in the calendar range [{self.start}, {self.end}]'
+        )
+
+    def _on_trading_day(self, days):
+        '''`days` moved back to the trading day before when they're not trading days'''
+        positions = np.searchsorted(self.days, days, 'right') - 1
+        return np.where(positions >= 0, self.days[np.maximum(positions, 0)], days)
+
+    def is_trading_day(self, dates):
+        days = to_days(dates)
+        positions = np.minimum(np.searchsorted(self.days, days), max(len(self.days) - 1, 0))
+        return (self.days[positions] == days) if len(self.days) else np.zeros(days.shape, dtype=bool)
+
+    def previous_trading_day(self, dates, inclusive=False):
+        '''
+            The last trading day before `dates` (on or before with `inclusive`), NaT when
+            there's none in the calendar
+        '''
+        positions = np.searchsorted(self.days, to_days(dates), 'right' if inclusive else 'left') - 1
+        return np.where(
+            positions >= 0, self.days[np.clip(positions, 0, len(self.days) - 1)], np.datetime64('NaT')
+        )
+
+    def next_trading_day(self, dates, inclusive=False):
+        '''
+            The first trading day after `dates` (on or after with `inclusive`), NaT when
+            there's none in the calendar
+        '''
+        positions = np.searchsorted(self.days, to_days(dates), 'left' if inclusive else 'right')
+        return np.where(
+            positions < len(self.days),
+            self.days[np.clip(positions, 0, len(self.days) - 1)],
+            np.datetime64('NaT'),
+        )
+
+    def trading_days(self, start=None, end=None):
+        '''Trading days in [start, end], a view on `days`'''
+        first = 0 if start is None else int(np.searchsorted(self.days, to_days(start), 'left'))
+        last = len(self.days) if end is None else int(np.searchsorted(self.days, to_days(end), 'right'))
+        return self.days[first:last]
+
+    def expiries(self, cycle='monthly'):
+        '''Expiry days of the weeks or months (per `cycle`) of the calendar range'''
+        assert cycle in EXPIRY_CYCLES, f"cycle should be one of {EXPIRY_CYCLES}, received {cycle}"
+        return self._monthly_expiries if cycle == 'monthly' else self._weekly_expiries
+
+    def expiry_ids(self, dates, cycle='monthly'):
+        '''
+            Id of the expiry cycle `dates` settle in: the month (or week) id of the first
+            expiry on or after them. The days after the expiry of a month (or week) belong to
+            the cycle of the next one.
+        '''
+        assert cycle in EXPIRY_CYCLES, f"cycle should be one of {EXPIRY_CYCLES}, received {cycle}"
+        days = to_days(dates)
+        self._check_range(days)
+        if cycle == 'monthly':
+            ids = month_ids(days)
+            expiries = self._monthly_expiries[ids - self._first_month]
+        else:
+            ids = week_ids(days)
+            expiries = self._weekly_expiries[ids - self._first_week]
+        return ids + (days > expiries)
+
+    def expiry_of(self, ids, cycle='monthly'):
+        '''Expiry day of the `expiry_ids`'''
+        expiries = self.expiries(cycle)
+        first_id = self._first_month if cycle == 'monthly' else self._first_week
+        return expiries[np.asarray(ids, dtype=np.int64) - first_id]
+
+
+def get_calendar():
+    '''
+        The calendar of 1994 (when NSE started trading equities) till the end of next year with
+        the holidays of the holidays file, built on first use
+    '''
+    global _calendar
+    if _calendar is None:
+        holidays = load_holidays()
+        _calendar = TradingCalendar(
+            date(1994, 1, 1),
+            date(date.today().year + 1, 12, 31),
+            holidays if holidays is not None else (),
+        )
+    return _calendar
+
+
+def observed_holidays(histories, min_symbols=MIN_SYMBOLS):
+    '''
+        Holidays seen in the `histories` of many symbols, `(dates, covered)` for every symbol
+        with its trading dates & the `(start_date, end_date)` ranges (both inclusive) of its
+        history: the weekdays at least `min_symbols` of the symbols cover & none of them traded
+        on. A weekday a symbol didn't trade on alone may be before its listing or a suspension.
+    '''
+    covered_days = [np.array([], dtype='datetime64[D]')]
+    traded_days = [np.array([], dtype='datetime64[D]')]
+    for dates, covered in histories:
+        days = [np.array([], dtype='datetime64[D]')]
+        for start_date, end_date in covered:
+            days.append(np.arange(to_days(start_date), to_days(end_date) + 1, dtype='datetime64[D]'))
+        covered_days.append(np.unique(np.concatenate(days)))
+        traded_days.append(to_days(dates))
+    days, num_symbols = np.unique(np.concatenate(covered_days), return_counts=True)
+    days = days[(num_symbols >= min_symbols) & (weekdays(days) < SATURDAY)]
+    return np.setdiff1d(days, np.concatenate(traded_days))
+
+
+def write_holidays(holidays, path=None):
+    '''Adds `holidays` to the holidays file, keeping its comment lines'''
+    path = path or HOLIDAYS_FILE
+    existing = load_holidays(path)
+    holidays = np.union1d(
+        existing if existing is not None else np.array([], dtype='datetime64[D]'), to_days(holidays)
+    )
+    comments = []
+    if os.path.isfile(path):
+        with open(path) as f:
+            comments = [line for line in f if line.startswith('#')]
+    with open(path, 'w') as f:
+        f.writelines(comments)
+        f.writelines('%s\n' % day for day in holidays)
+    return holidays
+
+
+def main(symbols=None):
+    import history_store
+    from constants import NIFTY50
+
+    histories = []
+    for symbol in symbols or NIFTY50:
+        history, covered = history_store.load(symbol)
+        if covered:
+            histories.append((history.index, covered))
+    if len(histories) < MIN_SYMBOLS:
+        print('WARN: History of only %s symbols in the local store, at least %s are needed to find '
+              'the holidays in' % (len(histories), MIN_SYMBOLS))
+        return
+    holidays = write_holidays(observed_holidays(histories))
+    print('%s holidays in %s' % (len(holidays), HOLIDAYS_FILE))
+
+
+if __name__ == '__main__':
+    import sys
+    main(sys.argv[1].split(',') if len(sys.argv) > 1 else None)
@@ -0,0 +1,195 @@
+'''
+    Trend (as in `get_current_trend`) of a whole universe of symbols at once, evaluated with
+    NumPy on a symbols x units matrix of closing prices
+'''
+
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from bulk_fetch import prefetched_symbols
+from daily_analysis import get_daily_data
+from instrumentation import timed
+from monthly_closing_prices import get_expiry_data, get_monthly_data, get_weekly_expiry_data
+from pivots import latest_pivots, rising_streak, swing_lows
+from weekly_analysis import get_weekly_data
+
+
+CHART_DATA_GETTERS = {
+    'daily': get_daily_data,
+    'weekly': get_weekly_data,
+    'monthly': get_monthly_data,
+    'expiry': get_expiry_data,
+    'weekly_expiry': get_weekly_expiry_data,
+}
+
+HUMAN_READABLE_TREND = {
+    1: 'uptrend',
+    0: 'consolidation',
+    -1: 'downtrend',
+}
+
+
+def get_start_date(end_date, num_units, chart_type):
+    '''
+        Start date to fetch data from, to have `num_units` units of `chart_type` till `end_date`
+    '''
+    if chart_type in ('weekly', 'weekly_expiry'):
+        chart_multiplier = 7
+    elif chart_type in ('monthly', 'expiry'):
+        chart_multiplier = 31
+    else:  # daily
+        chart_multiplier = 1
+    return end_date - datetime.timedelta(days=((num_units + 1) * chart_multiplier))
+
+
+def get_chart_data(symbol, num_units=15, chart_type='weekly', end_date=None):
+    '''
+        Last `num_units` units (as looked at by `get_trend_by_count` & `get_trend_by_peaks`)
+        of `chart_type` chart of `symbol`, till `end_date` (today by default)
+    '''
+    end_date = end_date or datetime.datetime.today()
+    start_date = get_start_date(end_date, num_units, chart_type)
+    chart_data = CHART_DATA_GETTERS[chart_type](start_date, end_date, symbol)
+    if len(chart_data) < num_units:
+        print(
+            f'WARNING: Calculating trend for {symbol} based on only '
+            f'{len(chart_data)} units of data ({num_units} were requested).'
+        )
+    return chart_data
+
+
+def closing_matrix(chart_data_by_symbol):
+    '''
+        Returns `(symbols, closings, lengths)` for a dict of symbol -> chart data (as returned
+        by `get_weekly_data` & friends). Row `i` of `closings` has the closings of `symbols[i]`,
+        oldest unit first & right-aligned, i.e. the last column is the latest unit of every
+        symbol & shorter histories are padded with NaN on the left. `lengths[i]` is the number
+        of units of `symbols[i]`.
+    '''
+    symbols = list(chart_data_by_symbol)
+    lengths = np.array([len(chart_data_by_symbol[symbol]) for symbol in symbols], dtype=int)
+    closings = np.full((len(symbols), lengths.max(initial=0)), np.nan)
+    for row, symbol in enumerate(symbols):
+        chart_data = chart_data_by_symbol[symbol]
+        if lengths[row]:
+            closings[row, closings.shape[1] - lengths[row]:] = (
+                chart_data['closing'].sort_index().to_numpy(dtype=float)
+            )
+    return symbols, closings, lengths
+
+
+def trend_by_count(closings, lengths, uptrend_if_above_percent=0.7, downtrend_if_below_percent=0.3):
+    '''
+        Vectorized rule of `get_trend_by_count` for every row of `closings` (see `closing_matrix`).
+        Returns an array of trend codes (1, 0 or -1).
+    '''
+    gain_counts = (closings[:, 1:] > closings[:, :-1]).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gain_ratios = gain_counts / (lengths - 1)
+    return np.where(
+        gain_ratios > uptrend_if_above_percent,
+        1,
+        np.where(gain_ratios < downtrend_if_below_percent, -1, 0),
+    )
+
+
+def latest_bottoms(closings, count=3, swing_width=1):
+    '''
+        Returns `(bottoms, found)`, where `bottoms[:, k]` is the k-th latest closing of every row
+        which is lower than the `swing_width` closings on both of its sides & `found[:, k]`
+        tells if there was one
+    '''
+    return latest_pivots(closings, swing_lows(closings, swing_width, swing_width), count)
+
+
+def trend_by_peaks(
+    closings, lengths, uptrend_if_above_percent=0.7, downtrend_if_below_percent=0.3, swing_width=1
+):
+    '''
+        Vectorized rule of `get_trend_by_peaks` for every row of `closings` (see `closing_matrix`),
+        falling back to the rule of `get_trend_by_count` for the rows with less than 2 bottoms.
+        The bottoms are the swing lows of `swing_width` units on both sides.
+        Returns an array of trend codes (1, 0 or -1).
+    '''
+    bottoms, found = latest_bottoms(closings, swing_width=swing_width)
+    num_bottoms = found.sum(axis=1)
+    higher_bottoms = rising_streak(bottoms, found)
+    latest_closing = closings[:, -1] if closings.shape[1] else np.full(len(closings), np.nan)
+    by_count = trend_by_count(closings, lengths, uptrend_if_above_percent, downtrend_if_below_percent)
+
+    return np.select(
+        [
+            found[:, 0] & (latest_closing < bottoms[:, 0]),
+            num_bottoms < 2,
+            higher_bottoms >= 2,
+            higher_bottoms >= 1,
+        ],
+        [-1, by_count, 1, 0],
+        default=-1,
+    )
+
+
+@timed('compute')
+def scan_chart_data(
+    chart_data_by_symbol,
+    uptrend_if_above_percent=0.7,
+    downtrend_if_below_percent=0.3,
+    return_human_readable=True,
+    swing_width=1,
+):
+    '''
+        Trends of every symbol of a dict of symbol -> chart data, as a table indexed by symbol
+        with the number of units looked at & the trend by both rules (the bottoms being swing
+        lows of `swing_width` units on both sides)
+    '''
+    symbols, closings, lengths = closing_matrix(chart_data_by_symbol)
+    trends = pd.DataFrame({
+        'symbol': symbols,
+        'units': lengths,
+        'trend_by_count': trend_by_count(
+            closings, lengths, uptrend_if_above_percent, downtrend_if_below_percent
+        ),
+        'trend_by_peaks': trend_by_peaks(
+            closings, lengths, uptrend_if_above_percent, downtrend_if_below_percent, swing_width
+        ),
+    }).set_index('symbol')
+    if return_human_readable:
+        for column in ['trend_by_count', 'trend_by_peaks']:
+            trends[column] = trends[column].map(HUMAN_READABLE_TREND)
+    return trends
+
+
+def scan_universe(
+    symbols,
+    num_units=15,
+    uptrend_if_above_percent=0.7,
+    downtrend_if_below_percent=0.3,
+    chart_type='weekly',
+    return_human_readable=True,
+    swing_width=1,
+):
+    '''
+        Trends of all `symbols` on `chart_type` (one of `CHART_DATA_GETTERS`) chart, over
+        the same units `get_trend_by_count` & `get_trend_by_peaks` look at
+    '''
+    assert chart_type in CHART_DATA_GETTERS, (
+        f"chart_type should be one of {list(CHART_DATA_GETTERS)}, received {chart_type}"
+    )
+    end_date = datetime.datetime.today()
+    start_date = get_start_date(end_date, num_units, chart_type)
+    chart_data_by_symbol = {
+        symbol: get_chart_data(symbol, num_units, chart_type, end_date)
+        for symbol in prefetched_symbols(symbols, start_date, end_date)
+    }
+
+    trends = scan_chart_data(
+        {symbol: chart_data_by_symbol[symbol] for symbol in symbols},
+        uptrend_if_above_percent,
+        downtrend_if_below_percent,
+        return_human_readable,
+        swing_width,
+    )
+    trends.insert(0, 'chart_type', chart_type)
+    return trends
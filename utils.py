@@ -2,6 +2,9 @@
 Miscellaneous Utility functions
 """
 
+import numpy as np
+
+
 def get_xirr(investments: list[tuple[float, int]], current_value: float) -> float:
     """
     I have not looked too much into the "official" or "technical" definition of XIRR.
@@ -26,34 +29,158 @@ def get_xirr(investments: list[tuple[float, int]], current_value: float) -> floa
 
     Returns a float number `X`, which means the investment changed at X% (yearly compounding rate).
     """
-    total_investment = sum(investment for investment, _ in investments)
-    if (total_investment == 0) or (total_investment == current_value):
-        return 0.0  # Avoid division by zero
+    return float(get_xirr_batch([investments], [current_value])[0])
+
+
+def get_xirr_batch(
+    investments_list: list[list[tuple[float, int]]],
+    current_values: list[float],
+    initial_guesses: list[float] = None,
+    tolerance: float = 1e-6,
+    max_iterations: int = 200,
+) -> np.ndarray:
+    """
+    `get_xirr` for many portfolios at once, all of them solved together with NumPy.
+
+    Input:
+        investments_list: One list of (investment_value, days_ago) per portfolio, the lists
+            can be of different lengths
+        current_values: Current value of every portfolio
+        initial_guesses: Optional XIRR (in %) to start from for every portfolio, e.g. the
+            solution of a similar portfolio
+        tolerance: A portfolio is solved once its future value is within this of its
+            current value
+
+    Solves `sum(investment * g ^ (days / 365)) = current_value` for the growth factor
+    `g = 1 + X/100` with Newton's method in `log(g)`, falling back to bisection whenever a
+    Newton step leaves the bracket known to contain the solution. Hence the result always
+    stays above -100%.
+
+    Returns an array with the XIRR `X` (in %) of every portfolio, NaN for the ones without
+    a solution in the range (-100%, ~22 lakh %).
+    """
+    num_portfolios = len(investments_list)
+    lengths = np.array([len(investments) for investments in investments_list], dtype=int)
+
+    # Pad the ragged lists into (num_portfolios, max_length) arrays, padding has 0 investment
+    amounts = np.zeros((num_portfolios, max(lengths.max(initial=0), 1)))
+    days_ago = np.zeros_like(amounts)
+    if lengths.sum():
+        flat = np.array(
+            [item for investments in investments_list for item in investments], dtype=float
+        )
+        rows = np.repeat(np.arange(num_portfolios), lengths)
+        columns = np.arange(len(flat)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        amounts[rows, columns] = flat[:, 0]
+        days_ago[rows, columns] = flat[:, 1]
 
-    # Function to calculate the total future value given a rate
-    def future_value(rate):
-        return sum(investment * (1 + rate / 100) ** (days / 365) for investment, days in investments)
+    return get_xirr_arrays(
+        amounts, days_ago, current_values, initial_guesses, tolerance, max_iterations
+    )
+
+
+def get_xirr_arrays(
+    amounts: np.ndarray,
+    days_ago: np.ndarray,
+    current_values: np.ndarray,
+    initial_guesses: np.ndarray = None,
+    tolerance: float = 1e-6,
+    max_iterations: int = 200,
+) -> np.ndarray:
+    """
+    `get_xirr_batch` for portfolios already laid out as (num_portfolios, num_investments)
+    arrays of investment values & days ago, with 0 investment wherever a portfolio has fewer
+    investments.
+    """
+    num_portfolios = len(amounts)
+    amounts = np.asarray(amounts, dtype=float)
+    years = np.asarray(days_ago, dtype=float) / 365
+    current_values = np.asarray(current_values, dtype=float)
 
-    # Initialize variables for the iterative method
-    xirr_guess = 0.1  # Initial guess for XIRR (10%)
-    tolerance = 1e-6
-    max_iterations = 1000
+    def excess_value(log_growth):
+        with np.errstate(over='ignore', invalid='ignore'):
+            growth = np.exp(years * log_growth[:, None])
+            return (
+                (amounts * growth).sum(axis=1) - current_values,
+                (amounts * years * growth).sum(axis=1),
+            )
+
+    total_investments = amounts.sum(axis=1)
+    xirrs = np.full(num_portfolios, np.nan)
+    trivial = (total_investments == 0) | (total_investments == current_values)
+    xirrs[trivial] = 0.0
+
+    # Bracket in log(1 + X/100), from about -100% to about 22 lakh %
+    low = np.full(num_portfolios, -30.0)
+    high = np.full(num_portfolios, 10.0)
+    low_excess, _ = excess_value(low)
+    high_excess, _ = excess_value(high)
+    active = ~trivial & (np.sign(low_excess) * np.sign(high_excess) < 0)
+
+    if initial_guesses is None:
+        log_growth = np.full(num_portfolios, np.log(1.1))
+    else:
+        log_growth = np.log1p(np.maximum(np.asarray(initial_guesses, dtype=float), -99.99) / 100)
+    log_growth = np.clip(log_growth, low, high)
 
     for _ in range(max_iterations):
-        fv = future_value(xirr_guess)
-        if abs(fv - current_value) < tolerance:
+        if not active.any():
             break
-        
-        # Calculate the derivative (slope) of the future value for the current guess
-        derivative = sum(
-            investment * (days / 365) * (1 + xirr_guess / 100) ** ((days / 365) - 1)
-            for investment, days in investments
-        )
+        excess, slope = excess_value(log_growth)
+        converged = active & (np.abs(excess) < tolerance)
+        xirrs[converged] = np.expm1(log_growth[converged]) * 100
+        active &= ~converged
 
-        if derivative == 0:
-            break  # Avoid division by zero
+        # Shrink the bracket, keeping a sign change of `excess` inside it
+        same_side_as_low = np.sign(excess) == np.sign(low_excess)
+        low = np.where(active & same_side_as_low, log_growth, low)
+        high = np.where(active & ~same_side_as_low, log_growth, high)
 
-        # Update the guess using Newton's method
-        xirr_guess -= (fv - current_value) / derivative
+        with np.errstate(divide='ignore', invalid='ignore'):
+            newton = log_growth - excess / slope
+        bisection = (low + high) / 2
+        use_newton = np.isfinite(newton) & (newton > low) & (newton < high)
+        log_growth = np.where(active, np.where(use_newton, newton, bisection), log_growth)
 
-    return xirr_guess  # Return the annualized rate as a percentage
+        # The bracket got too small to move further
+        stuck = active & (high - low < 1e-15)
+        xirrs[stuck] = np.expm1(log_growth[stuck]) * 100
+        active &= ~stuck
+
+    xirrs[active] = np.expm1(log_growth[active]) * 100
+    return xirrs
+
+
+def sliding_window_max(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Maximum of every `window` consecutive values along the last axis, ignoring NaNs.
+    `result[..., i] = nanmax(values[..., i:i + window])`, so the last axis of the result is
+    `window - 1` shorter than that of `values`.
+
+    Uses the van Herk/Gil-Werman algorithm: prefix & suffix maximums inside blocks of
+    `window` values, so the cost is O(n) whatever the `window`.
+    """
+    assert window >= 1, '`window` should be at least 1'
+    values = np.asarray(values, dtype=float)
+    length = values.shape[-1]
+    if length < window:
+        return np.empty(values.shape[:-1] + (0,))
+
+    num_blocks = -(-length // window)
+    padding = [(0, 0)] * (values.ndim - 1) + [(0, num_blocks * window - length)]
+    blocks = np.pad(values, padding, constant_values=np.nan).reshape(
+        values.shape[:-1] + (num_blocks, window)
+    )
+    prefix_max = np.fmax.accumulate(blocks, axis=-1).reshape(values.shape[:-1] + (-1,))
+    suffix_max = np.fmax.accumulate(blocks[..., ::-1], axis=-1)[..., ::-1].reshape(
+        values.shape[:-1] + (-1,)
+    )
+    num_windows = length - window + 1
+    return np.fmax(suffix_max[..., :num_windows], prefix_max[..., window - 1:length])
+
+
+def sliding_window_min(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Minimum of every `window` consecutive values along the last axis, see `sliding_window_max`
+    """
+    return -sliding_window_max(-np.asarray(values, dtype=float), window)
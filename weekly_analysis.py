@@ -5,9 +5,13 @@
 import datetime
 from datetime import date
 
-from nsepy import get_history
 import pandas as pd
 
+from memo_cache import get_history
+import output_writer
+from resample import resample_ohlcv, with_string_index
+from trading_calendar import FRIDAY, MONDAY, next_weekday, previous_weekday
+
 
 def get_weekly_data(start_date, end_date, symbol, verbose=False):
     '''Weekly closing, high, low & opening for the weeks in [start_date, end_date)
@@ -15,14 +19,9 @@ def get_weekly_data(start_date, end_date, symbol, verbose=False):
     Only year, month & date of `start_date` & `end_date` are considered - rest values
     are ignored
     '''
-    start_date = date(start_date.year, start_date.month, start_date.day)
-    # Go to next Monday
-    while start_date.weekday() != 0:
-        start_date += datetime.timedelta(days=1)
-    end_date = date(end_date.year, end_date.month, end_date.day)
-    # Go to last Friday
-    while end_date.weekday() != 4:
-        end_date -= datetime.timedelta(days=1)
+    # Next Monday & last Friday
+    start_date = next_weekday(date(start_date.year, start_date.month, start_date.day), MONDAY)
+    end_date = previous_weekday(date(end_date.year, end_date.month, end_date.day), FRIDAY)
     if verbose:
         print('start_date', start_date, start_date.weekday())
         print('end_date', end_date, end_date.weekday())
@@ -36,49 +35,8 @@ def get_weekly_data(start_date, end_date, symbol, verbose=False):
     if history.empty:
         print('No data received for the given inputs')
         return pd.DataFrame(data)
-    history_dates = set(history.index.tolist())
-
-    while end_date > start_date:
-        current_week_monday = end_date - datetime.timedelta(days=4)
-        current_week = '%s-%s-%s' % (
-            current_week_monday.year,
-            '{:02d}'.format(current_week_monday.month),
-            '{:02d}'.format(current_week_monday.day)
-        )
-        if verbose:
-            print(current_week)
-        closing = None
-        high = None
-        low = None
-        opening = None
-        volume = None
-
-        # This loop will break when end_date becomes Sunday
-        while current_week_monday <= end_date:
-            if end_date in history_dates:
-                if not closing:
-                    closing = history.loc[end_date]['Close']
-                    low = history.loc[end_date]['Low']
-                    high = history.loc[end_date]['High']
-                    opening = history.loc[end_date]['Open']
-                    volume = history.loc[end_date]['Volume']
-                else:
-                    low = min(low, history.loc[end_date]['Low'])
-                    high = max(high, history.loc[end_date]['High'])
-                    opening = history.loc[end_date]['Open']
-                    volume += history.loc[end_date]['Volume']
-            end_date -= datetime.timedelta(days=1)
-        data['week'].append(current_week)
-        data['closing'].append(closing)
-        data['high'].append(high)
-        data['low'].append(low)
-        data['opening'].append(opening)
-        data['volume'].append(volume)
-
-        # Set end_date to last Friday
-        end_date = current_week_monday - datetime.timedelta(days=3)
-
-    return pd.DataFrame(data).set_index('week')
+    weekly_data = resample_ohlcv(history, 'weekly', start_date, end_date)
+    return with_string_index(weekly_data, 'weekly')
 
 
 def main(symbol):
@@ -88,11 +46,7 @@ def main(symbol):
         date(today.year, today.month, today.day),
         symbol
     )
-    weekly_data.to_csv(
-        'output/%s_weekly_data.csv' % symbol,
-        index=True,
-        header=True
-    )
+    output_writer.write(weekly_data, 'bars', 'weekly', symbol, csv_path='output/%s_weekly_data.csv' % symbol)
 
 if __name__ == '__main__':
     symbol = 'PIIND'